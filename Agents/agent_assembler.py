@@ -1,13 +1,12 @@
-from openai import OpenAI
+from Agents.llm_client import run_chat_completion
 from Consts.agent_assembler_consts import *
 from Consts.consts import *
 from Utils.file_utils import *
 from Utils.model_utils import *
 
 def run_assembler_agent(content):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    completion = client.chat.completions.create(
+    result = run_chat_completion(
+        "assembler", ASSEMBLER_TIMEOUT_SECONDS, ASSEMBLER_CACHE_RESPONSES, ASSEMBLER_CACHE_HIGH_TEMPERATURE,
         model=ASSEMBLER_MODEL,
         messages=[
             {
@@ -50,6 +49,4 @@ def run_assembler_agent(content):
         presence_penalty=ASSEMBLER_PRESENCE_PENALTY
     )
 
-    result = completion.choices[0].message.content
-
     return result
@@ -1,12 +1,11 @@
-from openai import OpenAI
+from Agents.llm_client import run_chat_completion
 from Consts.agent_code_writer_consts import *
 from Consts.consts import *
 
 
 def run_code_writer_agent(content):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    completion = client.chat.completions.create(
+    result = run_chat_completion(
+        "code writer", CODE_WRITER_TIMEOUT_SECONDS, CODE_WRITER_CACHE_RESPONSES, CODE_WRITER_CACHE_HIGH_TEMPERATURE,
         model=CODE_WRITER_MODEL,
         messages=[
             {
@@ -25,6 +24,4 @@ def run_code_writer_agent(content):
         presence_penalty=CODE_WRITER_PRESENCE_PENALTY
     )
 
-    result = completion.choices[0].message.content
-
     return result
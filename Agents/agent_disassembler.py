@@ -1,12 +1,10 @@
-from openai import OpenAI
+from Agents.llm_client import run_chat_completion, stream_chat_completion
 from Consts.agent_disassembler_consts import *
 from Consts.consts import *
 
 
-def run_disassembler_agent(content):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    completion = client.chat.completions.create(
+def create_disassembler_request(content):
+    return dict(
         model=DISASSEMBLER_MODEL,
         messages=[
             {
@@ -25,6 +23,16 @@ def run_disassembler_agent(content):
         presence_penalty=DISASSEMBLER_PRESENCE_PENALTY
     )
 
-    result = completion.choices[0].message.content
+
+def run_disassembler_agent(content):
+    result = run_chat_completion(
+        "disassembler", DISASSEMBLER_TIMEOUT_SECONDS, DISASSEMBLER_CACHE_RESPONSES, DISASSEMBLER_CACHE_HIGH_TEMPERATURE,
+        **create_disassembler_request(content)
+    )
 
     return result
+
+
+def stream_disassembler_agent(content):
+    # Yields the answer in pieces while the model writes it
+    return stream_chat_completion("disassembler", DISASSEMBLER_TIMEOUT_SECONDS, **create_disassembler_request(content))
@@ -1,12 +1,12 @@
-from openai import OpenAI
+import json
+from Agents.llm_client import run_chat_completion
 from Consts.agent_parameter_manipulator_consts import *
 from Consts.consts import *
 
 
 def run_parameter_manipulator_agent(content):
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    completion = client.chat.completions.create(
+    result = run_chat_completion(
+        "parameter manipulator", PARAMETER_MANIPULATOR_TIMEOUT_SECONDS, PARAMETER_MANIPULATOR_CACHE_RESPONSES, PARAMETER_MANIPULATOR_CACHE_HIGH_TEMPERATURE,
         model=PARAMETER_MANIPULATOR_MODEL,
         messages=[
             {
@@ -25,6 +25,53 @@ def run_parameter_manipulator_agent(content):
         presence_penalty=PARAMETER_MANIPULATOR_PRESENCE_PENALTY
     )
 
-    result = completion.choices[0].message.content
+    return result
+
+def create_parameter_patch_content(prompt, parameters):
+    # The parameters instead of the whole program, one line each: body_height = 100 (min 10, max 300)
+    lines = []
+    for name, parameter in parameters.items():
+        limits = f" (min {parameter['min']}, max {parameter['max']})" if parameter['min'] is not None else ""
+        lines.append(f"{name} = {parameter['value']}{limits}")
+    return f"{prompt}\n\nparameters:\n" + "\n".join(lines)
+
+
+def parse_parameter_patch(answer):
+    """Return {name: value} of the answer {"changes": [{"name": ..., "value": ...}]}, raise ValueError when it is not one."""
+    text = answer.strip()
+    if text.startswith("```"):
+        # ```json ... ```
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    patch = json.loads(text)
+    if not isinstance(patch, dict) or not isinstance(patch.get('changes'), list):
+        raise ValueError(f"Parameter patch without changes: {answer}")
+    changes = {}
+    for change in patch['changes']:
+        if not isinstance(change, dict) or 'name' not in change or 'value' not in change:
+            raise ValueError(f"Parameter change without name and value: {change}")
+        changes[change['name']] = change['value']
+    return changes
+
+
+def run_parameter_patch_agent(prompt, parameters):
+    result = run_chat_completion(
+        "parameter patch", PARAMETER_MANIPULATOR_TIMEOUT_SECONDS, PARAMETER_MANIPULATOR_CACHE_RESPONSES, PARAMETER_MANIPULATOR_CACHE_HIGH_TEMPERATURE,
+        model=PARAMETER_MANIPULATOR_MODEL,
+        messages=[
+            {
+                ROLE: SYSTEM,
+                CONTENT: PARAMETER_PATCH_SYSTEM_MESSAGE
+            },
+            {
+                ROLE: USER,
+                CONTENT: create_parameter_patch_content(prompt, parameters)
+            }
+        ],
+        temperature=PARAMETER_PATCH_TEMPERATURE,
+        max_tokens=PARAMETER_PATCH_MAX_TOKENS,
+        top_p=PARAMETER_MANIPULATOR_TOP_P,
+        frequency_penalty=PARAMETER_MANIPULATOR_FREQUENCY_PENALTY,
+        presence_penalty=PARAMETER_MANIPULATOR_PRESENCE_PENALTY
+    )
 
-    return result
\ No newline at end of file
+    return parse_parameter_patch(result)
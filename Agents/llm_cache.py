@@ -0,0 +1,137 @@
+"""
+Persistent cache of the answers of the agents, in SQLite so every process and thread can share it.
+Answers are keyed by a hash of the model, the messages and the sampling parameters of the request,
+expire after LLM_CACHE_TTL_SECONDS and are evicted least recently used first above LLM_CACHE_MAX_SIZE_BYTES.
+Every hit records the tokens and the time it saved.
+
+    python -m Agents.llm_cache    prints the statistics of the cache
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from Consts.llm_consts import *
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def make_request_key(request):
+    # request holds the model, the messages and the sampling parameters, in any order
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class LLMResponseCache():
+    def __init__(self, cache_file=LLM_CACHE_FILE, ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                 max_size_bytes=LLM_CACHE_MAX_SIZE_BYTES):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        # A connection per operation, sqlite3 connections must not be shared between threads
+        connection = sqlite3.connect(self.cache_file, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key):
+        """Return the cached answer of the request key, or None when it is missing or expired."""
+        now = time.time()
+        with self.connect() as connection:
+            row = connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                connection.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row else None
+
+    def put(self, key, agent, model, response, prompt_tokens=0, completion_tokens=0, latency_seconds=0):
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses (key, agent, model, response, size, prompt_tokens, "
+                               "completion_tokens, latency_seconds, created, last_used) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, agent, model, response, len(response.encode()), prompt_tokens,
+                                completion_tokens, latency_seconds, now, now))
+        self.evict()
+
+    def evict(self):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size <= self.max_size_bytes:
+                return
+            for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                if total_size <= self.max_size_bytes:
+                    break
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total_size -= size
+
+    def stats(self):
+        # hits and misses of this process, savings of all the hits the cache ever served
+        with self.connect() as connection:
+            agents = {}
+            for agent, entries, size, hits, saved_tokens, saved_seconds in connection.execute(
+                    "SELECT agent, COUNT(*), SUM(size), SUM(hits), SUM(hits * (prompt_tokens + completion_tokens)), "
+                    "SUM(hits * latency_seconds) FROM responses GROUP BY agent ORDER BY agent"):
+                agents[agent] = {'entries': entries, 'size_bytes': size, 'hits': hits,
+                                 'saved_tokens': saved_tokens, 'saved_seconds': round(saved_seconds, 3)}
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0,
+            'saved_tokens': sum(agent['saved_tokens'] for agent in agents.values()),
+            'saved_seconds': round(sum(agent['saved_seconds'] for agent in agents.values()), 3),
+            'agents': agents
+        }
+
+
+llm_cache = None
+llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    # Opened once per process, on the first cached agent call
+    global llm_cache
+    with llm_cache_lock:
+        if llm_cache is None:
+            llm_cache = LLMResponseCache()
+    return llm_cache
+
+
+if __name__ == '__main__':
+    print(json.dumps(get_llm_cache().stats(), indent=2))
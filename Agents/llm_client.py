@@ -0,0 +1,155 @@
+"""
+One OpenAI client for the whole process, shared by all the agents and their threads.
+Its connection pool keeps connections to the API alive between calls, so a call reuses
+an open connection and its TLS session instead of connecting again.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from openai import OpenAI, DefaultHttpxClient
+from Consts.consts import *
+from Consts.llm_consts import *
+from Agents.llm_cache import get_llm_cache, make_request_key
+from Agents.llm_scheduler import llm_scheduler
+from Utils.token_utils import num_tokens_from_messages, count_text_tokens
+from Utils.tracing import span
+
+try:
+    import httpx
+except ImportError:
+    # newer openai releases are built on httpx2
+    import httpx2 as httpx
+
+llm_client = None
+llm_client_lock = threading.Lock()
+
+
+class LLMUsage():
+    """Requests and tokens of the agent calls of a block, see count_llm_usage."""
+    def __init__(self):
+        self.requests = 0
+        self.cached_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def add(self, prompt_tokens=0, completion_tokens=0, cached=False):
+        with self.lock:
+            self.requests += 1
+            self.cached_requests += cached
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def to_dict(self):
+        with self.lock:
+            return {'requests': self.requests, 'cached_requests': self.cached_requests,
+                    'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens}
+
+
+# Usage of the current thread or task, the code writer threads run in a copy of the context of the caller
+current_usage = contextvars.ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def count_llm_usage():
+    """Count the agent calls of the block, e.g. with count_llm_usage() as usage: run_all_agents(...)"""
+    usage = LLMUsage()
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
+
+
+def add_usage(prompt_tokens=0, completion_tokens=0, cached=False):
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, cached)
+
+
+def create_llm_client(base_url=LLM_BASE_URL, max_connections=LLM_MAX_CONNECTIONS,
+                      max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                      keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS):
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS))
+    return OpenAI(api_key=OPENAI_API_KEY, base_url=base_url, http_client=http_client, max_retries=LLM_MAX_RETRIES)
+
+
+def get_llm_client(timeout=None):
+    """
+    Return the client shared by the process, created on the first call.
+    With a timeout, return a copy of it with the timeout of the agent, on the same connection pool.
+    """
+    global llm_client
+    with llm_client_lock:
+        if llm_client is None:
+            llm_client = create_llm_client()
+    return llm_client.with_options(timeout=timeout) if timeout else llm_client
+
+
+def estimate_request_tokens(request):
+    # Providers count the prompt and the most tokens the answer may take against the tokens per minute
+    return num_tokens_from_messages(request['messages']) + request.get('max_tokens', 0)
+
+
+def run_chat_completion(agent_name, timeout=None, cache_responses=False, cache_high_temperature=False, **request):
+    """
+    Send a chat completions request (model, messages, sampling parameters) through the scheduler
+    and return the answer text.
+
+    With cache_responses, an identical earlier request is answered from the response cache.
+    Requests sampled above LLM_CACHE_MAX_TEMPERATURE bypass the cache, unless cache_high_temperature is set.
+    """
+    with span(f"llm {agent_name}", agent=agent_name, model=request['model']) as current:
+        use_cache = cache_responses and (cache_high_temperature or request.get('temperature', 1) <= LLM_CACHE_MAX_TEMPERATURE)
+        if use_cache:
+            key = make_request_key(request)
+            result = get_llm_cache().get(key)
+            if result is not None:
+                print(f"{agent_name} agent answered from the response cache")
+                current.set(cached=True)
+                add_usage(cached=True)
+                return result
+
+        start_time = time.perf_counter()
+        completion = llm_scheduler.run(request['model'], estimate_request_tokens(request),
+                                       lambda: get_llm_client(timeout).chat.completions.create(**request))
+        latency_seconds = time.perf_counter() - start_time
+        result = completion.choices[0].message.content
+        usage = completion.usage
+        current.set(cached=False, prompt_tokens=usage.prompt_tokens if usage else None,
+                    completion_tokens=usage.completion_tokens if usage else None)
+        add_usage(usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+
+        if use_cache and result is not None:
+            get_llm_cache().put(key, agent_name, request['model'], result,
+                                usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0,
+                                latency_seconds)
+        return result
+
+
+def stream_chat_completion(agent_name, timeout=None, **request):
+    """Send a chat completions request and yield the pieces of the answer text as they arrive, uncached."""
+    current = span(f"llm {agent_name}", agent=agent_name, model=request['model'], stream=True).start(make_current=False)
+    chunks = []
+    try:
+        stream = llm_scheduler.run(request['model'], estimate_request_tokens(request),
+                                   lambda: get_llm_client(timeout).chat.completions.create(stream=True, **request))
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+    except Exception as error:
+        current.set(chunks=len(chunks))
+        current.end(error)
+        raise
+    current.set(chunks=len(chunks))
+    current.end()
+    # A stream has no usage, the tokens are counted like the scheduler estimates them
+    add_usage(num_tokens_from_messages(request['messages']), count_text_tokens("".join(chunks)))
@@ -0,0 +1,175 @@
+"""
+Scheduler all the agent requests go through.
+
+Every model has a rolling budget of requests and tokens per minute (LLM_RATE_LIMITS), a request waits
+until its estimated tokens fit in the budget of its model. Waiting requests run by priority, interactive
+requests of the web app before batch generation, and in arrival order within a priority.
+Requests answered with 429 or 5xx are retried with jittered exponential backoff, a 429 also pauses
+the other requests of the model until its Retry-After passed.
+"""
+import contextvars
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import openai
+from Consts.llm_consts import *
+
+# Priority of the requests of the current thread or task, see llm_priority
+current_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Run the agent requests of the block with priority, e.g. with llm_priority(PRIORITY_BATCH): ..."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RateBudget():
+    """Requests and tokens of a model in the last window_seconds."""
+    def __init__(self, rpm, tpm, window_seconds=LLM_RATE_WINDOW_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_seconds = window_seconds
+        self.records = deque()  # [time, tokens] of every request in the window
+        self.tokens = 0
+        self.paused_until = 0
+
+    def forget_old(self, now):
+        while self.records and now - self.records[0][0] >= self.window_seconds:
+            self.tokens -= self.records.popleft()[1]
+
+    def wait_seconds(self, tokens, now):
+        # 0 when a request of tokens fits now, a request larger than the whole budget runs alone
+        self.forget_old(now)
+        wait = max(0, self.paused_until - now)
+        if len(self.records) >= self.rpm:
+            wait = max(wait, self.records[0][0] + self.window_seconds - now)
+        excess = self.tokens + tokens - self.tpm
+        if excess > 0 and self.records:
+            freed = 0
+            for record_time, record_tokens in self.records:
+                freed += record_tokens
+                if freed >= excess:
+                    wait = max(wait, record_time + self.window_seconds - now)
+                    break
+        return wait
+
+    def reserve(self, tokens, now):
+        record = [now, tokens]
+        self.records.append(record)
+        self.tokens += tokens
+        return record
+
+    def correct(self, record, tokens, now):
+        # The server counted the request somewhere until it answered, the window of the request
+        # starts when the answer arrived, and the estimate is replaced by the tokens the answer reported
+        record[0] = now
+        if tokens is not None:
+            if any(kept is record for kept in self.records):
+                self.tokens += tokens - record[1]
+            record[1] = tokens
+
+
+class LLMScheduler():
+    def __init__(self, rate_limits=None, window_seconds=LLM_RATE_WINDOW_SECONDS, max_attempts=LLM_MAX_ATTEMPTS,
+                 backoff_base_seconds=LLM_BACKOFF_BASE_SECONDS, backoff_max_seconds=LLM_BACKOFF_MAX_SECONDS):
+        self.rate_limits = LLM_RATE_LIMITS if rate_limits is None else rate_limits
+        self.window_seconds = window_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.budgets = {}
+        self.waiting = []  # (priority, sequence, model) of the requests waiting for their turn
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.retries = 0
+        self.rate_limited = 0
+
+    def get_budget(self, model):
+        if model not in self.budgets:
+            limits = self.rate_limits.get(model, {})
+            self.budgets[model] = RateBudget(limits.get('rpm', LLM_DEFAULT_RPM), limits.get('tpm', LLM_DEFAULT_TPM),
+                                             self.window_seconds)
+        return self.budgets[model]
+
+    def acquire(self, model, tokens, priority, sequence):
+        # Wait until no request of the model with a higher priority waits and the budget has room
+        ticket = (priority, sequence, model)
+        with self.condition:
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    first = min(waiting for waiting in self.waiting if waiting[2] == model)
+                    wait = self.get_budget(model).wait_seconds(tokens, time.monotonic())
+                    if first == ticket and wait == 0:
+                        record = self.get_budget(model).reserve(tokens, time.monotonic())
+                        return record
+                    self.condition.wait(wait if first == ticket else None)
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    def backoff_seconds(self, attempt, error):
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                retry_after = None
+        # Full jitter, so the retries of many requests do not arrive together
+        backoff = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+        return max(backoff, retry_after or 0)
+
+    def run(self, model, tokens, call, priority=None):
+        """
+        Run call() for a request of model estimated at tokens, when its priority and the budget allow,
+        and return its result. Retry it on 429, 5xx and connection errors.
+        call() may return a completion with usage, its total_tokens correct the estimate.
+        """
+        priority = current_priority.get() if priority is None else priority
+        sequence = next(self.sequence)
+        for attempt in range(self.max_attempts):
+            record = self.acquire(model, tokens, priority, sequence)
+            try:
+                result = call()
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as error:
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.backoff_seconds(attempt, error)
+                with self.condition:
+                    self.retries += 1
+                    if isinstance(error, openai.RateLimitError):
+                        self.rate_limited += 1
+                        budget = self.get_budget(model)
+                        budget.paused_until = max(budget.paused_until, time.monotonic() + delay)
+                    self.condition.notify_all()
+                print(f"Request to {model} failed ({type(error).__name__}), retry {attempt + 1} in {delay:.2f} seconds")
+                time.sleep(delay)
+                continue
+            usage = getattr(result, 'usage', None)
+            with self.condition:
+                self.get_budget(model).correct(record, getattr(usage, 'total_tokens', None), time.monotonic())
+                self.condition.notify_all()
+            return result
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            models = {}
+            for model, budget in self.budgets.items():
+                budget.forget_old(now)
+                models[model] = {'requests_in_window': len(budget.records), 'tokens_in_window': budget.tokens,
+                                 'rpm': budget.rpm, 'tpm': budget.tpm}
+            return {'waiting': len(self.waiting), 'retries': self.retries, 'rate_limited': self.rate_limited,
+                    'models': models}
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,268 @@
+"""
+Assemble the full program out of the part codes of the code writer without the assembler model.
+
+Every part code is a small program: imports, constants such as TOLERANCE, its create_* function,
+its parameters, the call of the function and a = part. The parts are merged into the layout of the
+programs of Full_Programs: the imports and constants once, all the functions, the user parameters block
+with the sliders, the internal parameters, the calls, a = [parts] and the sliders dict b.
+
+A parameter set to a number is a slider, a parameter computed from others is internal. A slider gets the
+most common range of the sliders of the same name in Full_Programs that holds its value, or a range
+guessed from its value.
+When parts set a parameter differently, the value most parts set wins, then the value of the part that
+passes it to its function, then the value of the first part.
+Part codes the assembler cannot merge raise AssemblyError, the assembler model is used for them.
+"""
+import ast
+import math
+import os
+import threading
+from Consts.agent_assembler_consts import *
+from Consts.geometry_consts import FULL_PROGRAMS_DIR
+from Geometry.parameter_patch import get_number, get_slider_ranges, split_bom
+
+
+class AssemblyError(Exception):
+    pass
+
+
+class ParsedPart():
+    def __init__(self, index):
+        self.index = index
+        self.header = []  # source of the imports and calls before the functions, e.g. rhinoinside.load()
+        self.constants = {}  # name -> source
+        self.functions = {}  # name -> source
+        self.parameters = []  # (name, source, value node)
+        self.calls = []  # (name, source, loaded names)
+        self.objects = []  # names placed in a
+
+
+def get_assigned_name(statement):
+    if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name):
+        return statement.targets[0].id
+    return None
+
+
+def parse_part(index, code):
+    _, code = split_bom(code)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as error:
+        raise AssemblyError(f"part {index + 1} is not valid python: {error}")
+    part = ParsedPart(index)
+    seen_function = False
+    for statement in tree.body:
+        source = ast.get_source_segment(code, statement)
+        name = get_assigned_name(statement)
+        if isinstance(statement, ast.FunctionDef):
+            part.functions[statement.name] = source
+            seen_function = True
+        elif isinstance(statement, (ast.Import, ast.ImportFrom)) or (isinstance(statement, ast.Expr) and not seen_function):
+            part.header.append(source)
+        elif name is not None and name.isupper():
+            part.constants[name] = source
+        elif name == 'a':
+            elements = statement.value.elts if isinstance(statement.value, (ast.List, ast.Tuple)) else [statement.value]
+            if not all(isinstance(element, ast.Name) for element in elements):
+                raise AssemblyError(f"part {index + 1} places an expression in a")
+            part.objects += [element.id for element in elements]
+        elif name == 'b':
+            continue
+        elif name is not None and isinstance(statement.value, ast.Call) and isinstance(statement.value.func, ast.Name) \
+                and statement.value.func.id in part.functions:
+            loaded = {node.id for node in ast.walk(statement.value) if isinstance(node, ast.Name)}
+            part.calls.append((name, source, loaded))
+        elif name is not None:
+            part.parameters.append((name, source, statement.value))
+        else:
+            raise AssemblyError(f"part {index + 1} has a statement the assembler does not merge: {source.splitlines()[0]}")
+    if not part.calls or not part.objects:
+        raise AssemblyError(f"part {index + 1} does not create its part and place it in a")
+    return part
+
+
+def choose_definition(name, definitions):
+    # definitions: [(part, source, value node)] of the parts that set the parameter,
+    # values are compared by their syntax tree, rg.Point3d(0,0,0) is rg.Point3d(0, 0, 0)
+    counts = {}
+    for _, _, value in definitions:
+        counts[ast.dump(value)] = counts.get(ast.dump(value), 0) + 1
+    most = max(counts.values())
+    candidates = [definition for definition in definitions if counts[ast.dump(definition[2])] == most]
+    if len(candidates) > 1:
+        owners = [definition for definition in candidates
+                  if any(name in loaded for _, _, loaded in definition[0].calls)]
+        candidates = owners or candidates
+    chosen = candidates[0]
+    if len(counts) > 1:
+        print(f"Assembler: parts set {name} differently, using the value of part {chosen[0].index + 1}: {chosen[1]}")
+    return chosen
+
+
+def round_up(value):
+    # 690 -> 700, 150 -> 200, 7.5 -> 8
+    step = 10 ** math.floor(math.log10(value))
+    return math.ceil(value / step) * step
+
+
+def is_count(name):
+    return name.split("_")[-1] in ASSEMBLER_COUNT_SUFFIXES
+
+
+def guess_slider_range(name, value):
+    """[min, max] of the slider of a parameter, e.g. [10, 300] for body_height = 100."""
+    if is_count(name):
+        return [1, max(10, 2 * int(value))]
+    if isinstance(value, float) and 0 <= value <= 1:
+        return [0.0, 1.0]
+    maximum = round_up(max(abs(value) * ASSEMBLER_SLIDER_MAX_FACTOR, ASSEMBLER_SLIDER_MIN_MAX))
+    if value < 0:
+        return [-maximum, maximum]
+    if value >= 20:
+        minimum = 10
+    elif value >= 2:
+        minimum = 1
+    else:
+        minimum = 0.1 if value > 0 else 0
+    return [minimum, maximum]
+
+
+corpus_slider_ranges = None
+corpus_slider_ranges_lock = threading.Lock()
+
+
+def get_corpus_slider_ranges(programs_dir=FULL_PROGRAMS_DIR):
+    # name -> {(min, max): number of programs} of the sliders of Full_Programs, read once per process
+    global corpus_slider_ranges
+    with corpus_slider_ranges_lock:
+        if corpus_slider_ranges is None:
+            ranges = {}
+            for file_name in sorted(os.listdir(programs_dir)) if os.path.isdir(programs_dir) else []:
+                if not file_name.endswith(".py"):
+                    continue
+                with open(os.path.join(programs_dir, file_name), encoding='utf-8-sig') as f:
+                    try:
+                        tree = ast.parse(f.read())
+                    except SyntaxError:
+                        continue
+                for name, slider_range in get_slider_ranges(tree).items():
+                    counts = ranges.setdefault(name, {})
+                    counts[slider_range] = counts.get(slider_range, 0) + 1
+            corpus_slider_ranges = ranges
+    return corpus_slider_ranges
+
+
+def get_slider_range(name, value):
+    """[min, max] of the slider of a parameter, from the sliders of the same name in Full_Programs or guessed."""
+    counts = {slider_range: count for slider_range, count in get_corpus_slider_ranges().get(name, {}).items()
+              if slider_range[0] <= value <= slider_range[1]}
+    if not counts:
+        return guess_slider_range(name, value)
+    # the most common range, then the widest
+    return list(max(counts, key=lambda slider_range: (counts[slider_range], slider_range[1] - slider_range[0])))
+
+
+def order_by_dependencies(statements, known_names):
+    # Keep the order of the parts, but a statement comes after the statements setting the names it reads
+    assigned = {name for name, _, _, _ in statements}
+    ordered = []
+    emitted = set(known_names)
+    pending = list(statements)
+    while pending:
+        for statement in pending:
+            if statement[2] & assigned <= emitted:
+                break
+        else:
+            # A cycle, the program keeps the order of the parts
+            statement = pending[0]
+        pending.remove(statement)
+        ordered.append(statement)
+        emitted.add(statement[0])
+    return ordered
+
+
+def format_sliders_dict(sliders):
+    # b = {"name": [min, max, name], ...} with at most ASSEMBLER_SLIDERS_PER_LINE sliders on a line
+    items = [f'"{name}": [{minimum}, {maximum}, {name}]' for name, (minimum, maximum, _) in sliders.items()]
+    lines = [", ".join(items[i:i + ASSEMBLER_SLIDERS_PER_LINE])
+             for i in range(0, len(items), ASSEMBLER_SLIDERS_PER_LINE)]
+    return "b = {" + ",\n     ".join(lines) + "}"
+
+
+def assemble_program(part_codes):
+    """
+    Return the full program of the part codes of the code writer, in the layout of Full_Programs.
+    Raise AssemblyError when the parts cannot be merged without the assembler model.
+    """
+    parts = [parse_part(i, code) for i, code in enumerate(part_codes)]
+
+    imports = []  # the imports and rhinoinside.load()
+    header = []  # other calls before the functions, e.g. print('finished loading rhinoinside')
+    constants = {}
+    functions = {}
+    for part in parts:
+        for source in part.header:
+            if source in imports or source in header:
+                continue
+            is_import = source.startswith(("import ", "from ")) or source.startswith("rhinoinside.")
+            (imports if is_import else header).append(source)
+        for name, source in part.constants.items():
+            constants.setdefault(name, source)
+        for name, source in part.functions.items():
+            if name in functions and functions[name] != source:
+                raise AssemblyError(f"parts define the function {name} differently")
+            functions.setdefault(name, source)
+
+    definitions = {}
+    for part in parts:
+        for name, source, value in part.parameters:
+            definitions.setdefault(name, []).append((part, source, value))
+    sliders = {}
+    internal = []
+    for name, name_definitions in definitions.items():
+        part, source, value = choose_definition(name, name_definitions)
+        number = get_number(value)
+        if number is not None:
+            sliders[name] = (*get_slider_range(name, number), number)
+        else:
+            loaded = {node.id for node in ast.walk(value) if isinstance(node, ast.Name)}
+            internal.append((name, source, loaded, part.index))
+    internal = order_by_dependencies(internal, sliders)
+
+    calls = []
+    objects = []
+    for part in parts:
+        for name, source, _ in part.calls:
+            if name in objects:
+                raise AssemblyError(f"parts create {name} twice")
+            calls.append(source)
+        objects += [name for name in part.objects if name not in objects]
+
+    lines = imports + [""] + header + list(constants.values()) + ["", ""]
+    for source in functions.values():
+        lines += [source, "", ""]
+    lines.append("# User Parameters:")
+    if sliders:
+        lines += ["try:", "    sliders_value = locals()['sliders_value']"]
+        for name in sliders:
+            conversion = "int" if is_count(name) else "float"
+            lines.append(f"    {name} = {conversion}(sliders_value['{name}'])")
+        lines.append("except:")
+        lines += [f"    {name} = {number}" for name, (_, _, number) in sliders.items()]
+    lines += ["", "# Internal Parameters:"]
+    previous_part = None
+    for name, source, _, part_index in internal:
+        if previous_part is not None and part_index != previous_part:
+            lines.append("")
+        lines.append(source)
+        previous_part = part_index
+    lines += ["", "# Assembling"] + calls
+    lines += ["", "# Return the created objects by placing them in variable a", f"a = [{', '.join(objects)}]"]
+    lines += ["", "# Return the parameters by placing them in variable b", format_sliders_dict(sliders)]
+    program = "\n".join(lines) + "\n"
+
+    try:
+        compile(program, "<assembled program>", 'exec')
+    except SyntaxError as error:
+        raise AssemblyError(f"the assembled program is not valid python: {error}")
+    return program
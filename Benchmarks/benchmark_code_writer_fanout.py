@@ -0,0 +1,57 @@
+"""
+Time the code writer agent for all the parts of an object, one part at a time and concurrently,
+against the fake OpenAI server of Benchmarks/fake_openai_server.py.
+
+    python -m Benchmarks.benchmark_code_writer_fanout --latency 1 --concurrency 1 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from Benchmarks.fake_openai_server import FakeOpenAIServer
+from Utils.file_utils import get_file_content
+
+PART_DESCRIPTIONS_DIR = os.path.join("Finetuning", "Example_For_Training", "Part_Descriptions")
+
+
+def run_benchmark(object_name, latency_seconds, concurrency_levels):
+    server = FakeOpenAIServer(latency_seconds)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    # The agents read the api key when they are imported
+    import run_agents
+
+    object_description = get_file_content(PART_DESCRIPTIONS_DIR, object_name).strip()
+    parts = len(object_description.split('\n\n'))
+    print(f"{object_name}: {parts} parts, {latency_seconds} seconds per request")
+    results = []
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # The generated part files are written under the working directory
+        os.chdir(temp_dir)
+        try:
+            for concurrency in concurrency_levels:
+                server.reset_stats()
+                start_time = time.perf_counter()
+                run_agents.run_code_writer_agent_for_object(object_name, object_description,
+                                                            f"benchmark_{concurrency}", max_concurrency=concurrency)
+                seconds = time.perf_counter() - start_time
+                results.append((concurrency, seconds, server.max_concurrent_requests))
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+
+    baseline = results[0][1]
+    print(f"{'concurrency':>12} {'seconds':>9} {'speedup':>8} {'max in flight':>14}")
+    for concurrency, seconds, max_concurrent_requests in results:
+        print(f"{concurrency:>12} {seconds:>9.2f} {baseline / seconds:>7.1f}x {max_concurrent_requests:>14}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the code writer agent fan-out over the parts of an object")
+    parser.add_argument("--object", default="kettle_1", help="file of Finetuning/Example_For_Training/Part_Descriptions")
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+    run_benchmark(args.object, args.latency, args.concurrency)
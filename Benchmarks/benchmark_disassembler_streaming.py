@@ -0,0 +1,75 @@
+"""
+Compare waiting for the whole disassembler answer before writing the parts with streaming it
+into the code writer, against the fake OpenAI server of Benchmarks/fake_openai_server.py.
+The fake disassembler answers with the part descriptions of an object of
+Finetuning/Example_For_Training/Part_Descriptions, word by word.
+
+    python -m Benchmarks.benchmark_disassembler_streaming --latency 0.5 --chunk-seconds 0.01
+"""
+import argparse
+import os
+import tempfile
+import time
+from Benchmarks.fake_openai_server import FakeOpenAIServer, default_response
+from Utils.file_utils import get_file_content
+
+PART_DESCRIPTIONS_DIR = os.path.join("Finetuning", "Example_For_Training", "Part_Descriptions")
+
+
+def run_benchmark(object_name, latency_seconds, chunk_seconds):
+    object_description = get_file_content(PART_DESCRIPTIONS_DIR, object_name).strip()
+    from Consts.agent_disassembler_consts import DISASSEMBLER_SYSTEM_MESSAGE
+
+    def respond(request):
+        if request['messages'][0]['content'] == DISASSEMBLER_SYSTEM_MESSAGE:
+            return object_description
+        return default_response(request)
+
+    server = FakeOpenAIServer(latency_seconds, respond=respond, chunk_seconds=chunk_seconds)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import run_agents
+
+    def run_waiting(files_name, progress):
+        description = run_agents.run_disassembler_agent_for_prompt(object_name, files_name)
+        run_agents.run_code_writer_agent_for_object(object_name, description, files_name, progress)
+
+    def run_streamed(files_name, progress):
+        run_agents.run_disassembler_and_code_writer_agents(object_name, files_name, progress)
+
+    results = []
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # The agent results are written under the working directory
+        os.chdir(temp_dir)
+        try:
+            for name, run in (("wait for disassembler", run_waiting), ("streamed", run_streamed)):
+                first_part_times = []
+
+                def progress(stage, **details):
+                    if stage == "writing part" and details['part'] == 1:
+                        first_part_times.append(time.perf_counter())
+
+                start_time = time.perf_counter()
+                run(name.replace(" ", "_"), progress)
+                total_seconds = time.perf_counter() - start_time
+                results.append((name, first_part_times[0] - start_time, total_seconds))
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+
+    print(f"{object_name}: {len(object_description.split())} words of description, "
+          f"{latency_seconds} seconds to the first word, {chunk_seconds} seconds per word")
+    print(f"{'':>22} {'first part':>11} {'total':>8}")
+    for name, first_part_seconds, total_seconds in results:
+        print(f"{name:>22} {first_part_seconds:>10.2f}s {total_seconds:>7.2f}s")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark streaming the disassembler into the code writer")
+    parser.add_argument("--object", default="kettle_1", help="file of Finetuning/Example_For_Training/Part_Descriptions")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--chunk-seconds", type=float, default=0.01)
+    args = parser.parse_args()
+    run_benchmark(args.object, args.latency, args.chunk_seconds)
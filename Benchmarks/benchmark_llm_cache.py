@@ -0,0 +1,55 @@
+"""
+Run the assembler agent twice on the part codes of every object of Finetuning/Example_For_Training/Code_Examples,
+against the fake OpenAI server of Benchmarks/fake_openai_server.py, with a fresh response cache.
+The second round is answered by the cache, the statistics show the tokens and the time it saved.
+
+    python -m Benchmarks.benchmark_llm_cache --latency 0.5 --objects 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from Benchmarks.fake_openai_server import FakeOpenAIServer
+
+CODE_EXAMPLES_DIR = os.path.join("Finetuning", "Example_For_Training", "Code_Examples")
+
+
+def read_all_codes(object_name):
+    object_dir = os.path.join(CODE_EXAMPLES_DIR, object_name)
+    all_codes = f"Object: {object_name}"
+    part_files = sorted(file_name for file_name in os.listdir(object_dir) if file_name.endswith(".py"))
+    for i, file_name in enumerate(part_files):
+        with open(os.path.join(object_dir, file_name), 'r', encoding='utf-8-sig') as f:
+            all_codes = f"{all_codes}\n\npart {i+1}\n{f.read()}"
+    return all_codes
+
+
+def run_benchmark(latency_seconds, objects):
+    server = FakeOpenAIServer(latency_seconds)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from Agents import llm_cache
+    from Agents.agent_assembler import run_assembler_agent
+
+    object_names = sorted(name for name in os.listdir(CODE_EXAMPLES_DIR) if name != "In Process")[:objects]
+    inputs = [read_all_codes(object_name) for object_name in object_names]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        llm_cache.llm_cache = llm_cache.LLMResponseCache(os.path.join(temp_dir, "responses.sqlite3"))
+        try:
+            for round_name in ("cold", "warm"):
+                start_time = time.perf_counter()
+                for all_codes in inputs:
+                    run_assembler_agent(all_codes)
+                print(f"{round_name}: {len(inputs)} assembler calls in {time.perf_counter() - start_time:.2f} seconds")
+            print(json.dumps(llm_cache.llm_cache.stats(), indent=2))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the response cache of the agents")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--objects", type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.latency, args.objects)
@@ -0,0 +1,52 @@
+"""
+Compare a new OpenAI client per call with the shared client of Agents/llm_client.py under parallel load,
+against the fake OpenAI server of Benchmarks/fake_openai_server.py.
+Reports the time of all the calls and the connections the server accepted.
+
+    python -m Benchmarks.benchmark_llm_client --requests 200 --concurrency 16 --latency 0.05
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Benchmarks.fake_openai_server import FakeOpenAIServer
+
+MESSAGES = [{'role': "user", 'content': "Kettle Lid: A flat circular disk on the top of the body"}]
+
+
+def run_benchmark(requests, concurrency, latency_seconds):
+    server = FakeOpenAIServer(latency_seconds)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    # The client layer reads the base url and the api key when it is imported
+    from openai import OpenAI
+    from Agents.llm_client import get_llm_client
+
+    clients = {
+        'new client per call': lambda: OpenAI(),
+        'shared client': lambda: get_llm_client(timeout=30)
+    }
+    print(f"{requests} requests, {concurrency} in parallel, {latency_seconds} seconds per request")
+    print(f"{'client':>20} {'seconds':>9} {'requests/s':>11} {'connections':>12}")
+    try:
+        for name, get_client in clients.items():
+            def call(_):
+                get_client().chat.completions.create(model="fake", messages=MESSAGES)
+
+            server.reset_stats()
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(call, range(requests)))
+            seconds = time.perf_counter() - start_time
+            print(f"{name:>20} {seconds:>9.2f} {requests / seconds:>11.1f} {server.connections:>12}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark connection reuse of the shared LLM client")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    run_benchmark(args.requests, args.concurrency, args.latency)
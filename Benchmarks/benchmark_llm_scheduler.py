@@ -0,0 +1,81 @@
+"""
+Load the fake OpenAI server of Benchmarks/fake_openai_server.py, which rejects requests above its rate limit
+and a share of the others with 429 or 500, with batch and interactive requests together:
+once without a scheduler, once through Agents/llm_scheduler.py with the same budget as the server.
+A minute is scaled down to window_seconds to keep the run short.
+
+    python -m Benchmarks.benchmark_llm_scheduler --batch 20 --interactive 5 --rpm 10 --window 2
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Benchmarks.fake_openai_server import FakeOpenAIServer
+
+MODEL = "fake"
+MESSAGES = [{'role': "user", 'content': "Kettle Lid: A flat circular disk on the top of the body"}]
+
+
+def run_benchmark(batch, interactive, rpm, window_seconds, error_rate):
+    server = FakeOpenAIServer(0.05, rate_limit_rpm=rpm, window_seconds=window_seconds, error_rate=error_rate)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from Agents.llm_client import get_llm_client, estimate_request_tokens
+    from Agents.llm_scheduler import LLMScheduler
+    from Consts.llm_consts import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+    request = {'model': MODEL, 'messages': MESSAGES, 'max_tokens': 100}
+    tokens = estimate_request_tokens(request)
+
+    def call():
+        return get_llm_client(timeout=30).chat.completions.create(**request)
+
+    requests = [PRIORITY_BATCH] * batch + [PRIORITY_INTERACTIVE] * interactive
+    for name in ("no scheduler", "scheduler"):
+        scheduler = LLMScheduler({MODEL: {'rpm': rpm, 'tpm': 10 ** 9}}, window_seconds=window_seconds,
+                                 backoff_base_seconds=window_seconds / 10, backoff_max_seconds=window_seconds)
+        server.reset_stats()
+        results = {PRIORITY_BATCH: [], PRIORITY_INTERACTIVE: []}
+        lock = threading.Lock()
+        start_time = time.perf_counter()
+
+        def send(priority):
+            # The interactive requests arrive after the batch requests queued
+            if priority == PRIORITY_INTERACTIVE:
+                time.sleep(window_seconds / 4)
+            sent_time = time.perf_counter()
+            try:
+                if name == "scheduler":
+                    scheduler.run(MODEL, tokens, call, priority)
+                else:
+                    call()
+                succeeded = True
+            except Exception:
+                succeeded = False
+            with lock:
+                results[priority].append((succeeded, time.perf_counter() - sent_time))
+
+        with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            list(executor.map(send, requests))
+        total_seconds = time.perf_counter() - start_time
+
+        print(f"{name}: {total_seconds:.2f} seconds, server rejected {server.rejected} requests"
+              + (f", {scheduler.retries} retries" if name == "scheduler" else ""))
+        for priority, label in ((PRIORITY_INTERACTIVE, "interactive"), (PRIORITY_BATCH, "batch")):
+            succeeded = [seconds for ok, seconds in results[priority] if ok]
+            average = sum(succeeded) / len(succeeded) if succeeded else 0
+            print(f"  {label:>11}: {len(succeeded)}/{len(results[priority])} succeeded, "
+                  f"{average:.2f} seconds on average, {max(succeeded, default=0):.2f} at most")
+    server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the rate limit aware scheduler of the agents")
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--interactive", type=int, default=5)
+    parser.add_argument("--rpm", type=int, default=10, help="requests per window of the server and the scheduler")
+    parser.add_argument("--window", type=float, default=2, help="seconds of a rate limit window")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    run_benchmark(args.batch, args.interactive, args.rpm, args.window, args.error_rate)
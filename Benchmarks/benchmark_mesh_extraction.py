@@ -0,0 +1,125 @@
+"""
+Compare the per-face python loop that create_obj_file.py used to convert a Rhino mesh
+with the bulk extraction of Geometry/mesh_utils.py.
+The meshes are synthetic grids that mimic the RhinoCommon Mesh API, so Rhino is not needed.
+The fake ToFloatArray/ToIntArray return python lists, so the bulk path measured here is the numpy
+processing of the flat arrays, not the copy of the .NET arrays of Rhino (Marshal.Copy in
+Geometry/mesh_utils.to_numpy), which needs Rhino.Inside to be measured.
+
+    python -m Benchmarks.benchmark_mesh_extraction --sizes 100 300 1000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from Geometry.mesh_utils import mesh_to_arrays
+
+
+class FakePoint():
+    __slots__ = ("X", "Y", "Z")
+
+    def __init__(self, x, y, z):
+        self.X = x
+        self.Y = y
+        self.Z = z
+
+
+class FakeFace():
+    __slots__ = ("A", "B", "C", "D", "IsTriangle", "IsQuad")
+
+    def __init__(self, a, b, c, d):
+        self.A = a
+        self.B = b
+        self.C = c
+        self.D = d
+        self.IsTriangle = c == d
+        self.IsQuad = c != d
+
+
+class FakeVertexList(list):
+    def ToFloatArray(self):
+        return [coordinate for point in self for coordinate in (point.X, point.Y, point.Z)]
+
+
+class FakeFaceList(list):
+    def ToIntArray(self, as_triangles):
+        return [index for face in self for index in (face.A, face.B, face.C, face.D)]
+
+
+class FakeMesh():
+    def __init__(self, vertices, faces):
+        self.Vertices = vertices
+        self.Faces = faces
+
+
+def create_grid_mesh(size, triangles_ratio=0.25):
+    # size x size grid of quads, every 1/triangles_ratio-th cell stored as a triangle
+    vertices = FakeVertexList(FakePoint(float(x), float(y), float((x * y) % 7))
+                              for y in range(size + 1) for x in range(size + 1))
+    faces = FakeFaceList()
+    every = max(1, int(round(1 / triangles_ratio))) if triangles_ratio else 0
+    for y in range(size):
+        for x in range(size):
+            a = y * (size + 1) + x
+            b, c, d = a + 1, a + size + 2, a + size + 1
+            if every and (y * size + x) % every == 0:
+                faces.append(FakeFace(a, b, c, c))
+            else:
+                faces.append(FakeFace(a, b, c, d))
+    return FakeMesh(vertices, faces)
+
+
+def loop_mesh_to_arrays(combined_mesh):
+    # The original conversion of create_obj_file.py
+    vertices = np.array([[v.X, v.Y, v.Z] for v in combined_mesh.Vertices], dtype=np.float64)
+    faces = []
+
+    for f in combined_mesh.Faces:
+        if f.IsTriangle:
+            faces.append([f.A, f.B, f.C])
+        elif f.IsQuad:
+            # Convert quad to two triangles
+            faces.append([f.A, f.B, f.C])
+            faces.append([f.C, f.D, f.A])
+
+    return vertices, np.array(faces, dtype=np.int32)
+
+
+def time_function(function, mesh, repeat):
+    durations = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function(mesh)
+        durations.append(time.perf_counter() - start_time)
+    return min(durations), result
+
+
+def run_benchmark(sizes, repeat):
+    results = []
+    for size in sizes:
+        mesh = create_grid_mesh(size)
+        loop_seconds, (loop_vertices, loop_faces) = time_function(loop_mesh_to_arrays, mesh, repeat)
+        bulk_seconds, (bulk_vertices, bulk_faces) = time_function(mesh_to_arrays, mesh, repeat)
+
+        # Same triangles, the bulk path only orders the split quads differently
+        assert np.allclose(loop_vertices, bulk_vertices)
+        assert sorted(map(tuple, loop_faces.tolist())) == sorted(map(tuple, bulk_faces.tolist()))
+
+        results.append({
+            'grid_size': size,
+            'vertices': len(mesh.Vertices),
+            'faces': len(mesh.Faces),
+            'triangles': len(bulk_faces),
+            'loop_ms': round(loop_seconds * 1000, 3),
+            'bulk_ms': round(bulk_seconds * 1000, 3),
+            'speedup': round(loop_seconds / bulk_seconds, 2)
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark mesh extraction: python loop vs bulk numpy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 600])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.sizes, args.repeat), indent=4))
@@ -0,0 +1,99 @@
+"""
+Build every program in Full_Programs and compare the OBJ output with the GLB variants:
+payload size and the time three.js needs to parse each file (OBJLoader / GLTFLoader, run with node).
+Needs the Rhino runtime, and node with the three package of package.json for the parse times.
+Programs the program validator rejects or that fail to build are skipped and listed with their error.
+
+    python -m Benchmarks.benchmark_model_formats --output-dir Benchmarks/Model_Formats
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+import traceback
+from Consts.geometry_consts import *
+from Geometry import rhino_runtime
+from Geometry.glb_export import export_glb
+from Geometry.mesh_utils import merge_part_meshes
+from Geometry.program_validator import find_program_problems
+from Utils.file_utils import get_file_content
+
+PARSE_SCRIPT = os.path.join(os.path.dirname(__file__), "parse_models.mjs")
+
+# (name, extension, quantize positions, compress indices)
+FORMATS = [
+    ("obj", ".obj", False, False),
+    ("glb", ".glb", False, False),
+    ("glb_quantized", ".glb", True, False),
+    ("glb_quantized_compressed", ".glb", True, True),
+]
+
+
+def export_formats(part_names, part_meshes, output_dir, program_name):
+    files = {}
+    for name, extension, quantize, compress in FORMATS:
+        output_file = os.path.join(output_dir, f"{program_name}_{name}{extension}")
+        start_time = time.perf_counter()
+        if extension == ".obj":
+            vertices, faces = merge_part_meshes(part_meshes)
+            rhino_runtime.trimesh.Trimesh(vertices=vertices, faces=faces).export(output_file)
+        else:
+            export_glb(part_names, part_meshes, output_file, quantize, compress)
+        files[name] = {'file': output_file, 'export_ms': round((time.perf_counter() - start_time) * 1000, 3)}
+    return files
+
+
+def measure_parse_times(paths):
+    if shutil.which("node") is None:
+        print("Warning: node is not installed, parse times are not measured")
+        return {}
+    output = subprocess.run(["node", PARSE_SCRIPT, *paths], capture_output=True, text=True, check=True).stdout
+    return {result['file']: result['parse_ms'] for result in json.loads(output)}
+
+
+def run_benchmark(output_dir):
+    rhino_runtime.load()
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    skipped = []
+    for file_name in sorted(os.listdir(FULL_PROGRAMS_DIR)):
+        if not file_name.endswith(".py"):
+            continue
+        program_name = os.path.splitext(file_name)[0]
+        code = get_file_content(FULL_PROGRAMS_DIR, file_name)
+        problems = find_program_problems(code, file_name)
+        if problems:
+            print(f"Skipping {file_name}: {problems[0]['message']}")
+            skipped.append({'program': file_name, 'error': problems[0]['message']})
+            continue
+        try:
+            geometry, _ = rhino_runtime.run_program(code)
+            part_meshes = rhino_runtime.breps_to_part_meshes(geometry)
+            part_names = rhino_runtime.get_model_part_names(code, geometry)
+            files = export_formats(part_names, part_meshes, output_dir, program_name)
+        except Exception as error:
+            print(f"Skipping {file_name}, it failed to build:\n{traceback.format_exc()}")
+            skipped.append({'program': file_name, 'error': f"{type(error).__name__}: {error}"})
+            continue
+        results.append({
+            'program': file_name,
+            'parts': len(part_meshes),
+            'triangles': sum(len(faces) for _, faces in part_meshes),
+            'formats': files
+        })
+
+    parse_times = measure_parse_times([file['file'] for result in results for file in result['formats'].values()])
+    for result in results:
+        for file in result['formats'].values():
+            file['bytes'] = os.path.getsize(file['file'])
+            file['parse_ms'] = parse_times.get(file['file'])
+    return {'programs': results, 'skipped': skipped}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark OBJ vs GLB payload size and parse time")
+    parser.add_argument("--output-dir", default="Benchmarks/Model_Formats")
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.output_dir), indent=4))
@@ -0,0 +1,181 @@
+"""
+Latency of the whole agents pipeline, run_all_agents, without paying for API calls.
+The agents talk to the fake OpenAI server of Benchmarks/fake_openai_server.py, which answers with the
+recorded answers of Finetuning/Json_Files, and the pipeline runs for the object descriptions of
+Finetuning/Objects_map.py one after the other.
+
+The result is JSON: p50/p95 of every stage and of the requests of every agent, tokens in and out, and the
+total wall time, with the commit and the settings of the run so runs of different commits can be compared:
+
+    python -m Benchmarks.benchmark_pipeline --latency 0.5 --chunk-seconds 0.005 --output before.json
+    python -m Benchmarks.benchmark_pipeline --latency 0.5 --chunk-seconds 0.005 --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from Benchmarks.fake_openai_server import FakeOpenAIServer, RecordedResponses
+from Finetuning.Objects_map import *
+
+JSON_FILES_DIR = os.path.join("Finetuning", "Json_Files")
+
+
+def get_commit():
+    # The commit of the measured code, and whether it had uncommitted changes
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(changes)
+
+
+def get_object_descriptions(limit=None):
+    descriptions = []
+    for objects in (OBJECTS_TO_TRAIN_DISSASSEMBLER, OBJECTS_TO_TRAIN_CODE_WRITER, OBJECTS_TO_TRAIN_FULL_PROGRAM):
+        for object_ in objects:
+            if object_.description not in descriptions:
+                descriptions.append(object_.description)
+    return descriptions[:limit]
+
+
+def percentile(values, share):
+    # Linear interpolation between the closest ranks, like numpy.percentile
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(values):
+    return {'count': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95),
+            'mean': sum(values) / len(values) if values else None}
+
+
+def run_object(run_agents, object_name):
+    # Seconds of every stage of one pipeline run, from the progress stages of run_all_agents
+    stage_times = {}
+
+    def progress(stage, **details):
+        stage_times.setdefault(stage, time.perf_counter())
+
+    start_time = time.perf_counter()
+    run_agents.run_all_agents(object_name, progress)
+    end_time = time.perf_counter()
+    assembling_time = stage_times.get("assembling", end_time)
+    stages = {
+        'first_part': stage_times.get("writing part", assembling_time) - start_time,
+        'disassembler_and_code_writer': assembling_time - start_time,
+        'assembler': end_time - assembling_time,
+        'total': end_time - start_time
+    }
+    return stages
+
+
+def run_benchmark(latency_seconds, chunk_seconds, limit=None, json_files_dir=JSON_FILES_DIR, verbose=False):
+    responses = RecordedResponses(json_files_dir)
+    server = FakeOpenAIServer(latency_seconds, respond=responses, chunk_seconds=chunk_seconds)
+    os.environ["OPENAI_BASE_URL"] = server.start()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import run_agents
+    from Consts.agent_assembler_consts import ASSEMBLER_SYSTEM_MESSAGE
+    from Consts.agent_code_writer_consts import CODE_WRITER_SYSTEM_MESSAGE
+    from Consts.agent_disassembler_consts import DISASSEMBLER_SYSTEM_MESSAGE
+    agent_names = {DISASSEMBLER_SYSTEM_MESSAGE: "disassembler", CODE_WRITER_SYSTEM_MESSAGE: "code_writer",
+                   ASSEMBLER_SYSTEM_MESSAGE: "assembler"}
+
+    object_names = get_object_descriptions(limit)
+    stage_seconds = {}
+    failed = []
+    working_dir = os.getcwd()
+    commit, uncommitted_changes = get_commit()
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # The agent results and the response cache are written under the working directory,
+        # every run starts without cached answers
+        os.chdir(temp_dir)
+        try:
+            for i, object_name in enumerate(object_names):
+                output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                try:
+                    with output:
+                        stages = run_object(run_agents, object_name)
+                except Exception as error:
+                    print(f"{i+1}/{len(object_names)} {object_name}: failed - {error}")
+                    failed.append({'object': object_name, 'error': str(error)})
+                    continue
+                print(f"{i+1}/{len(object_names)} {object_name}: {stages['total']:.2f} seconds")
+                for stage, seconds in stages.items():
+                    stage_seconds.setdefault(stage, []).append(seconds)
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+    wall_seconds = time.perf_counter() - start_time
+
+    agents = {}
+    for system_message, usage in server.usage.items():
+        agents[agent_names.get(system_message, "other")] = {
+            'requests': usage['requests'],
+            'prompt_tokens': usage['prompt_tokens'],
+            'completion_tokens': usage['completion_tokens'],
+            'request_seconds': summarize(usage['seconds'])
+        }
+    return {
+        'commit': commit,
+        'uncommitted_changes': uncommitted_changes,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {'latency_seconds': latency_seconds, 'chunk_seconds': chunk_seconds,
+                     'objects': len(object_names), 'json_files_dir': json_files_dir},
+        'wall_seconds': wall_seconds,
+        'stages': {stage: summarize(seconds) for stage, seconds in stage_seconds.items()},
+        'agents': agents,
+        'tokens': {'prompt': sum(agent['prompt_tokens'] for agent in agents.values()),
+                   'completion': sum(agent['completion_tokens'] for agent in agents.values())},
+        'replayed': {'recorded': responses.recorded, 'not_recorded': responses.not_recorded},
+        'failed': failed
+    }
+
+
+def print_comparison(result, previous):
+    if previous['settings'] != result['settings']:
+        print(f"Warning: the runs have different settings {previous['settings']} and {result['settings']}")
+    print(f"Compared with {previous.get('commit')} of {previous.get('date')}")
+    print(f"{'stage':>30} {'p50 before':>11} {'p50 now':>9} {'change':>8}")
+    for stage, summary in result['stages'].items():
+        before = previous['stages'].get(stage, {}).get('p50')
+        if before is None or summary['p50'] is None:
+            continue
+        change = (summary['p50'] - before) / before * 100 if before else 0
+        print(f"{stage:>30} {before:>10.2f}s {summary['p50']:>8.2f}s {change:>+7.1f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark run_all_agents against recorded answers")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first word of every answer")
+    parser.add_argument("--chunk-seconds", type=float, default=0.005, help="seconds for every next word")
+    parser.add_argument("--limit", type=int, default=None, help="run only the first objects of Objects_map")
+    parser.add_argument("--json-files", default=JSON_FILES_DIR, help="directory of the recorded answers")
+    parser.add_argument("--output", default=None, help="JSON file for the result")
+    parser.add_argument("--compare", default=None, help="JSON result of an earlier run to compare with")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the agents")
+    args = parser.parse_args()
+    result = run_benchmark(args.latency, args.chunk_seconds, args.limit, args.json_files, args.verbose)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Result written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            print_comparison(result, json.load(f))
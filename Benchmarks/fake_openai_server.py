@@ -0,0 +1,294 @@
+"""
+Local stand-in for the OpenAI chat completions API, to benchmark the agents without network or cost.
+Every request waits latency seconds before the first word of the answer and chunk_seconds for every
+next word, like a model generating its answer. Requests with stream=true get the words as server-sent events.
+Like the real API it can reject requests: above rate_limit_rpm requests per window_seconds with 429 and
+Retry-After, and a random error_rate share of the requests with 429 or 500.
+With --replay the answers are the recorded answers of the finetuning files, see RecordedResponses.
+
+    python -m Benchmarks.fake_openai_server --latency 2 --port 8001 --replay Finetuning/Json_Files
+
+and run the agents with OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Utils.token_utils import count_text_tokens
+
+
+def estimate_tokens(text):
+    return max(1, count_text_tokens(text))
+
+
+def split_words(text):
+    # The stream chunks, "a b" -> ["a ", "b"]
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def count_request_tokens(request, content):
+    prompt_tokens = sum(estimate_tokens(message['content']) for message in request['messages'])
+    return prompt_tokens, estimate_tokens(content)
+
+
+def get_system_message(request):
+    return next((message['content'] for message in request['messages'] if message['role'] == "system"), "")
+
+
+def default_response(request):
+    # A part function with the name of the part the prompt asks for
+    prompt = request['messages'][-1]['content']
+    return f"# Fake response for: {prompt.splitlines()[-1][:80]}\ndef create_part():\n    return None\n"
+
+
+def normalize_prompt(text):
+    # The recorded prompts separate the object name and the part with one new line, the agents with two
+    return " ".join(text.split())
+
+
+class RecordedResponses():
+    """
+    Answer with the recorded answers of the finetuning files, e.g. Finetuning/Json_Files/*.jsonl.
+    A prompt that was recorded gets its recorded answer, the latest recording wins. Other prompts get a
+    recorded answer of the same system message chosen by the prompt, so a run is the same every time,
+    and requests of unknown system messages get default_response.
+    """
+    def __init__(self, json_files_dir):
+        self.answers = {}  # (system message, prompt) -> answer
+        self.system_answers = {}  # system message -> answers
+        for file_path in sorted(glob.glob(os.path.join(json_files_dir, "*.jsonl"))):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self.add_example(json.loads(line)['messages'])
+        self.recorded = 0
+        self.not_recorded = 0
+
+    def add_example(self, messages):
+        system = get_system_message({'messages': messages})
+        # Examples of several prompts and answers are a conversation, every answer follows its prompt
+        for prompt, answer in zip(messages, messages[1:]):
+            if prompt['role'] == "user" and answer['role'] == "assistant":
+                content = answer['content'].lstrip("\ufeff\u00ef\u00bb\u00bf")
+                self.answers[(system, normalize_prompt(prompt['content']))] = content
+                self.system_answers.setdefault(system, []).append(content)
+
+    def __len__(self):
+        return len(self.answers)
+
+    def __call__(self, request):
+        system = get_system_message(request)
+        prompt = normalize_prompt(request['messages'][-1]['content'])
+        answer = self.answers.get((system, prompt))
+        if answer is not None:
+            self.recorded += 1
+            return answer
+        self.not_recorded += 1
+        answers = self.system_answers.get(system)
+        if not answers:
+            return default_response(request)
+        return answers[int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % len(answers)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connections of the client alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers={}):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+        server = self.server.fake_server
+        error = server.get_error()
+        if error:
+            status, retry_after = error
+            self.send_json(status, {'error': {'message': "Fake error", 'type': "requests", 'code': str(status)}},
+                           {'Retry-After': str(retry_after)} if retry_after is not None else {})
+            return
+        server.request_started()
+        start_time = time.perf_counter()
+        content = ""
+        try:
+            time.sleep(server.latency_seconds)
+            content = server.respond(request)
+            if request.get('stream'):
+                self.send_stream(request, content, server.chunk_seconds)
+                return
+            time.sleep(server.chunk_seconds * max(0, len(split_words(content)) - 1))
+        finally:
+            server.request_finished(request, content, time.perf_counter() - start_time)
+        prompt_tokens, completion_tokens = count_request_tokens(request, content)
+        self.send_json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': "chat.completion",
+            'created': int(time.time()),
+            'model': request.get('model', "fake"),
+            'choices': [{'index': 0, 'message': {'role': "assistant", 'content': content}, 'finish_reason': "stop"}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        })
+
+    def send_stream(self, request, content, chunk_seconds):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def send_event(data):
+            event = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+
+        def send_chunk(delta, finish_reason=None):
+            send_event(json.dumps({
+                'id': completion_id,
+                'object': "chat.completion.chunk",
+                'created': int(time.time()),
+                'model': request.get('model', "fake"),
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }))
+
+        send_chunk({'role': "assistant", 'content': ""})
+        for i, word in enumerate(split_words(content)):
+            if i:
+                time.sleep(chunk_seconds)
+            send_chunk({'content': word})
+        send_chunk({}, "stop")
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class CountingHTTPServer(ThreadingHTTPServer):
+    # Counts the TCP connections the clients opened, a client reusing its connections opens few
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        self.fake_server.connection_opened()
+        super().process_request(request, client_address)
+
+
+class FakeOpenAIServer():
+    """
+    Run the fake API in a background thread.
+    respond(request) returns the answer text of a chat completions request.
+    requests, connections, rejected and max_concurrent_requests show how the client loaded the server,
+    usage the requests, tokens and seconds of the answered requests of every system message.
+    """
+    def __init__(self, latency_seconds=1.0, port=0, respond=default_response, chunk_seconds=0,
+                 rate_limit_rpm=None, window_seconds=60, error_rate=0):
+        self.latency_seconds = latency_seconds
+        self.chunk_seconds = chunk_seconds
+        self.rate_limit_rpm = rate_limit_rpm
+        self.window_seconds = window_seconds
+        self.error_rate = error_rate
+        self.accepted_times = []
+        self.rejected = 0
+        self.respond = respond
+        self.http_server = CountingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+        self.http_server.fake_server = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.concurrent_requests = 0
+        self.max_concurrent_requests = 0
+        self.usage = {}
+
+    @property
+    def base_url(self):
+        host, port = self.http_server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def request_started(self):
+        with self.lock:
+            self.requests += 1
+            self.concurrent_requests += 1
+            self.max_concurrent_requests = max(self.max_concurrent_requests, self.concurrent_requests)
+
+    def get_error(self):
+        # (status, retry after seconds) of a rejected request, None for an accepted one
+        with self.lock:
+            now = time.monotonic()
+            self.accepted_times = [accepted for accepted in self.accepted_times if now - accepted < self.window_seconds]
+            if self.rate_limit_rpm is not None and len(self.accepted_times) >= self.rate_limit_rpm:
+                self.rejected += 1
+                return 429, round(self.accepted_times[0] + self.window_seconds - now, 3)
+            if random.random() < self.error_rate:
+                self.rejected += 1
+                return random.choice([(429, None), (500, None)])
+            self.accepted_times.append(now)
+            return None
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def request_finished(self, request, content, seconds):
+        prompt_tokens, completion_tokens = count_request_tokens(request, content)
+        with self.lock:
+            self.concurrent_requests -= 1
+            usage = self.usage.setdefault(get_system_message(request), {
+                'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'seconds': []})
+            usage['requests'] += 1
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+            usage['seconds'].append(seconds)
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.rejected = 0
+            self.accepted_times = []
+            self.max_concurrent_requests = 0
+            self.usage = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before the first word of every answer")
+    parser.add_argument("--chunk-seconds", type=float, default=0, help="seconds for every next word")
+    parser.add_argument("--rate-limit-rpm", type=int, default=None, help="requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered 429 or 500")
+    parser.add_argument("--replay", default=None, help="directory of finetuning .jsonl files to answer from")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    respond = default_response
+    if args.replay:
+        respond = RecordedResponses(args.replay)
+        print(f"Replaying {len(respond)} recorded answers of {args.replay}")
+    server = FakeOpenAIServer(args.latency, args.port, respond, chunk_seconds=args.chunk_seconds,
+                              rate_limit_rpm=args.rate_limit_rpm, error_rate=args.error_rate)
+    print(f"Fake OpenAI server at {server.base_url}")
+    server.http_server.serve_forever()
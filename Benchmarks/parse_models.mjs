@@ -0,0 +1,37 @@
+// Parse model files with the three.js loaders the viewer uses and print the parse time of each as JSON.
+//   node Benchmarks/parse_models.mjs <file.obj|file.glb> ...
+import fs from 'fs';
+import { OBJLoader } from 'three/examples/jsm/loaders/OBJLoader.js';
+import { GLTFLoader } from 'three/examples/jsm/loaders/GLTFLoader.js';
+import { MeshoptDecoder } from 'three/examples/jsm/libs/meshopt_decoder.module.js';
+
+const REPEAT = 5;
+
+function parseGlb(data) {
+    const loader = new GLTFLoader();
+    loader.setMeshoptDecoder(MeshoptDecoder);
+    const buffer = data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength);
+    return new Promise((resolve, reject) => loader.parse(buffer, '', resolve, reject));
+}
+
+async function parseFile(path) {
+    const data = fs.readFileSync(path);
+    const durations = [];
+    for (let i = 0; i < REPEAT; i++) {
+        const start = performance.now();
+        if (path.endsWith('.glb')) {
+            await parseGlb(data);
+        } else {
+            new OBJLoader().parse(data.toString());
+        }
+        durations.push(performance.now() - start);
+    }
+    return { file: path, bytes: data.length, parse_ms: Math.min(...durations) };
+}
+
+await MeshoptDecoder.ready;
+const results = [];
+for (const path of process.argv.slice(2)) {
+    results.push(await parseFile(path));
+}
+console.log(JSON.stringify(results));
@@ -5,4 +5,12 @@ ASSEMBLER_TEMPERATURE = 0.05
 ASSEMBLER_MAX_TOKENS = 4096
 ASSEMBLER_TOP_P = 0.05
 ASSEMBLER_FREQUENCY_PENALTY = 0
-ASSEMBLER_PRESENCE_PENALTY = 0
\ No newline at end of file
+ASSEMBLER_PRESENCE_PENALTY = 0
+ASSEMBLER_TIMEOUT_SECONDS = 180
+ASSEMBLER_CACHE_RESPONSES = True
+ASSEMBLER_CACHE_HIGH_TEMPERATURE = False  # cache even above LLM_CACHE_MAX_TEMPERATURE
+ASSEMBLER_LOCAL = True  # merge the parts with Agents/local_assembler.py, the model only assembles parts it cannot merge
+ASSEMBLER_SLIDER_MAX_FACTOR = 3  # a slider goes up to about 3 times the value of its parameter
+ASSEMBLER_SLIDER_MIN_MAX = 10  # the smallest slider maximum
+ASSEMBLER_COUNT_SUFFIXES = ("amount", "count", "number")  # parameters of whole numbers, e.g. holes_amount
+ASSEMBLER_SLIDERS_PER_LINE = 2  # sliders on a line of the dict b
@@ -5,3 +5,8 @@ CODE_WRITER_MAX_TOKENS = 2048
 CODE_WRITER_TOP_P = 0.05
 CODE_WRITER_FREQUENCY_PENALTY = 0
 CODE_WRITER_PRESENCE_PENALTY = 0
+# Parts of an object written together by run_code_writer_agent_for_object
+CODE_WRITER_MAX_CONCURRENCY = 4
+CODE_WRITER_TIMEOUT_SECONDS = 120
+CODE_WRITER_CACHE_RESPONSES = True
+CODE_WRITER_CACHE_HIGH_TEMPERATURE = False  # cache even above LLM_CACHE_MAX_TEMPERATURE
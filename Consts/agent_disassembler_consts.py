@@ -5,3 +5,8 @@ DISASSEMBLER_MAX_TOKENS = 2048
 DISASSEMBLER_TOP_P = 0.3
 DISASSEMBLER_FREQUENCY_PENALTY = 0
 DISASSEMBLER_PRESENCE_PENALTY = 0
+DISASSEMBLER_TIMEOUT_SECONDS = 60
+DISASSEMBLER_CACHE_RESPONSES = True
+DISASSEMBLER_CACHE_HIGH_TEMPERATURE = False  # cache even above LLM_CACHE_MAX_TEMPERATURE
+# Stream the disassembler answer and send every part to the code writer as soon as it is described
+DISASSEMBLER_STREAM = True
@@ -5,3 +5,13 @@ PARAMETER_MANIPULATOR_MAX_TOKENS = 6569
 PARAMETER_MANIPULATOR_TOP_P = 1
 PARAMETER_MANIPULATOR_FREQUENCY_PENALTY = 0
 PARAMETER_MANIPULATOR_PRESENCE_PENALTY = 0
+PARAMETER_MANIPULATOR_TIMEOUT_SECONDS = 120
+PARAMETER_MANIPULATOR_CACHE_RESPONSES = True
+PARAMETER_MANIPULATOR_CACHE_HIGH_TEMPERATURE = False  # cache even above LLM_CACHE_MAX_TEMPERATURE
+
+# Patch mode - the model answers with the new parameter values only, Geometry/parameter_patch.py applies them
+PARAMETER_MANIPULATOR_PATCH_MODE = True
+PARAMETER_PATCH_SYSTEM_MESSAGE = "Your role is to change parameters of a 3D model program by user description.\nYou receive the description and the parameters of the program with their value and allowed range.\nReturn only JSON of the changed parameters: {\"changes\": [{\"name\": \"body_height\", \"value\": 300}]}\nThe dimensions are in millimeters"
+PARAMETER_PATCH_TEMPERATURE = 0
+PARAMETER_PATCH_MAX_TOKENS = 256
+PARAMETER_PATCH_FULL_PROGRAM_FALLBACK = True  # rewrite the whole program when the answer cannot be applied
@@ -0,0 +1,8 @@
+# Batch generation of many objects, see run_batch.py
+BATCH_CONCURRENCY = 4  # objects generated at the same time, every object also writes its parts concurrently
+BATCH_MANIFEST_SUFFIX = ".manifest.json"  # prompts.txt -> prompts.txt.manifest.json
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
@@ -1,7 +1,9 @@
+import os
 ROLE = "role"
 SYSTEM = "system"
 USER = "user"
 ASSISTANT = "assistant"
 CONTENT = "content"
 MESSAGES = "messages"
-# we removed the api key from the code
+# we removed the api key from the code, it is read from the environment
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
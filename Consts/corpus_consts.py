@@ -0,0 +1,34 @@
+import os
+
+# Index of the example corpus, see Finetuning/corpus_index.py
+CORPUS_INDEX_FILE = os.path.join("Finetuning", "Corpus_Index", "corpus.sqlite3")
+
+DESCRIPTION = "description"
+PART_CODE = "part_code"
+FULL_PROGRAM = "full_program"
+
+# (root, directory, kind) of the indexed trees, Code_Examples and Full_Programs are copies of the training examples
+CORPUS_DIRECTORIES = [
+    ("training", os.path.join("Finetuning", "Example_For_Training", "Part_Descriptions"), DESCRIPTION),
+    ("training", os.path.join("Finetuning", "Example_For_Training", "Code_Examples"), PART_CODE),
+    ("training", os.path.join("Finetuning", "Example_For_Training", "Full_Programs"), FULL_PROGRAM),
+    ("examples", "Code_Examples", PART_CODE),
+    ("programs", "Full_Programs", FULL_PROGRAM),
+]
+CORPUS_SKIPPED_DIRECTORIES = {"__pycache__"}
+
+# Modeling operations of the Rhino calls of a program, an operation matches the calls containing one of its words
+CORPUS_OPERATIONS = {
+    "loft": ["Loft"],
+    "sweep": ["Sweep"],
+    "revolve": ["Revolve", "RevSurface"],
+    "extrude": ["Extrusion", "Extrude"],
+    "pipe": ["Pipe"],
+    "boolean": ["Boolean"],
+    "fillet": ["Fillet"],
+    "offset": ["Offset"],
+    "sphere": ["Sphere"],
+    "split": ["Split"],
+    "join": ["Join"],
+    "transform": ["Transform"],
+}
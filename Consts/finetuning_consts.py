@@ -0,0 +1,17 @@
+import os
+
+# Incremental build of the finetuning files, see Finetuning/build_json_for_finetuning.py
+FINETUNING_READ_WORKERS = 8  # example files read at the same time
+FINETUNING_MANIFEST_SUFFIX = ".manifest.json"  # next to every finetuning file, the hashes of its examples
+
+# Validation of the finetuning files, see Finetuning/validate_finetuning_file.py
+FINETUNING_TOKEN_CACHE_FILE = os.path.join("Finetuning", "Token_Cache", "token_counts.sqlite3")
+FINETUNING_TOKENIZE_WORKERS = os.cpu_count() or 1  # processes counting tokens
+FINETUNING_TOKENIZE_BATCH_SIZE = 64  # records sent to a process at once
+FINETUNING_MAX_TOKENS_PER_EXAMPLE = 4096  # longer examples are truncated during fine-tuning
+FINETUNING_TARGET_EPOCHS = 3
+FINETUNING_MIN_TARGET_EXAMPLES = 100
+FINETUNING_MAX_TARGET_EXAMPLES = 25000
+FINETUNING_MIN_DEFAULT_EPOCHS = 1
+FINETUNING_MAX_DEFAULT_EPOCHS = 25
+FINETUNING_PRICE_PER_1K_TOKENS = 0.008  # USD per 1K trained tokens of gpt-3.5-turbo
@@ -0,0 +1,64 @@
+import os
+
+FULL_PROGRAMS_DIR = "Full_Programs"
+MODELS_DIR = "static/models"
+OUTPUT_MESH_FILE = f"{MODELS_DIR}/output_combined_mesh.obj"
+PROGRAM_FILE_NAME_FILE = "file_name.txt"
+
+# Module that loads the geometry runtime inside a worker. It must expose load() and build_model().
+# Set GEOMETRY_RUNTIME_MODULE=Geometry.stub_runtime to run the server without Rhino.
+GEOMETRY_RUNTIME_MODULE = os.environ.get("GEOMETRY_RUNTIME_MODULE", "Geometry.rhino_runtime")
+GEOMETRY_WORKERS = int(os.environ.get("GEOMETRY_WORKERS", 2))
+GEOMETRY_WORKER_MAX_JOBS = 200  # recycle a worker after this many jobs
+GEOMETRY_WORKER_START_TIMEOUT = 120  # seconds, loading Rhino is slow
+GEOMETRY_WORKER_START_ATTEMPTS = 2  # starts of a replacement worker before the pool runs with one worker less
+GEOMETRY_WORKER_WAIT_INTERVAL = 5  # seconds between the checks of a waiting job for workers the pool lost
+GEOMETRY_JOB_TIMEOUT = 120
+GEOMETRY_HEALTH_CHECK_TIMEOUT = 5
+
+# "pool" - long-lived spawned workers, "fork_server" - a child forked per job from a warm zygote process,
+# with the limits below. Forking needs a POSIX system and a runtime that survives fork (not Rhino.Inside).
+GEOMETRY_EXECUTOR = os.environ.get("GEOMETRY_EXECUTOR", "pool")
+FORK_SERVER_MAX_JOBS = GEOMETRY_WORKERS  # jobs running at the same time
+GEOMETRY_JOB_CPU_SECONDS = 60  # SIGXCPU, the job gets FORK_SERVER_CPU_GRACE_SECONDS more before SIGKILL
+FORK_SERVER_CPU_GRACE_SECONDS = 5
+FORK_SERVER_EXIT_STATUS_TIMEOUT = 2  # seconds to wait for the exit status of a job that died without a result
+FORK_SERVER_REAP_INTERVAL = 0.1  # seconds between the checks of the zygote for finished jobs
+GEOMETRY_JOB_MEMORY_BYTES = 4 * 1024 * 1024 * 1024  # address space of a job, RLIMIT_AS
+
+MESH_CACHE_ENABLED = True
+MESH_CACHE_DIR = "Mesh_Cache"
+MESH_CACHE_MAX_SIZE_BYTES = 500 * 1024 * 1024
+MESH_CACHE_COMPRESSION = True  # used only when the zstandard package is installed
+
+# Parts kept in the memory of every worker, a slider change rebuilds only the parts depending on it
+PART_CACHE_ENABLED = True
+PART_CACHE_MAX_ENTRIES = 256
+
+# Programs are checked statically before they are sent to a worker, see Geometry/program_validator.py
+PROGRAM_VALIDATION_ENABLED = True
+PROGRAM_VALIDATION_CACHE_ENTRIES = 256
+
+# Mesh quality levels, the settings of Rhino.Geometry.MeshingParameters: a preset and properties set on it.
+# Coarse meshes are fast previews while dragging sliders, fine meshes are for printing.
+MESH_QUALITY_LEVELS = {
+    "coarse": {"preset": "Coarse", "SimplePlanes": True},
+    "default": {"preset": "Default"},
+    "fine": {"preset": "QualityRenderMesh"}
+}
+MESH_QUALITY_DEFAULT = "default"
+MESH_QUALITY_PREVIEW = "coarse"
+MESH_QUALITY_EXPORT = "fine"
+# Modified models are shown coarse first and replaced by the default quality when it is ready
+MESH_PROGRESSIVE = True
+
+# GLB output for the viewer, see Geometry/glb_export.py
+GLB_QUANTIZE_POSITIONS = True
+GLB_COMPRESS_INDICES = True  # used only when the meshoptimizer package is installed
+
+# Every build writes its files under its own artifact directory, see Utils/artifact_utils.py
+ARTIFACTS_DIR = f"{MODELS_DIR}/artifacts"
+ARTIFACT_MODEL_FILE_NAME = "model.glb"
+ARTIFACT_MAX_AGE_SECONDS = 24 * 60 * 60
+ARTIFACTS_MAX_SIZE_BYTES = 1024 * 1024 * 1024
+ARTIFACTS_GC_INTERVAL_SECONDS = 5 * 60
@@ -0,0 +1,11 @@
+JOBS_MAX_CONCURRENCY = 4  # jobs running at the same time
+JOBS_MAX_QUEUE = 16  # jobs waiting for a free slot, more are rejected with 429
+JOBS_RESULT_TTL_SECONDS = 60 * 60  # finished jobs are forgotten after this time
+JOBS_EVENTS_KEEPALIVE_SECONDS = 15  # comment sent on an idle event stream to detect disconnected clients
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
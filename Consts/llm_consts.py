@@ -0,0 +1,32 @@
+import os
+
+# Shared OpenAI client of all the agents, see Agents/llm_client.py
+# Another OpenAI compatible server, e.g. Benchmarks/fake_openai_server.py: OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+LLM_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_KEEPALIVE_EXPIRY_SECONDS = 60
+LLM_CONNECT_TIMEOUT_SECONDS = 10
+LLM_TIMEOUT_SECONDS = 120  # for agents without a timeout of their own
+LLM_MAX_RETRIES = 0  # retries are scheduled by Agents/llm_scheduler.py with backoff
+
+# Response cache of the agents, see Agents/llm_cache.py
+LLM_CACHE_FILE = os.path.join("LLM_Cache", "responses.sqlite3")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+LLM_CACHE_MAX_SIZE_BYTES = 100 * 1024 * 1024
+# Answers of agents sampling at a higher temperature vary between calls and are not cached,
+# unless the agent forces caching
+LLM_CACHE_MAX_TEMPERATURE = 0.3
+
+# Scheduler of the agent requests, see Agents/llm_scheduler.py
+# Requests and tokens per minute of every model, models not listed get the default budget
+LLM_RATE_LIMITS = {}  # e.g. {"gpt-3.5-turbo": {"rpm": 3500, "tpm": 90000}}
+LLM_DEFAULT_RPM = int(os.environ.get("LLM_DEFAULT_RPM", 500))
+LLM_DEFAULT_TPM = int(os.environ.get("LLM_DEFAULT_TPM", 200000))
+LLM_RATE_WINDOW_SECONDS = 60
+LLM_MAX_ATTEMPTS = 6
+LLM_BACKOFF_BASE_SECONDS = 1
+LLM_BACKOFF_MAX_SECONDS = 60
+# Lower runs first: a user waiting in the browser before batch generation
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
@@ -0,0 +1,43 @@
+# Resolve prompts like "Change jar height to 30 cm" without the parameter manipulator agent
+PARAMETER_RESOLVER_ENABLED = True
+PARAMETER_RESOLVER_FUZZY_MIN_SIMILARITY = 0.8  # edit similarity for a misspelled word to match a parameter word
+PARAMETER_RESOLVER_FUZZY_MIN_LENGTH = 4  # shorter words only match exactly
+PARAMETER_RESOLVER_MAX_UNKNOWN_WORDS = 2  # words of a change that are not understood, like the object name "jar"
+
+# Millimeters of every unit, the programs are in millimeters
+PARAMETER_RESOLVER_UNITS = {"mm": 1, "millimeter": 1, "millimeters": 1, "millimetre": 1, "millimetres": 1,
+                            "cm": 10, "centimeter": 10, "centimeters": 10, "centimetre": 10, "centimetres": 10,
+                            "m": 1000, "meter": 1000, "meters": 1000, "metre": 1000, "metres": 1000,
+                            "in": 25.4, "inch": 25.4, "inches": 25.4, '"': 25.4}
+# Units the resolver does not convert, a change with one of them is left to the agent
+PARAMETER_RESOLVER_UNSUPPORTED_UNITS = {"ft", "foot", "feet", "yd", "yard", "yards", "deg", "degree", "degrees",
+                                        "rad", "radian", "radians", "px", "pt"}
+# Prompt words -> parameter name words
+PARAMETER_RESOLVER_SYNONYMS = {"high": "height", "tall": "height", "taller": "height", "higher": "height",
+                               "shorter": "height", "lower": "height", "heigth": "height",
+                               "wide": "width", "wider": "width", "narrower": "width",
+                               "long": "length", "longer": "length",
+                               "thick": "thickness", "thicker": "thickness", "thinner": "thickness",
+                               "deep": "height", "depth": "height",
+                               "hole": "holes", "count": "amount", "number": "amount",
+                               "radii": "radius", "diameter": "radius", "wall": "thickness"}
+# Words whose value is the double of a radius
+PARAMETER_RESOLVER_DIAMETER_WORDS = {"diameter"}
+# Words of a width, the diameter of a round part without a width parameter
+PARAMETER_RESOLVER_WIDTH_WORDS = {"wide", "wider", "narrower", "width"}
+# Words that set the direction of a relative change, "increase the height by 2 cm"
+PARAMETER_RESOLVER_INCREASE_WORDS = {"increase", "enlarge", "extend", "grow", "add", "raise", "taller",
+                                     "higher", "wider", "longer", "thicker", "bigger", "larger", "more"}
+PARAMETER_RESOLVER_DECREASE_WORDS = {"decrease", "reduce", "shrink", "lower", "shorten", "cut", "shorter",
+                                     "narrower", "thinner", "smaller", "less"}
+# Words of a change that carry no meaning for the resolver
+PARAMETER_RESOLVER_FILLER_WORDS = {"change", "set", "make", "modify", "update", "adjust", "put", "let", "please",
+                                   "the", "a", "an", "of", "to", "be", "is", "it", "its", "at", "so", "that",
+                                   "with", "by", "from", "i", "want", "would", "like", "should", "can", "you",
+                                   "new", "value", "parameter", "object", "model", "percent", "times", "and"}
+# The part of the object a parameter without a part word in the prompt belongs to, "height" -> body_height
+PARAMETER_RESOLVER_DEFAULT_PART = "body"
+# Parts of objects, with the part words of the parameters of Full_Programs. A change naming a part the program
+# does not have, "the handle height" of a glass, is left to the agent.
+PARAMETER_RESOLVER_PART_WORDS = {"body", "lid", "handle", "spout", "rim", "neck", "base", "ring", "stem", "foot",
+                                 "knob", "edge", "hole", "holes", "top", "bottom", "side", "leg", "legs", "cover"}
@@ -0,0 +1,25 @@
+ROUTER_CONFIDENCE_THRESHOLD = 0.35  # share of the prompt that must match a stored program
+ROUTER_FUZZY_MIN_SIMILARITY = 0.4  # trigram similarity for a misspelled word to count as a known word
+ROUTER_MAX_POSTINGS = 256  # programs scanned per word, keeps a lookup bounded when the catalog grows
+# Weight of a prompt word no program has, as a share of the weight of the rarest indexed word.
+# Adjectives like "large" or "white" lower the confidence a little, they do not reject the prompt.
+ROUTER_UNKNOWN_WORD_WEIGHT = 0.25
+ROUTER_BM25_K1 = 1.2
+ROUTER_BM25_B = 0.75
+# Run the agents for prompts that match no stored program. Off until the finetuned models are ready.
+ROUTER_AGENT_FALLBACK = False
+
+ROUTER_STOP_WORDS = {"a", "an", "the", "with", "without", "of", "and", "or", "in", "on", "to", "for", "at",
+                     "by", "from", "that", "which", "is", "its", "it", "i", "me", "my", "want", "need",
+                     "make", "create", "generate", "please", "some", "shape", "shaped", "would", "like"}
+# Words of prompts that have no stored program of their own, a word routes by its indexed synonyms
+# (a cup is a mug, or a glass while the mug programs do not pass the program validator)
+ROUTER_SYNONYMS = {"cup": ["mug", "glass"], "dish": ["plate"], "jug": ["measuring", "jug"], "pan": ["baking", "mold"],
+                   "tumbler": ["glass"], "planter": ["plant", "pot"], "dispenser": ["toothpick", "dispenser"]}
+
+# Prompts and the program they must route to, None for no program, see python -m Geometry.program_router
+ROUTER_CHECKS = {"a large deep bowl": "bowl_2.py", "a small white plate": "plate_1.py", "a big square box": "box_1.py",
+                 "I would like a plate": "plate_1.py", "a cup": "glass_1.py", "a wine glass": "glass_1.py",
+                 "a bottel": "bottle_1.py", "a flower pot with holes": "flower_pot_1.py",
+                 "a toothpick dispenser": "toothpick_dispenser_1.py", "a round table": None, "a door handle": None,
+                 "a kettle": None, "a blue elephant": None}
@@ -0,0 +1,8 @@
+import os
+# TRACING=1 in the environment turns the spans of Utils/tracing.py on, also in the geometry workers
+TRACING_ENABLED = os.environ.get("TRACING", "0") == "1"
+TRACE_DIR = "Traces"
+TRACE_LOG_FILE = os.path.join(TRACE_DIR, "spans.jsonl")  # finished spans, one JSON object per line
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024  # the log is rotated to spans.jsonl.1 above this size
+TRACE_LOG_BACKUPS = 3  # rotated logs kept
+TRACE_MAX_SPANS_IN_MEMORY = 10000  # finished spans kept for export_chrome_trace
@@ -1,143 +1,262 @@
-from datetime import datetime
+"""
+Build the finetuning files of the agents out of the examples of Finetuning/Example_For_Training.
+
+Every build writes a new file, e.g. Json_Files/code_writer_finetuning_2024_03_25_08_59_07.jsonl, and its
+manifest, code_writer_finetuning_2024_03_25_08_59_07.manifest.json, with the hash of every object, the files
+it was built from and the position of its records in the file. The next build reuses the records of the
+objects whose files, description and system message did not change, copied from the previous file, and
+renders only the changed objects. Their files are read from the corpus index of Finetuning/corpus_index.py,
+refreshed before every build, and the records are streamed to the file.
+The manifest also lists the objects added, removed and changed since the previous build.
+
+    python -m Finetuning.build_json_for_finetuning code_writer assembler   - build the files of these agents
+    python -m Finetuning.build_json_for_finetuning --full                  - render every object again
+    python -m Finetuning.build_json_for_finetuning --diff old.manifest.json new.manifest.json
+"""
+import argparse
+import errno
+import glob
+import hashlib
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from Finetuning.Objects_map import *
 from Consts.consts import *
 from Consts.agent_code_writer_consts import *
 from Consts.agent_disassembler_consts import *
 from Consts.agent_assembler_consts import *
+from Consts.finetuning_consts import *
+from Finetuning.corpus_index import CorpusIndex
 from Utils.string_utils import *
 from Utils.file_utils import *
 from Utils.model_utils import *
 
-json_dir = "Finetuning\Json_Files"
-examples_for_training_dir = "Finetuning\Example_For_Training"
-description_files_dir = f"{examples_for_training_dir}\Part_Descriptions"
-code_files_dir = f"{examples_for_training_dir}\Code_Examples"
-full_program_files_dir = f"{examples_for_training_dir}\Full_Programs"
-
-def read_description_file_and_split_parts_by_double_enter(file_name):
-    try:
-        content = get_file_content(description_files_dir, file_name)
-
-        # Split the content by double row enters
-        result = content.split('\n\n')
-
-        return result
-    except FileNotFoundError:
-        print(f"Error: File '{file_name}' not found.")
-        return []
 
+def get_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-def get_code_as_string(file_name):
-    file_path = os.path.join(code_files_dir, file_name + ".py")
-    print(file_path)
-    with open(file_path, 'r') as file:
-        code_content = file.read()
-    return code_content
 
+class ExampleSources():
+    """The files an object is built from, read from the corpus index, with their hash, size and modification time."""
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.files = {}  # path -> {'sha256', 'size', 'mtime_ns'}
+        self.listings = {}  # directory -> the part files in it
 
-def create_code_writer_json_file(system_message, objects):
-    data_array = []
-    for object_ in objects:
-        object_parts = read_description_file_and_split_parts_by_double_enter(
-            object_.file_name)
-
-        for object_part in object_parts:
-            data = {MESSAGES: []}
-            part_description = object_.description + "\n" + object_part
-            part_name = get_text_before_colon(object_part)
-            part_code = get_code_as_string(
-                object_.file_name + "\\" + part_name)
-
-            message = {ROLE: USER, CONTENT: part_description}
-            data[MESSAGES].append(message)
-
-            assistant_message = {ROLE: ASSISTANT, CONTENT: part_code}
-            data[MESSAGES].append(assistant_message)
-
-            system_message_obj = {ROLE: SYSTEM, CONTENT: system_message}
-            data[MESSAGES].insert(0, system_message_obj)
-            data_array.append(data)
+    def read(self, *path_parts):
+        file = self.corpus.get_file(os.path.join(*path_parts))
+        if file is None:
+            raise FileNotFoundError(errno.ENOENT, "Not in the corpus index", os.path.join(*path_parts))
+        self.files[file['path']] = {'sha256': file['sha256'], 'size': file['size'], 'mtime_ns': file['mtime_ns']}
+        return file['text']
+
+    def list_part_files(self, directory):
+        names = self.corpus.list_part_files(directory)
+        self.listings[directory] = names
+        return names
+
+
+def is_unchanged(entry, inputs_sha256, corpus):
+    # Without reading the files: the same inputs, file hashes of the index and part files
+    if entry is None or entry['inputs_sha256'] != inputs_sha256:
+        return False
+    for path, source in entry['sources'].items():
+        file = corpus.get_file(path)
+        if file is None or file['sha256'] != source['sha256']:
+            return False
+    return all(corpus.list_part_files(directory) == names for directory, names in entry['listings'].items())
+
+
+def create_record(system_message, user_content, assistant_content):
+    return {MESSAGES: [{ROLE: SYSTEM, CONTENT: system_message},
+                       {ROLE: USER, CONTENT: user_content},
+                       {ROLE: ASSISTANT, CONTENT: assistant_content}]}
+
+
+def create_disassembler_records(system_message, object_, sources):
+    parts_description = sources.read(description_files_dir, object_.file_name)
+    return [create_record(system_message, object_.description, parts_description)]
+
+
+def create_code_writer_records(system_message, object_, sources):
+    records = []
+    for object_part in sources.read(description_files_dir, object_.file_name).split('\n\n'):
+        part_description = object_.description + "\n" + object_part
+        part_name = get_text_before_colon(object_part)
+        part_code = sources.read(code_files_dir, object_.file_name, part_name + ".py")
+        records.append(create_record(system_message, part_description, part_code))
+    return records
+
+
+def create_assembler_records(system_message, object_, sources):
+    parts_dir = os.path.join(code_files_dir, object_.file_name)
+    part_codes = [sources.read(parts_dir, file_name) for file_name in sources.list_part_files(parts_dir)]
+    all_codes = create_string_with_all_parts_code(object_.description, part_codes)
+    full_program = sources.read(full_program_files_dir, f"{object_.file_name}.py")
+    return [create_record(system_message, all_codes, full_program)]
+
+
+AGENT_DATASETS = {
+    "disassembler": (DISASSEMBLER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_DISSASSEMBLER, create_disassembler_records),
+    "code_writer": (CODE_WRITER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_CODE_WRITER, create_code_writer_records),
+    "assembler": (ASSEMBLER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_FULL_PROGRAM, create_assembler_records)
+}
+
+
+def render_object(create_records, system_message, object_, corpus):
+    # The JSONL lines of the records of an object and the files they were built from
+    sources = ExampleSources(corpus)
+    records = create_records(system_message, object_, sources)
+    return "".join(json.dumps(record) + "\n" for record in records).encode('utf-8'), sources, len(records)
+
+
+def find_latest_manifest(agent):
+    manifests = sorted(glob.glob(os.path.join(json_dir, f"{agent}_finetuning_*{FINETUNING_MANIFEST_SUFFIX}")))
+    if not manifests:
+        return None
+    with open(manifests[-1], 'r') as f:
+        return json.load(f)
+
+
+def diff_manifests(old, new):
+    """The objects added, removed and changed between two builds of the same agent."""
+    old_objects = {entry['file_name']: entry['sha256'] for entry in old['objects']} if old else {}
+    new_objects = {entry['file_name']: entry['sha256'] for entry in new['objects']}
+    return {
+        'previous': old['dataset'] if old else None,
+        'added': [name for name in new_objects if name not in old_objects],
+        'removed': [name for name in old_objects if name not in new_objects],
+        'changed': [name for name in new_objects if name in old_objects and new_objects[name] != old_objects[name]],
+        'unchanged': sum(1 for name in new_objects if old_objects.get(name) == new_objects[name])
+    }
+
+
+def read_previous_block(previous_file, entry):
+    # The records of an object in the previous file, None when the file was changed since
+    previous_file.seek(entry['offset'])
+    block = previous_file.read(entry['length'])
+    return block if hashlib.sha256(block).hexdigest() == entry['sha256'] else None
+
+
+def build_finetuning_file(agent, full=False, read_workers=FINETUNING_READ_WORKERS):
+    """
+    Build the finetuning file of an agent of AGENT_DATASETS, reusing the unchanged objects of the previous build.
+    Return the path of the file, the previous file when nothing changed.
+    """
+    system_message, objects, create_records = AGENT_DATASETS[agent]
+    corpus = CorpusIndex()
+    corpus.refresh(examples=False)
+    previous = None if full else find_latest_manifest(agent)
+    previous_path = os.path.join(json_dir, previous['dataset']) if previous else None
+    if previous_path and not os.path.exists(previous_path):
+        previous, previous_path = None, None
+    previous_entries = {entry['file_name']: entry for entry in previous['objects']} if previous else {}
 
     os.makedirs(json_dir, exist_ok=True)
-
     formatted_string = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    json_file_path = os.path.join(
-        json_dir, f"code_writer_finetuning_{formatted_string}.jsonl")
-    with open(json_file_path, 'w') as json_file:
-        for data in data_array:
-            json.dump(data, json_file)  # , indent=4
-            json_file.write("\n")
-
-    print(f"JSON file created at: {json_file_path}")
-
-
-def create_disassembler_json_file(system_message, objects):
-    data_array = []
-    for object_ in objects:
-        data = {MESSAGES: []}
-        parts_description = get_file_content(description_files_dir, object_.file_name)
-
-        message = {ROLE: USER, CONTENT: object_.description}
-        data[MESSAGES].append(message)
-
-        assistant_message = {ROLE: ASSISTANT, CONTENT: parts_description}
-        data[MESSAGES].append(assistant_message)
-
-        system_message_obj = {ROLE: SYSTEM, CONTENT: system_message}
-        data[MESSAGES].insert(0, system_message_obj)
-        data_array.append(data)
-
-    os.makedirs(json_dir, exist_ok=True)
-
-    formatted_string = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    json_file_path = os.path.join(
-        json_dir, f"disassembler_finetuning_{formatted_string}.jsonl")
-    with open(json_file_path, 'w') as json_file:
-        for data in data_array:
-            json.dump(data, json_file)  # , indent=4
-            json_file.write("\n")
-
-    print(f"JSON file created at: {json_file_path}")
-
-def create_assembler_json_file(system_message, objects):
-    data_array = []
-    for object_ in objects:        
-        all_codes = create_string_with_all_parts_code_from_dir(object_.description, object_.file_name)
-
-        full_program = get_file_content(full_program_files_dir,f"{object_.file_name}.py")
-        data = {MESSAGES: []}
-
-        system_message_obj = {ROLE: SYSTEM, CONTENT: system_message}
-        data[MESSAGES].append(system_message_obj)
-
-        message = {ROLE: USER, CONTENT: all_codes}
-        data[MESSAGES].append(message)
-
-        assistant_message = {ROLE: ASSISTANT, CONTENT: full_program}
-        data[MESSAGES].append(assistant_message)
-
-        data_array.append(data)  
-
-    os.makedirs(json_dir, exist_ok=True)
-
-    formatted_string = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    json_file_path = os.path.join(
-        json_dir, f"assembler_finetuning_{formatted_string}.jsonl")
-    with open(json_file_path, 'w') as json_file:
-        for data in data_array:
-            json.dump(data, json_file)  # , indent=4
-            json_file.write("\n")
-
-def build_code_writer_finetuning_file():
-    create_code_writer_json_file(CODE_WRITER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_CODE_WRITER)
-
-
-def build_disassembler_finetuning_file():
-    create_disassembler_json_file(DISASSEMBLER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_DISSASSEMBLER)
-
-def build_assembler_finetuning_file():
-    create_assembler_json_file(ASSEMBLER_SYSTEM_MESSAGE, OBJECTS_TO_TRAIN_FULL_PROGRAM)
-
-
+    dataset_name = f"{agent}_finetuning_{formatted_string}.jsonl"
+    json_file_path = os.path.join(json_dir, dataset_name)
+    entries = []
+    skipped = []
+    rendered = 0
+    dataset_hash = hashlib.sha256()
+
+    # Written to a temporary file, a build without changes in the same second must not remove the previous file
+    temp_file_path = f"{json_file_path}.tmp"
+    with open(temp_file_path, 'wb') as json_file, \
+            (open(previous_path, 'rb') if previous_path else open(os.devnull, 'rb')) as previous_file, \
+            ThreadPoolExecutor(max_workers=max(1, read_workers), thread_name_prefix="finetuning") as executor:
+
+        def write_object(object_, inputs_sha256, entry, future):
+            nonlocal rendered
+            block = read_previous_block(previous_file, entry) if entry else None
+            if block is None:
+                if future is None:
+                    future = executor.submit(render_object, create_records, system_message, object_, corpus)
+                try:
+                    block, sources, records = future.result()
+                except OSError as error:
+                    print(f"Warning: {object_.file_name} is skipped: {error}")
+                    skipped.append({'file_name': object_.file_name, 'error': str(error)})
+                    return
+                rendered += 1
+                entry = {'file_name': object_.file_name, 'description': object_.description,
+                         'inputs_sha256': inputs_sha256, 'records': records,
+                         'sources': sources.files, 'listings': sources.listings}
+            entry = dict(entry, offset=json_file.tell(), length=len(block), sha256=hashlib.sha256(block).hexdigest())
+            json_file.write(block)
+            dataset_hash.update(block)
+            entries.append(entry)
+
+        # The changed objects are read ahead in the threads, the file is written in the order of the objects
+        pending = deque()
+        for object_ in objects:
+            inputs_sha256 = get_sha256(json.dumps([system_message, object_.description]))
+            entry = previous_entries.get(object_.file_name)
+            if is_unchanged(entry, inputs_sha256, corpus):
+                pending.append((object_, inputs_sha256, entry, None))
+            else:
+                pending.append((object_, inputs_sha256, None,
+                                executor.submit(render_object, create_records, system_message, object_, corpus)))
+            while len(pending) > 2 * read_workers:
+                write_object(*pending.popleft())
+        while pending:
+            write_object(*pending.popleft())
+
+    manifest = {
+        'agent': agent,
+        'dataset': dataset_name,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'sha256': dataset_hash.hexdigest(),
+        'records': sum(entry['records'] for entry in entries),
+        'rendered': rendered,
+        'reused': len(entries) - rendered,
+        'objects': entries,
+        'skipped': skipped
+    }
+    manifest['changes'] = diff_manifests(previous, manifest)
+    changes = manifest['changes']
+    if previous and previous['sha256'] == manifest['sha256'] and skipped == previous['skipped']:
+        os.remove(temp_file_path)
+        print(f"{agent}: no example changed since {previous['dataset']}")
+        return previous_path
+
+    os.replace(temp_file_path, json_file_path)
+    with open(json_file_path[:-len(".jsonl")] + FINETUNING_MANIFEST_SUFFIX, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"JSON file created at: {json_file_path} - {manifest['records']} records, {rendered} objects rendered, "
+          f"{manifest['reused']} reused, added {changes['added']}, removed {changes['removed']}, "
+          f"changed {changes['changed']}")
+    return json_file_path
+
+
+def build_code_writer_finetuning_file(full=False):
+    return build_finetuning_file("code_writer", full)
+
+
+def build_disassembler_finetuning_file(full=False):
+    return build_finetuning_file("disassembler", full)
+
+
+def build_assembler_finetuning_file(full=False):
+    return build_finetuning_file("assembler", full)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the finetuning files of the agents incrementally")
+    parser.add_argument("agents", nargs="*", default=list(AGENT_DATASETS), help=f"agents of {list(AGENT_DATASETS)}")
+    parser.add_argument("--full", action="store_true", help="render every object, without the previous build")
+    parser.add_argument("--workers", type=int, default=FINETUNING_READ_WORKERS, help="objects rendered at the same time")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="print the changes between two manifests")
+    args = parser.parse_args()
+    if args.diff:
+        manifests = []
+        for path in args.diff:
+            with open(path, 'r') as f:
+                manifests.append(json.load(f))
+        print(json.dumps(diff_manifests(*manifests), indent=2))
+    else:
+        for agent in args.agents:
+            build_finetuning_file(agent, args.full, args.workers)
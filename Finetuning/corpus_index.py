@@ -0,0 +1,419 @@
+"""
+Index of the example corpus in SQLite: the part descriptions of the objects, the code of their parts and of
+their full programs, the parameters, Rhino calls and modeling operations of the code, the problems of the full
+programs and the token counts of every file and of every finetuning example of the agents.
+
+    python -m Finetuning.corpus_index --stats
+    python -m Finetuning.corpus_index --operation sweep                   - the parts with a sweep
+    python -m Finetuning.corpus_index --operation loft --kind full_program
+    python -m Finetuning.corpus_index --examples-over 2000                - the finetuning examples over 2000 tokens
+    python -m Finetuning.corpus_index --parameter "%radius%"
+    python -m Finetuning.corpus_index --problems                          - the full programs that cannot run
+    python -m Finetuning.corpus_index --sql "SELECT object, COUNT(*) FROM files GROUP BY object"
+
+Every command refreshes the index first. A refresh reads only the files whose size or modification time
+changed and analyses only the contents whose hash it has not seen, a file copied to Code_Examples and
+Example_For_Training is analysed once. The examples are rendered from the index and tokenized only when
+they changed. The finetuning files are built from the index, see Finetuning/build_json_for_finetuning.py.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from Consts.consts import *
+from Consts.corpus_consts import *
+from Geometry.parameter_patch import get_number, find_default_assignments, get_slider_ranges
+from Geometry.program_validator import find_program_problems
+from Utils.string_utils import get_text_before_colon
+from Utils.token_utils import count_text_tokens, num_tokens_from_messages, get_tokenizer_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    root TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    object TEXT,
+    part TEXT,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE TABLE IF NOT EXISTS contents (
+    sha256 TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    tokenizer TEXT NOT NULL,
+    problems TEXT
+);
+CREATE TABLE IF NOT EXISTS part_descriptions (
+    sha256 TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    part TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (sha256, position)
+);
+CREATE TABLE IF NOT EXISTS calls (
+    sha256 TEXT NOT NULL,
+    call TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (sha256, call)
+);
+CREATE INDEX IF NOT EXISTS calls_call ON calls (call);
+CREATE TABLE IF NOT EXISTS operations (
+    sha256 TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    PRIMARY KEY (sha256, operation)
+);
+CREATE INDEX IF NOT EXISTS operations_operation ON operations (operation);
+CREATE TABLE IF NOT EXISTS parameters (
+    sha256 TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    minimum REAL,
+    maximum REAL,
+    PRIMARY KEY (sha256, name)
+);
+CREATE INDEX IF NOT EXISTS parameters_name ON parameters (name);
+CREATE TABLE IF NOT EXISTS examples (
+    agent TEXT NOT NULL,
+    object TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    assistant_tokens INTEGER NOT NULL,
+    tokenizer TEXT NOT NULL,
+    PRIMARY KEY (agent, object, position)
+);
+CREATE INDEX IF NOT EXISTS examples_tokens ON examples (tokens);
+CREATE INDEX IF NOT EXISTS examples_sha256 ON examples (sha256);
+"""
+DERIVED_TABLES = ("part_descriptions", "calls", "operations", "parameters")
+
+
+def get_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def get_call_name(node):
+    # rg.Brep.CreateFromSweep(...) -> "Brep.CreateFromSweep", None for calls of python functions
+    names = []
+    while isinstance(node, ast.Attribute):
+        names.insert(0, node.attr)
+        node = node.value
+    if not names or not names[-1][:1].isupper():
+        return None
+    if isinstance(node, ast.Name):
+        names.insert(0, node.id)
+    return ".".join(names[-2:])
+
+
+def get_code_parameters(tree):
+    # name -> (value, min, max) of the numbers of the top level and of the defaults of the sliders
+    parameters = {}
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], ast.Name) and not statement.targets[0].id.isupper():
+            value = get_number(statement.value)
+            if value is not None:
+                parameters[statement.targets[0].id] = value
+    for name, assignment in find_default_assignments(tree).items():
+        parameters[name] = get_number(assignment.value)
+    ranges = get_slider_ranges(tree)
+    return {name: (value, *ranges.get(name, (None, None))) for name, value in parameters.items()}
+
+
+def analyse_code(text):
+    """Return the Rhino calls, the modeling operations and the parameters of the code of a part or a program."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return Counter(), set(), {}
+    calls = Counter(name for name in (get_call_name(node.func) for node in ast.walk(tree)
+                                      if isinstance(node, ast.Call)) if name)
+    operations = {operation for operation, words in CORPUS_OPERATIONS.items()
+                  for call in calls if any(word in call for word in words)}
+    return calls, operations, get_code_parameters(tree)
+
+
+def split_part_descriptions(text):
+    # A part per paragraph, "Bowl Body: A hemisphere ..." like the code writer examples
+    return [(get_text_before_colon(block), block) for block in text.split('\n\n') if block.strip()]
+
+
+class CorpusIndex():
+    def __init__(self, index_file=CORPUS_INDEX_FILE, directories=CORPUS_DIRECTORIES):
+        self.index_file = index_file
+        self.directories = directories
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        # A connection per operation like the LLM cache, the builders read from threads
+        connection = sqlite3.connect(self.index_file, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def walk(self):
+        # (path, directory, root, kind, object, part) of every file of the corpus
+        for root, top, kind in self.directories:
+            for directory, directory_names, file_names in os.walk(top):
+                directory_names[:] = sorted(name for name in directory_names if name not in CORPUS_SKIPPED_DIRECTORIES)
+                for file_name in sorted(file_names):
+                    if file_name.startswith(".") or (kind != DESCRIPTION and not file_name.endswith(".py")):
+                        continue
+                    path = os.path.join(directory, file_name)
+                    relative = os.path.relpath(path, top)
+                    if kind == PART_CODE:
+                        object_, part = os.path.dirname(relative) or None, os.path.splitext(file_name)[0]
+                    else:
+                        object_, part = os.path.splitext(relative)[0] if kind == FULL_PROGRAM else relative, None
+                    yield path, directory, root, kind, object_, part
+
+    def add_content(self, connection, sha256, text, kind, path, tokenizer):
+        problems = None
+        if kind == DESCRIPTION:
+            connection.executemany("INSERT OR REPLACE INTO part_descriptions VALUES (?, ?, ?, ?)",
+                                   [(sha256, position, part, part_text) for position, (part, part_text)
+                                    in enumerate(split_part_descriptions(text))])
+        else:
+            calls, operations, parameters = analyse_code(text)
+            connection.executemany("INSERT OR REPLACE INTO calls VALUES (?, ?, ?)",
+                                   [(sha256, call, count) for call, count in calls.items()])
+            connection.executemany("INSERT OR REPLACE INTO operations VALUES (?, ?)",
+                                   [(sha256, operation) for operation in sorted(operations)])
+            connection.executemany("INSERT OR REPLACE INTO parameters VALUES (?, ?, ?, ?, ?)",
+                                   [(sha256, name, *values) for name, values in parameters.items()])
+            if kind == FULL_PROGRAM:
+                problems = json.dumps(find_program_problems(text, path))
+        connection.execute("INSERT OR REPLACE INTO contents VALUES (?, ?, ?, ?, ?, ?)",
+                           (sha256, text, len(text.splitlines()), count_text_tokens(text), tokenizer, problems))
+
+    def refresh(self, examples=True):
+        """
+        Bring the index up to date with the files of the corpus and return what was done,
+        e.g. {'files': 160, 'read': 2, 'analysed': 1, 'removed': 0, 'seconds': 0.05}.
+        """
+        start_time = time.perf_counter()
+        tokenizer = get_tokenizer_name()
+        counts = {'files': 0, 'read': 0, 'analysed': 0, 'removed': 0}
+        with self.lock, self.connect() as connection:
+            known = {row['path']: row for row in connection.execute("SELECT path, size, mtime_ns FROM files")}
+            analysed = {row[0] for row in connection.execute("SELECT sha256 FROM contents")}
+            seen = set()
+            for path, directory, root, kind, object_, part in self.walk():
+                stat = os.stat(path)
+                seen.add(path)
+                row = known.get(path)
+                if row is not None and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+                try:
+                    # Universal newlines and no BOM, like the builders read the examples
+                    with open(path, 'r', encoding='utf-8-sig') as f:
+                        text = f.read()
+                except (OSError, UnicodeDecodeError) as error:
+                    print(f"Warning: {path} is not indexed: {error}")
+                    seen.discard(path)
+                    continue
+                counts['read'] += 1
+                sha256 = get_sha256(text)
+                if sha256 not in analysed:
+                    self.add_content(connection, sha256, text, kind, path, tokenizer)
+                    analysed.add(sha256)
+                    counts['analysed'] += 1
+                connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (path, directory, root, kind, object_, part, sha256, stat.st_size,
+                                    stat.st_mtime_ns))
+            removed = [(path,) for path in known if path not in seen]
+            connection.executemany("DELETE FROM files WHERE path = ?", removed)
+            counts['removed'] = len(removed)
+            counts['files'] = len(seen)
+
+            # Contents no file has any more, and the token counts of another tokenizer
+            connection.execute("DELETE FROM contents WHERE sha256 NOT IN (SELECT sha256 FROM files)")
+            for table in DERIVED_TABLES:
+                connection.execute(f"DELETE FROM {table} WHERE sha256 NOT IN (SELECT sha256 FROM contents)")
+            for row in connection.execute("SELECT sha256, text FROM contents WHERE tokenizer != ?",
+                                          (tokenizer,)).fetchall():
+                connection.execute("UPDATE contents SET tokens = ?, tokenizer = ? WHERE sha256 = ?",
+                                   (count_text_tokens(row['text']), tokenizer, row['sha256']))
+        if examples:
+            counts['examples'] = self.refresh_examples()
+        counts['seconds'] = round(time.perf_counter() - start_time, 3)
+        return counts
+
+    def refresh_examples(self):
+        """Render the finetuning examples of the agents from the index and count their tokens, return the tokenized ones."""
+        # Imported here, the builder reads its examples from this module
+        from Finetuning.build_json_for_finetuning import AGENT_DATASETS, ExampleSources
+        tokenizer = get_tokenizer_name()
+        with self.connect() as connection:
+            counted = {row['sha256']: (row['tokens'], row['assistant_tokens']) for row in connection.execute(
+                "SELECT sha256, tokens, assistant_tokens FROM examples WHERE tokenizer = ?", (tokenizer,))}
+        rows = {}
+        tokenized = 0
+        for agent, (system_message, objects, create_records) in AGENT_DATASETS.items():
+            for object_ in objects:
+                try:
+                    records = create_records(system_message, object_, ExampleSources(self))
+                except OSError:
+                    continue
+                for position, record in enumerate(records):
+                    # The hash of the line of the record in a finetuning file
+                    sha256 = get_sha256(json.dumps(record))
+                    if sha256 not in counted:
+                        messages = record[MESSAGES]
+                        counted[sha256] = (num_tokens_from_messages(messages),
+                                           sum(count_text_tokens(message[CONTENT]) for message in messages
+                                               if message[ROLE] == ASSISTANT))
+                        tokenized += 1
+                    rows[(agent, object_.file_name, position)] = (sha256, *counted[sha256], tokenizer)
+        with self.connect() as connection:
+            connection.execute("DELETE FROM examples")
+            connection.executemany("INSERT INTO examples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(*key, *values) for key, values in rows.items()])
+        return tokenized
+
+    def get_file(self, path):
+        """The row of a file of the corpus with its text, the path is matched without case when needed."""
+        # The examples were written on Windows, where "Baking mold Body.py" opens "Baking Mold Body.py"
+        with self.connect() as connection:
+            for condition in ("path = ?", "path = ? COLLATE NOCASE"):
+                row = connection.execute(f"SELECT files.*, contents.text FROM files JOIN contents USING (sha256) "
+                                         f"WHERE files.{condition}", (os.path.normpath(path),)).fetchone()
+                if row is not None:
+                    return dict(row)
+        return None
+
+    def list_part_files(self, directory):
+        # The part files of a directory in name order, like get_part_code_files
+        with self.connect() as connection:
+            rows = connection.execute("SELECT path FROM files WHERE directory = ? AND kind = ?",
+                                      (os.path.normpath(directory), PART_CODE)).fetchall()
+        return sorted((os.path.basename(row['path']) for row in rows), key=str.lower)
+
+    def query(self, sql, parameters=()):
+        with self.connect() as connection:
+            connection.execute("PRAGMA query_only = ON")
+            return [dict(row) for row in connection.execute(sql, parameters)]
+
+    def find_files(self, kind=PART_CODE, operation=None, call=None, root=None, min_tokens=0):
+        """The files of a kind using an operation or a Rhino call, e.g. find_files(operation="sweep")."""
+        sql = ("SELECT files.path, files.root, files.object, files.part, contents.tokens FROM files "
+               "JOIN contents USING (sha256) WHERE files.kind = ? AND contents.tokens >= ?")
+        parameters = [kind, min_tokens]
+        if operation:
+            sql += " AND files.sha256 IN (SELECT sha256 FROM operations WHERE operation = ?)"
+            parameters.append(operation)
+        if call:
+            sql += " AND files.sha256 IN (SELECT sha256 FROM calls WHERE call LIKE ?)"
+            parameters.append(f"%{call}%")
+        if root:
+            sql += " AND files.root = ?"
+            parameters.append(root)
+        return self.query(sql + " ORDER BY files.path", parameters)
+
+    def find_examples(self, min_tokens=0, agent=None):
+        """The finetuning examples with more than min_tokens tokens, the longest first."""
+        sql = "SELECT agent, object, position, tokens, assistant_tokens FROM examples WHERE tokens > ?"
+        parameters = [min_tokens]
+        if agent:
+            sql += " AND agent = ?"
+            parameters.append(agent)
+        return self.query(sql + " ORDER BY tokens DESC", parameters)
+
+    def find_parameters(self, name, kind=None):
+        """The parameters matching a LIKE pattern, e.g. find_parameters("%radius%")."""
+        sql = ("SELECT files.path, parameters.name, parameters.value, parameters.minimum, parameters.maximum "
+               "FROM parameters JOIN files USING (sha256) WHERE parameters.name LIKE ?")
+        parameters = [name]
+        if kind:
+            sql += " AND files.kind = ?"
+            parameters.append(kind)
+        return self.query(sql + " ORDER BY files.path, parameters.name", parameters)
+
+    def find_problems(self):
+        """The full programs with problems of program_validator."""
+        rows = self.query("SELECT files.path, contents.problems FROM files JOIN contents USING (sha256) "
+                          "WHERE contents.problems IS NOT NULL AND contents.problems != '[]' ORDER BY files.path")
+        return [{'path': row['path'], 'problems': json.loads(row['problems'])} for row in rows]
+
+    def get_example_tokens(self, hashes, tokenizer):
+        """sha256 -> (tokens, assistant tokens) of the examples with these record hashes."""
+        found = {}
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            found.update({row['sha256']: (row['tokens'], row['assistant_tokens']) for row in self.query(
+                f"SELECT sha256, tokens, assistant_tokens FROM examples WHERE tokenizer = ? "
+                f"AND sha256 IN ({', '.join('?' * len(chunk))})", [tokenizer, *chunk])})
+        return found
+
+    def stats(self):
+        return {
+            'files': {f"{row['root']}/{row['kind']}": row['count'] for row in self.query(
+                "SELECT root, kind, COUNT(*) AS count FROM files GROUP BY root, kind ORDER BY root, kind")},
+            'contents': self.query("SELECT COUNT(*) AS count FROM contents")[0]['count'],
+            'objects': self.query("SELECT COUNT(DISTINCT object) AS count FROM files")[0]['count'],
+            'operations': {row['operation']: row['count'] for row in self.query(
+                "SELECT operation, COUNT(*) AS count FROM files JOIN operations USING (sha256) "
+                "WHERE files.kind = ? GROUP BY operation ORDER BY count DESC", (PART_CODE,))},
+            'examples': {row['agent']: {'examples': row['count'], 'max_tokens': row['max_tokens']} for row in self.query(
+                "SELECT agent, COUNT(*) AS count, MAX(tokens) AS max_tokens FROM examples GROUP BY agent")}
+        }
+
+
+def print_rows(rows):
+    for row in rows:
+        print("\t".join(str(value) for value in row.values()))
+    print(f"{len(rows)} rows")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the index of the example corpus")
+    parser.add_argument("--stats", action="store_true", help="count the files, operations and examples")
+    parser.add_argument("--operation", help=f"files using an operation of {list(CORPUS_OPERATIONS)}")
+    parser.add_argument("--call", help="files using a Rhino call, e.g. CreateFromSweep")
+    parser.add_argument("--kind", help=f"kind of files, {PART_CODE} by default for --operation and --call, "
+                                       f"{FULL_PROGRAM} or {DESCRIPTION}")
+    parser.add_argument("--root", help=f"root of the files, of {sorted({root for root, _, _ in CORPUS_DIRECTORIES})}")
+    parser.add_argument("--examples-over", type=int, help="finetuning examples over this number of tokens")
+    parser.add_argument("--agent", help="agent of --examples-over")
+    parser.add_argument("--parameter", help="parameters matching a LIKE pattern, e.g. %%radius%%")
+    parser.add_argument("--problems", action="store_true", help="full programs that cannot run")
+    parser.add_argument("--sql", help="a query of the tables of the index, the index is not changed")
+    parser.add_argument("--no-refresh", action="store_true", help="query the index without refreshing it")
+    args = parser.parse_args()
+
+    corpus = CorpusIndex()
+    if not args.no_refresh:
+        print(f"Corpus index refreshed: {corpus.refresh()}")
+    if args.operation or args.call:
+        print_rows(corpus.find_files(args.kind or PART_CODE, args.operation, args.call, args.root))
+    if args.examples_over is not None:
+        print_rows(corpus.find_examples(args.examples_over, args.agent))
+    if args.parameter:
+        print_rows(corpus.find_parameters(args.parameter, args.kind))
+    if args.problems:
+        for program in corpus.find_problems():
+            print(f"{program['path']}: " + "; ".join(problem['message'] for problem in program['problems']))
+    if args.sql:
+        print_rows(corpus.query(args.sql))
+    if args.stats:
+        print(json.dumps(corpus.stats(), indent=2))
@@ -1,142 +1,315 @@
+"""
+Validate finetuning files and estimate the tokens and the cost of training on them.
+
+    python -m Finetuning.validate_finetuning_file                          - every file of Finetuning/Json_Files
+    python -m Finetuning.validate_finetuning_file "assembler_*.jsonl" --report report.json
+
+The records are read line by line and checked for format errors, the tokens of the valid records are counted
+in batches by a pool of processes. The counts are kept in a SQLite cache by the hash of the record, a record
+already counted in an earlier run, in any file, or by the corpus index of Finetuning/corpus_index.py is not
+tokenized again.
+The report has the format errors, the token distributions, the examples over the token limit and the cost
+estimate of every file and of all of them.
+"""
+import argparse
+import glob
+import hashlib
 import json
-import tiktoken  # for token counting
-import numpy as np
+import os
+import sqlite3
 from collections import defaultdict
-
-data_path = "Finetuning\Json_Files\\assembler_finetuning_2024_02_27_15_24_46.jsonl"
-
-# Load the dataset
-with open(data_path, 'r', encoding='utf-8') as f:
-    dataset = [json.loads(line) for line in f]
-
-# Initial dataset stats
-print("Num examples:", len(dataset))
-# print("First example:")
-# for message in dataset[0]["messages"]:
-#     print(message)
-
-
-# Format error checks
-format_errors = defaultdict(int)
-
-for ex in dataset:
-    if not isinstance(ex, dict):
-        format_errors["data_type"] += 1
-        continue
-
-    messages = ex.get("messages", None)
-    if not messages:
-        format_errors["missing_messages_list"] += 1
-        continue
-
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Consts.finetuning_consts import *
+from Consts.corpus_consts import CORPUS_INDEX_FILE
+from Utils.model_utils import json_dir
+from Finetuning.corpus_index import CorpusIndex
+from Utils.token_utils import num_tokens_from_messages, count_text_tokens, get_tokenizer_name
+
+ROLES = ("system", "user", "assistant", "function")
+MESSAGE_KEYS = ("role", "content", "name", "function_call")
+
+
+def check_format(example):
+    # The format errors of a record, the checks of the OpenAI finetuning guide
+    if not isinstance(example, dict):
+        return ["data_type"]
+    messages = example.get("messages", None)
+    if not messages or not isinstance(messages, list):
+        return ["missing_messages_list"]
+    errors = []
     for message in messages:
+        if not isinstance(message, dict):
+            errors.append("message_data_type")
+            continue
         if "role" not in message or "content" not in message:
-            format_errors["message_missing_key"] += 1
-
-        if any(k not in ("role", "content", "name", "function_call") for k in message):
-            format_errors["message_unrecognized_key"] += 1
-
-        if message.get("role", None) not in ("system", "user", "assistant", "function"):
-            format_errors["unrecognized_role"] += 1
-
+            errors.append("message_missing_key")
+        if any(key not in MESSAGE_KEYS for key in message):
+            errors.append("message_unrecognized_key")
+        if message.get("role", None) not in ROLES:
+            errors.append("unrecognized_role")
         content = message.get("content", None)
         function_call = message.get("function_call", None)
-
         if (not content and not function_call) or not isinstance(content, str):
-            format_errors["missing_content"] += 1
-
-    if not any(message.get("role", None) == "assistant" for message in messages):
-        format_errors["example_missing_assistant_message"] += 1
-
-if format_errors:
-    print("Found errors:")
-    for k, v in format_errors.items():
-        print(f"{k}: {v}")
-else:
-    print("No errors found")
-
-
-# Token Counting Utilities
-
-encoding = tiktoken.get_encoding("cl100k_base")
-
-# not exact!
-# simplified from https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
-
-
-def num_tokens_from_messages(messages, tokens_per_message=3, tokens_per_name=1):
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3
-    return num_tokens
-
-
-def num_assistant_tokens_from_messages(messages):
-    num_tokens = 0
-    for message in messages:
-        if message["role"] == "assistant":
-            num_tokens += len(encoding.encode(message["content"]))
-    return num_tokens
-
-
-def print_distribution(values, name):
-    print(f"\n#### Distribution of {name}:")
-    print(f"min / max: {min(values)}, {max(values)}")
-    print(f"mean / median: {np.mean(values)}, {np.median(values)}")
-    print(f"p5 / p95: {np.quantile(values, 0.1)}, {np.quantile(values, 0.9)}")
-
-
-# Warnings and tokens counts
-n_missing_system = 0
-n_missing_user = 0
-n_messages = []
-convo_lens = []
-assistant_message_lens = []
-
-for ex in dataset:
-    messages = ex["messages"]
-    if not any(message["role"] == "system" for message in messages):
-        n_missing_system += 1
-    if not any(message["role"] == "user" for message in messages):
-        n_missing_user += 1
-    n_messages.append(len(messages))
-    convo_lens.append(num_tokens_from_messages(messages))
-    assistant_message_lens.append(num_assistant_tokens_from_messages(messages))
-
-print("Num examples missing system message:", n_missing_system)
-print("Num examples missing user message:", n_missing_user)
-print_distribution(n_messages, "num_messages_per_example")
-print_distribution(convo_lens, "num_total_tokens_per_example")
-print_distribution(assistant_message_lens, "num_assistant_tokens_per_example")
-n_too_long = sum(l > 4096 for l in convo_lens)
-print(f"\n{n_too_long} examples may be over the 4096 token limit, they will be truncated during fine-tuning")
-
-# Cost Estimation
-# Pricing and default n_epochs estimate
-MAX_TOKENS_PER_EXAMPLE = 4096
-
-TARGET_EPOCHS = 3
-MIN_TARGET_EXAMPLES = 100
-MAX_TARGET_EXAMPLES = 25000
-MIN_DEFAULT_EPOCHS = 1
-MAX_DEFAULT_EPOCHS = 25
-
-n_epochs = TARGET_EPOCHS
-n_train_examples = len(dataset)
-if n_train_examples * TARGET_EPOCHS < MIN_TARGET_EXAMPLES:
-    n_epochs = min(MAX_DEFAULT_EPOCHS, MIN_TARGET_EXAMPLES // n_train_examples)
-elif n_train_examples * TARGET_EPOCHS > MAX_TARGET_EXAMPLES:
-    n_epochs = max(MIN_DEFAULT_EPOCHS, MAX_TARGET_EXAMPLES // n_train_examples)
-
-n_billing_tokens_in_dataset = sum(
-    min(MAX_TOKENS_PER_EXAMPLE, length) for length in convo_lens)
-print(
-    f"Dataset has ~{n_billing_tokens_in_dataset} tokens that will be charged for during training")
-print(f"By default, you'll train for {n_epochs} epochs on this dataset")
-print(
-    f"By default, you'll be charged for ~{n_epochs * n_billing_tokens_in_dataset} tokens")
+            errors.append("missing_content")
+    if not any(isinstance(message, dict) and message.get("role", None) == "assistant" for message in messages):
+        errors.append("example_missing_assistant_message")
+    return errors
+
+
+def count_batch_tokens(records):
+    """Runs in a pool process: [(total tokens, assistant tokens)] of the messages of every record."""
+    counts = []
+    for messages in records:
+        assistant_tokens = sum(count_text_tokens(message["content"]) for message in messages
+                               if message["role"] == "assistant")
+        counts.append((num_tokens_from_messages(messages), assistant_tokens))
+    return get_tokenizer_name(), counts
+
+
+class TokenCountCache():
+    """Token counts of records by the hash of the record and the tokenizer, shared by every run."""
+    def __init__(self, cache_file=FINETUNING_TOKEN_CACHE_FILE):
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS token_counts (key TEXT PRIMARY KEY, "
+                                "total_tokens INTEGER NOT NULL, assistant_tokens INTEGER NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.connection.execute(f"SELECT key, total_tokens, assistant_tokens FROM token_counts "
+                                           f"WHERE key IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            found.update({key: (total_tokens, assistant_tokens) for key, total_tokens, assistant_tokens in rows})
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, counts):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO token_counts VALUES (?, ?, ?)",
+                                        [(key, total, assistant) for key, (total, assistant) in counts.items()])
+
+    def close(self):
+        self.connection.close()
+
+
+class FileStats():
+    def __init__(self, path):
+        self.path = path
+        self.examples = 0
+        self.format_errors = defaultdict(int)
+        self.missing_system = 0
+        self.missing_user = 0
+        self.messages = []
+        self.total_tokens = []
+        self.assistant_tokens = []
+        self.over_limit = []  # (line, tokens)
+        self.corpus_counts = 0  # records counted by the corpus index
+        self.tokenized = 0
+
+    def add_tokens(self, line_number, total_tokens, assistant_tokens):
+        self.total_tokens.append(total_tokens)
+        self.assistant_tokens.append(assistant_tokens)
+        if total_tokens > FINETUNING_MAX_TOKENS_PER_EXAMPLE:
+            self.over_limit.append((line_number, total_tokens))
+
+
+def read_records(path, stats):
+    # (line number, record hash, messages) of the valid records of a file, one line at a time
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            stats.examples += 1
+            try:
+                example = json.loads(line)
+            except json.JSONDecodeError:
+                stats.format_errors["invalid_json"] += 1
+                continue
+            errors = check_format(example)
+            for error in errors:
+                stats.format_errors[error] += 1
+            if errors:
+                continue
+            messages = example["messages"]
+            stats.missing_system += not any(message["role"] == "system" for message in messages)
+            stats.missing_user += not any(message["role"] == "user" for message in messages)
+            stats.messages.append(len(messages))
+            yield line_number, hashlib.sha256(line.strip().encode('utf-8')).hexdigest(), messages
+
+
+def count_file_tokens(path, cache, corpus, executor, workers, tokenizer_name, batch_size=FINETUNING_TOKENIZE_BATCH_SIZE):
+    stats = FileStats(path)
+    batch = []
+    pending = []  # (batch, future) of the batches counted by the pool
+
+    def finish(batch, future):
+        name, counts = future.result()
+        new_counts = {}
+        stats.tokenized += len(batch)
+        for (line_number, key, _), (total_tokens, assistant_tokens) in zip(batch, counts):
+            new_counts[f"{name}:{key}"] = (total_tokens, assistant_tokens)
+            stats.add_tokens(line_number, total_tokens, assistant_tokens)
+        cache.put_many(new_counts)
+
+    def flush():
+        cached = cache.get_many([f"{tokenizer_name}:{key}" for _, key, _ in batch])
+        # The examples of the corpus index are counted when it is refreshed
+        missing = [key for _, key, _ in batch if f"{tokenizer_name}:{key}" not in cached]
+        corpus_counts = corpus.get_example_tokens(missing, tokenizer_name) if corpus and missing else {}
+        cache.put_many({f"{tokenizer_name}:{key}": counts for key, counts in corpus_counts.items()})
+        stats.corpus_counts += len(corpus_counts)
+        uncached = []
+        for record in batch:
+            counts = cached.get(f"{tokenizer_name}:{record[1]}") or corpus_counts.get(record[1])
+            if counts is None:
+                uncached.append(record)
+            else:
+                stats.add_tokens(record[0], *counts)
+        if uncached:
+            pending.append((uncached, executor.submit(count_batch_tokens, [messages for _, _, messages in uncached])))
+        # At most two batches per process wait, the file is not held in memory
+        while len(pending) > 2 * workers:
+            finish(*pending.pop(0))
+
+    for record in read_records(path, stats):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    for uncached, future in pending:
+        finish(uncached, future)
+    return stats
+
+
+def describe(values):
+    if not values:
+        return None
+    return {'min': int(np.min(values)), 'max': int(np.max(values)), 'mean': float(np.mean(values)),
+            'median': float(np.median(values)), 'p5': float(np.quantile(values, 0.05)),
+            'p95': float(np.quantile(values, 0.95))}
+
+
+def estimate_cost(total_tokens):
+    # The default number of epochs and the billed tokens of the OpenAI finetuning guide
+    examples = len(total_tokens)
+    epochs = FINETUNING_TARGET_EPOCHS
+    if examples and examples * FINETUNING_TARGET_EPOCHS < FINETUNING_MIN_TARGET_EXAMPLES:
+        epochs = min(FINETUNING_MAX_DEFAULT_EPOCHS, FINETUNING_MIN_TARGET_EXAMPLES // examples)
+    elif examples * FINETUNING_TARGET_EPOCHS > FINETUNING_MAX_TARGET_EXAMPLES:
+        epochs = max(FINETUNING_MIN_DEFAULT_EPOCHS, FINETUNING_MAX_TARGET_EXAMPLES // examples)
+    billed_tokens = sum(min(FINETUNING_MAX_TOKENS_PER_EXAMPLE, tokens) for tokens in total_tokens)
+    return {'epochs': epochs, 'billed_tokens_per_epoch': billed_tokens, 'billed_tokens': epochs * billed_tokens,
+            'cost_usd': round(epochs * billed_tokens / 1000 * FINETUNING_PRICE_PER_1K_TOKENS, 2)}
+
+
+def sum_costs(costs):
+    # Every file is a finetuning job of its own, with the default epochs of its number of examples
+    billed_tokens = sum(cost['billed_tokens'] for cost in costs)
+    return {'epochs': None, 'billed_tokens_per_epoch': sum(cost['billed_tokens_per_epoch'] for cost in costs),
+            'billed_tokens': billed_tokens,
+            'cost_usd': round(billed_tokens / 1000 * FINETUNING_PRICE_PER_1K_TOKENS, 2)}
+
+
+def summarize(stats_list, name, cost=None):
+    total_tokens = [tokens for stats in stats_list for tokens in stats.total_tokens]
+    format_errors = defaultdict(int)
+    for stats in stats_list:
+        for error, count in stats.format_errors.items():
+            format_errors[error] += count
+    return {
+        'file': name,
+        'examples': sum(stats.examples for stats in stats_list),
+        'format_errors': dict(format_errors),
+        'missing_system': sum(stats.missing_system for stats in stats_list),
+        'missing_user': sum(stats.missing_user for stats in stats_list),
+        'messages_per_example': describe([count for stats in stats_list for count in stats.messages]),
+        'total_tokens_per_example': describe(total_tokens),
+        'assistant_tokens_per_example': describe([tokens for stats in stats_list for tokens in stats.assistant_tokens]),
+        'over_limit': [{'file': stats.path, 'line': line, 'tokens': tokens}
+                       for stats in stats_list for line, tokens in stats.over_limit],
+        'cost': cost or estimate_cost(total_tokens)
+    }
+
+
+def find_files(patterns):
+    # A pattern without a directory is looked up in Finetuning/Json_Files
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches and not os.path.dirname(pattern):
+            matches = sorted(glob.glob(os.path.join(json_dir, pattern)))
+        paths += [path for path in matches if path not in paths]
+    return paths
+
+
+def validate_files(patterns, workers=FINETUNING_TOKENIZE_WORKERS, cache_file=FINETUNING_TOKEN_CACHE_FILE,
+                   corpus_file=CORPUS_INDEX_FILE):
+    """Return the report of the files matching the glob patterns: one summary per file and the total."""
+    paths = find_files(patterns)
+    cache = TokenCountCache(cache_file)
+    # Read only, the index is built by python -m Finetuning.corpus_index
+    corpus = CorpusIndex(corpus_file) if os.path.exists(corpus_file) else None
+    tokenizer_name = get_tokenizer_name()
+    workers = max(1, workers)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            file_stats = [count_file_tokens(path, cache, corpus, executor, workers, tokenizer_name) for path in paths]
+    finally:
+        cache.close()
+    files = [summarize([stats], stats.path) for stats in file_stats]
+    return {
+        'tokenizer': tokenizer_name,
+        'token_cache': {'hits': cache.hits, 'corpus_index': sum(stats.corpus_counts for stats in file_stats),
+                        'tokenized': sum(stats.tokenized for stats in file_stats)},
+        'files': files,
+        # the sum of the costs of the files, not one job of all their examples
+        'total': summarize(file_stats, "total", sum_costs([summary['cost'] for summary in files])) if file_stats else None
+    }
+
+
+def print_summary(summary):
+    print(f"\n### {summary['file']}: {summary['examples']} examples")
+    if summary['format_errors']:
+        print("Found errors: " + ", ".join(f"{error}: {count}" for error, count in summary['format_errors'].items()))
+    print(f"Missing system message: {summary['missing_system']}, missing user message: {summary['missing_user']}")
+    for name in ('messages_per_example', 'total_tokens_per_example', 'assistant_tokens_per_example'):
+        values = summary[name]
+        if values:
+            print(f"{name}: min / max {values['min']} / {values['max']}, mean / median {values['mean']:.0f} / "
+                  f"{values['median']:.0f}, p5 / p95 {values['p5']:.0f} / {values['p95']:.0f}")
+    if summary['over_limit']:
+        print(f"{len(summary['over_limit'])} examples are over the {FINETUNING_MAX_TOKENS_PER_EXAMPLE} token limit, "
+              f"they will be truncated: " + ", ".join(f"{example['file']}:{example['line']} ({example['tokens']})"
+                                                      for example in summary['over_limit']))
+    cost = summary['cost']
+    epochs = f"{cost['epochs']} epochs" if cost['epochs'] is not None else "the epochs of every file"
+    print(f"~{cost['billed_tokens_per_epoch']} billed tokens, {epochs} by default, "
+          f"~{cost['billed_tokens']} tokens charged, ~${cost['cost_usd']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate finetuning files and estimate their tokens and cost")
+    parser.add_argument("files", nargs="*", default=[os.path.join(json_dir, "*.jsonl")],
+                        help="glob patterns of JSONL files, names are looked up in Finetuning/Json_Files")
+    parser.add_argument("--workers", type=int, default=FINETUNING_TOKENIZE_WORKERS, help="tokenizing processes")
+    parser.add_argument("--report", default=None, help="JSON file for the report")
+    args = parser.parse_args()
+    report = validate_files(args.files, args.workers)
+    if not report['files']:
+        parser.error(f"no file matches {args.files}")
+    for summary in report['files']:
+        print_summary(summary)
+    print_summary(report['total'])
+    print(f"\nTokens counted with {report['tokenizer']}, cached counts of {report['token_cache']['hits']} records, "
+          f"{report['token_cache']['corpus_index']} from the corpus index, {report['token_cache']['tokenized']} tokenized")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
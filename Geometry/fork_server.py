@@ -0,0 +1,374 @@
+"""
+Build every model in its own process forked from a warm zygote.
+
+The zygote is spawned once and loads the geometry runtime, every job is a fork of it, so it starts warm
+and a job that crashes, leaks or loops forever takes nothing else down. Every job runs with limits:
+
+    wall time      - GEOMETRY_JOB_TIMEOUT, the server kills the job
+    cpu time       - GEOMETRY_JOB_CPU_SECONDS, RLIMIT_CPU, SIGXCPU stops the program
+    address space  - GEOMETRY_JOB_MEMORY_BYTES, RLIMIT_AS, allocations past it raise MemoryError
+
+A job stopped by a limit raises GeometryJobLimitError with the name of the limit.
+The server sends the job over a unix socket with the write end of a pipe, the forked job sends its progress
+stages and its result over the pipe. The zygote answers on the socket with the pid of every job it forks
+and, when it reaps it, its exit status, so a job killed by the hard cpu limit is reported as such, and a
+job that times out is killed by the zygote even before it sent anything.
+
+Forked jobs do not keep the parts they built, the part cache of the pool workers is only in the pool.
+"""
+import importlib
+import multiprocessing
+import os
+import pickle
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection
+from Consts.geometry_consts import *
+from Geometry.geometry_worker_pool import GeometryWorkerPool, GeometryWorkerError
+from Geometry.mesh_cache import MeshCache, build_model_with_cache
+from Geometry.mesh_quality import MeshingStats, get_meshing_settings
+from Geometry.program_validator import validate_program_file, validation_cache
+from Utils.tracing import span, get_trace_context, continue_trace
+
+try:
+    import resource
+except ImportError:
+    # Windows, where Rhino.Inside runs, has no fork and no resource limits, the worker pool is used
+    resource = None
+
+MAX_MESSAGE_BYTES = 1024 * 1024
+WALL_TIME = "wall_time"
+CPU_TIME = "cpu_time"
+MEMORY = "memory"
+
+
+class GeometryJobLimitError(GeometryWorkerError):
+    def __init__(self, limit, message):
+        self.limit = limit
+        super().__init__(message)
+
+
+class CPUTimeLimitExceeded(Exception):
+    pass
+
+
+def _raise_cpu_time_limit(signal_number, frame):
+    raise CPUTimeLimitExceeded()
+
+
+def _run_job(conn, runtime, cache, job, cpu_seconds, memory_bytes):
+    # Runs in the forked job: set the limits, build and send the result
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + FORK_SERVER_CPU_GRACE_SECONDS))
+        signal.signal(signal.SIGXCPU, _raise_cpu_time_limit)
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    job['progress'] = lambda stage: conn.send(("progress", stage))
+    trace_context = job.pop('trace_context', None)
+    try:
+        with continue_trace(trace_context):
+            if cache:
+                result = build_model_with_cache(runtime, cache, **job)
+            else:
+                result = runtime.build_model(**job)
+        conn.send(("ok", result))
+    except CPUTimeLimitExceeded:
+        conn.send(("limit", (CPU_TIME, f"the job used more than {cpu_seconds} seconds of cpu time")))
+    except MemoryError:
+        conn.send(("limit", (MEMORY, f"the job needed more than {memory_bytes} bytes of memory")))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+
+
+def _zygote_main(control, runtime_module_name, use_cache, cpu_seconds, memory_bytes):
+    # Runs inside the zygote: load the runtime once and fork a process for every job
+    runtime = importlib.import_module(runtime_module_name)
+    try:
+        runtime.load()
+        cache = MeshCache() if use_cache else None
+    except Exception:
+        control.send(pickle.dumps(("error", traceback.format_exc())))
+        return
+    control.send(pickle.dumps(("ready", os.getpid())))
+
+    jobs = {}  # pid -> job id of the running jobs
+    while True:
+        try:
+            readable, _, _ = select.select([control], [], [], FORK_SERVER_REAP_INTERVAL)
+            if readable:
+                message, fds, _, _ = socket.recv_fds(control, MAX_MESSAGE_BYTES, 1)
+                if not message:
+                    break
+                command, job_id, job = pickle.loads(message)
+                if command == "stop":
+                    break
+                if command == "kill":
+                    # A job past its wall time, it may not have told the server its pid yet
+                    for pid in [pid for pid, running_job_id in jobs.items() if running_job_id == job_id]:
+                        os.kill(pid, signal.SIGKILL)
+                elif fds:
+                    pid = os.fork()
+                    if pid == 0:
+                        control.close()
+                        conn = Connection(fds[0], readable=False)
+                        try:
+                            _run_job(conn, runtime, cache, job, cpu_seconds, memory_bytes)
+                        finally:
+                            os._exit(0)
+                    os.close(fds[0])
+                    jobs[pid] = job_id
+                    control.send(pickle.dumps(("started", job_id, pid)))
+            _reap_jobs(control, jobs)
+        except (OSError, KeyboardInterrupt):
+            break
+
+
+def _reap_jobs(control, jobs):
+    # Runs inside the zygote: the exit status and cpu time of the finished jobs, for the server
+    while jobs:
+        try:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            jobs.clear()
+            return
+        if pid == 0:
+            return
+        job_id = jobs.pop(pid, None)
+        if job_id is not None:
+            signal_number = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+            control.send(pickle.dumps(("exited", job_id, (signal_number, usage.ru_utime + usage.ru_stime))))
+
+
+class ForkServerExecutor():
+    """
+    Builds models like GeometryWorkerPool, with a job forked from a warm zygote for every build.
+    At most max_jobs jobs run at the same time, the others wait.
+    """
+    def __init__(self, runtime_module_name=GEOMETRY_RUNTIME_MODULE, max_jobs=FORK_SERVER_MAX_JOBS,
+                 job_timeout=GEOMETRY_JOB_TIMEOUT, cpu_seconds=GEOMETRY_JOB_CPU_SECONDS,
+                 memory_bytes=GEOMETRY_JOB_MEMORY_BYTES, use_cache=MESH_CACHE_ENABLED,
+                 validate=PROGRAM_VALIDATION_ENABLED):
+        if not hasattr(os, "fork") or resource is None:
+            raise GeometryWorkerError("The fork server needs a system with fork, use the worker pool")
+        self.runtime_module_name = runtime_module_name
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.use_cache = use_cache
+        self.validate = validate
+        # spawn - the zygote must not inherit the Flask threads, it forks only itself
+        self.context = multiprocessing.get_context("spawn")
+        self.zygote = None
+        self.control = None
+        self.lock = threading.Lock()
+        self.job_slots = threading.BoundedSemaphore(max_jobs)
+        self.running_jobs = 0
+        self.jobs = {}  # job id -> {'pid', 'exit', 'exited'} told by the zygote
+        self.next_job_id = 0
+        self.limit_kills = {WALL_TIME: 0, CPU_TIME: 0, MEMORY: 0}
+        self.meshing_stats = MeshingStats()
+
+    def start(self):
+        with self.lock:
+            if self.zygote is not None and self.zygote.is_alive():
+                return
+            self._start_zygote()
+        print(f"Geometry fork server started, zygote {self.zygote.pid} of {self.runtime_module_name}")
+
+    def _start_zygote(self, timeout=GEOMETRY_WORKER_START_TIMEOUT):
+        self._stop_zygote()
+        # SEQPACKET keeps every job one message
+        self.control, zygote_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.zygote = self.context.Process(target=_zygote_main,
+                                           args=(zygote_control, self.runtime_module_name, self.use_cache,
+                                                 self.cpu_seconds, self.memory_bytes), daemon=True)
+        self.zygote.start()
+        zygote_control.close()
+        # Warmup - wait until the runtime is loaded so the first job does not pay for it
+        self.control.settimeout(timeout)
+        try:
+            message = self.control.recv(MAX_MESSAGE_BYTES)
+            status, payload = pickle.loads(message) if message else ("exited", "the zygote exited")
+        except socket.timeout:
+            status, payload = "timeout", f"no answer in {timeout} seconds"
+        self.control.settimeout(None)
+        if status != "ready":
+            self._stop_zygote()
+            raise GeometryWorkerError(f"Geometry zygote failed to start: {payload}")
+        threading.Thread(target=self._read_zygote, args=(self.control,), daemon=True,
+                         name="fork-server-zygote").start()
+
+    def _read_zygote(self, control):
+        # The pids and exit statuses of the jobs, until the zygote stops
+        while True:
+            try:
+                message = control.recv(MAX_MESSAGE_BYTES)
+            except OSError:
+                return
+            if not message:
+                return
+            status, job_id, payload = pickle.loads(message)
+            with self.lock:
+                state = self.jobs.get(job_id)
+            if state is None:
+                continue
+            if status == "started":
+                state['pid'] = payload
+            elif status == "exited":
+                state['exit'] = payload
+                state['exited'].set()
+
+    def _stop_zygote(self):
+        if self.zygote is None:
+            return
+        try:
+            self.control.send(pickle.dumps(("stop", None, None)))
+        except OSError:
+            pass
+        self.zygote.join(1)
+        if self.zygote.is_alive():
+            self.zygote.kill()
+            self.zygote.join()
+        self.control.close()
+        self.zygote = None
+
+    def _fork_job(self, job_id, job):
+        # The connection the forked job answers on
+        read_fd, write_fd = os.pipe()
+        try:
+            with self.lock:
+                if self.zygote is None or not self.zygote.is_alive():
+                    print("Geometry zygote is not running, starting a new one")
+                    self._start_zygote()
+                socket.send_fds(self.control, [pickle.dumps(("build", job_id, job))], [write_fd])
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return Connection(read_fd, writable=False)
+
+    def _kill_job(self, job_id, state):
+        # Through the zygote, it knows the pid as soon as it forked the job and only until it reaped it
+        try:
+            with self.lock:
+                self.control.send(pickle.dumps(("kill", job_id, None)))
+            return
+        except (OSError, AttributeError):
+            pass
+        # The zygote is gone, its jobs are not reaped by it anymore
+        if state['pid'] is not None:
+            try:
+                os.kill(state['pid'], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _receive(self, conn, deadline, job_id, state):
+        if not conn.poll(max(0, deadline - time.monotonic())):
+            self._kill_job(job_id, state)
+            raise GeometryJobLimitError(WALL_TIME, f"Geometry job {state['pid']} did not finish in "
+                                                   f"{self.job_timeout} seconds")
+        try:
+            return conn.recv()
+        except EOFError:
+            pass
+        # Died without a result, the zygote tells how
+        if not state['exited'].wait(FORK_SERVER_EXIT_STATUS_TIMEOUT):
+            raise GeometryWorkerError(f"Geometry job {state['pid']} exited without a result")
+        signal_number, cpu_seconds = state['exit']
+        if signal_number == signal.SIGXCPU or (signal_number == signal.SIGKILL and cpu_seconds >= self.cpu_seconds):
+            # the hard RLIMIT_CPU, a SIGKILL before the soft limit is the system, e.g. out of memory
+            raise GeometryJobLimitError(CPU_TIME, f"Geometry job {state['pid']} was killed after {cpu_seconds:.1f} "
+                                                  f"seconds of cpu time, the limit is {self.cpu_seconds} seconds")
+        raise GeometryWorkerError(f"Geometry job {state['pid']} exited without a result, "
+                                  f"signal {signal_number}, it crashed")
+
+    def _run(self, job, progress):
+        with self.lock:
+            self.next_job_id += 1
+            job_id = self.next_job_id
+            state = self.jobs[job_id] = {'pid': None, 'exit': None, 'exited': threading.Event()}
+        try:
+            conn = self._fork_job(job_id, job)
+            deadline = time.monotonic() + self.job_timeout
+            try:
+                while True:
+                    status, payload = self._receive(conn, deadline, job_id, state)
+                    if status != "progress":
+                        break
+                    if progress:
+                        progress(payload)
+            finally:
+                conn.close()
+        finally:
+            with self.lock:
+                self.jobs.pop(job_id, None)
+        if status == "limit":
+            raise GeometryJobLimitError(*payload)
+        if status != "ok":
+            raise GeometryWorkerError(payload)
+        return payload
+
+    def build_model(self, file_name, sliders_value=None, output_file=OUTPUT_MESH_FILE, progress=None,
+                    mesh_quality=MESH_QUALITY_DEFAULT):
+        """
+        Build the model in a job forked from the zygote, like GeometryWorkerPool.build_model.
+        Raise GeometryJobLimitError when the job hit a limit.
+        """
+        get_meshing_settings(mesh_quality)  # unknown levels fail here, not in the job
+        self.start()
+        with span("geometry job", file_name=file_name, mesh_quality=mesh_quality, executor="fork_server") as current:
+            if self.validate:
+                with span("validate program"):
+                    validate_program_file(file_name)
+            job = {'file_name': file_name, 'sliders_value': sliders_value, 'output_file': output_file,
+                   'mesh_quality': mesh_quality, 'trace_context': get_trace_context()}
+            with span("wait for worker"):
+                self.job_slots.acquire()
+            with self.lock:
+                self.running_jobs += 1
+            try:
+                result = self._run(job, progress)
+            except GeometryJobLimitError as error:
+                with self.lock:
+                    self.limit_kills[error.limit] += 1
+                current.set(limit=error.limit)
+                raise
+            finally:
+                with self.lock:
+                    self.running_jobs -= 1
+                self.job_slots.release()
+            current.set(cached=result.get('cached'))
+        if 'meshing_seconds' in result:
+            self.meshing_stats.record(mesh_quality, result['triangles'], result['meshing_seconds'])
+            print(f"Meshed {file_name} at {mesh_quality} quality: {result['triangles']} triangles "
+                  f"in {result['meshing_seconds']:.3f} seconds")
+        return result
+
+    def health_check(self):
+        with self.lock:
+            alive = self.zygote is not None and self.zygote.is_alive()
+            return {'executor': "fork_server", 'started': self.zygote is not None,
+                    'zygote': {'pid': self.zygote.pid if self.zygote else None, 'status': "ok" if alive else "down"},
+                    'running_jobs': self.running_jobs, 'max_jobs': self.max_jobs,
+                    'limits': {WALL_TIME: self.job_timeout, CPU_TIME: self.cpu_seconds, MEMORY: self.memory_bytes},
+                    'limit_kills': dict(self.limit_kills),
+                    'meshing': self.meshing_stats.to_dict(), 'validation': validation_cache.stats()}
+
+    def shutdown(self):
+        with self.lock:
+            self._stop_zygote()
+
+
+def create_geometry_executor(executor=GEOMETRY_EXECUTOR):
+    """The executor of GEOMETRY_EXECUTOR, the worker pool when forking is not possible."""
+    if executor == "fork_server":
+        if hasattr(os, "fork") and resource is not None:
+            return ForkServerExecutor()
+        print("Warning: the fork server needs a system with fork, using the geometry worker pool")
+    return GeometryWorkerPool()
@@ -0,0 +1,297 @@
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from Consts.geometry_consts import *
+from Geometry.mesh_cache import MeshCache, build_model_with_cache
+from Geometry.mesh_quality import MeshingStats, get_meshing_settings
+from Geometry.program_validator import validate_program_file, validation_cache
+from Utils.tracing import span, get_trace_context, continue_trace
+
+
+class GeometryWorkerError(Exception):
+    pass
+
+
+def _worker_main(conn, runtime_module_name, use_cache):
+    # Runs inside the worker process: load the runtime once and serve jobs until told to stop
+    runtime = importlib.import_module(runtime_module_name)
+    try:
+        runtime.load()
+        cache = MeshCache() if use_cache else None
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+        return
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            command, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if command == "stop":
+            break
+        if command == "ping":
+            conn.send(("pong", os.getpid()))
+            continue
+        if command == "stats":
+            conn.send(("ok", cache.stats() if cache else None))
+            continue
+        # Stages of the build are sent back before the result
+        payload['progress'] = lambda stage: conn.send(("progress", stage))
+        # The spans of the build are children of the span of the job in the server process
+        trace_context = payload.pop('trace_context', None)
+        try:
+            with continue_trace(trace_context):
+                if cache:
+                    result = build_model_with_cache(runtime, cache, **payload)
+                else:
+                    result = runtime.build_model(**payload)
+            conn.send(("ok", result))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+
+class GeometryWorker():
+    def __init__(self, context, runtime_module_name, use_cache=MESH_CACHE_ENABLED):
+        self.context = context
+        self.runtime_module_name = runtime_module_name
+        self.use_cache = use_cache
+        self.jobs_done = 0
+        self.process = None
+        self.conn = None
+
+    def start(self, timeout=GEOMETRY_WORKER_START_TIMEOUT):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_worker_main,
+                                            args=(child_conn, self.runtime_module_name, self.use_cache), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Warmup - wait until the runtime is loaded so the first job does not pay for it
+        status, payload = self._receive(timeout)
+        if status != "ready":
+            self.stop()
+            raise GeometryWorkerError(f"Geometry worker failed to start:\n{payload}")
+
+    def _receive(self, timeout):
+        if not self.conn.poll(timeout):
+            raise GeometryWorkerError(f"Geometry worker {self.process.pid} did not answer in {timeout} seconds")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise GeometryWorkerError(f"Geometry worker {self.process.pid} exited unexpectedly")
+
+    def run(self, job, timeout=GEOMETRY_JOB_TIMEOUT, progress=None):
+        try:
+            self.conn.send(("build", job))
+        except OSError:
+            raise GeometryWorkerError(f"Geometry worker {self.process.pid} exited unexpectedly")
+        deadline = time.monotonic() + timeout
+        while True:
+            status, payload = self._receive(max(0, deadline - time.monotonic()))
+            if status != "progress":
+                break
+            if progress:
+                progress(payload)
+        self.jobs_done += 1
+        if status != "ok":
+            raise GeometryWorkerError(payload)
+        return payload
+
+    def cache_stats(self, timeout=GEOMETRY_HEALTH_CHECK_TIMEOUT):
+        self.conn.send(("stats", None))
+        status, payload = self._receive(timeout)
+        return payload if status == "ok" else None
+
+    def ping(self, timeout=GEOMETRY_HEALTH_CHECK_TIMEOUT):
+        try:
+            self.conn.send(("ping", None))
+            status, _ = self._receive(timeout)
+            return status == "pong"
+        except (GeometryWorkerError, OSError):
+            return False
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(("stop", None))
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+
+
+class GeometryWorkerPool():
+    """
+    Pool of long-lived processes that load the geometry runtime (Rhino, numpy, trimesh) once
+    and build models for jobs of (program file name, sliders value).
+    A worker is recycled after max_jobs_per_worker jobs, after a timeout or when it crashed.
+    """
+    def __init__(self, size=GEOMETRY_WORKERS, runtime_module_name=GEOMETRY_RUNTIME_MODULE,
+                 max_jobs_per_worker=GEOMETRY_WORKER_MAX_JOBS, job_timeout=GEOMETRY_JOB_TIMEOUT,
+                 use_cache=MESH_CACHE_ENABLED, validate=PROGRAM_VALIDATION_ENABLED):
+        self.size = size
+        self.validate = validate
+        self.runtime_module_name = runtime_module_name
+        self.use_cache = use_cache
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.job_timeout = job_timeout
+        # spawn - forking a process that already runs Flask threads or the .NET runtime is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.idle_workers = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.starting_workers = 0  # workers _restore_workers is starting, outside the lock
+        self.meshing_stats = MeshingStats()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            for _ in range(self.size):
+                worker = self._new_worker()
+                self.workers.append(worker)
+                self.idle_workers.put(worker)
+            self.started = True
+        print(f"Geometry worker pool started with {self.size} workers of {self.runtime_module_name}")
+
+    def _new_worker(self):
+        worker = GeometryWorker(self.context, self.runtime_module_name, self.use_cache)
+        worker.start()
+        return worker
+
+    def _replace_worker(self, worker):
+        # The new worker, or None when it fails to start and the pool runs with one worker less
+        worker.stop()
+        for attempt in range(GEOMETRY_WORKER_START_ATTEMPTS):
+            try:
+                new_worker = self._new_worker()
+            except GeometryWorkerError as error:
+                print(f"Geometry worker replacement failed, attempt {attempt + 1}: {error}")
+                continue
+            with self.lock:
+                self.workers[self.workers.index(worker)] = new_worker
+            return new_worker
+        with self.lock:
+            self.workers.remove(worker)
+        return None
+
+    def _restore_workers(self):
+        # Workers lost to failed starts are started again by the next job, the job fails only without any worker.
+        # A start takes up to GEOMETRY_WORKER_START_TIMEOUT, the lock is held only to count and add the workers.
+        while True:
+            with self.lock:
+                if len(self.workers) + self.starting_workers >= self.size:
+                    return
+                self.starting_workers += 1
+            try:
+                worker = self._new_worker()
+            except GeometryWorkerError:
+                with self.lock:
+                    self.starting_workers -= 1
+                    workers_count = len(self.workers)
+                if workers_count:
+                    print(f"Geometry worker pool runs with {workers_count} of {self.size} workers")
+                    return
+                raise
+            with self.lock:
+                self.starting_workers -= 1
+                self.workers.append(worker)
+            self.idle_workers.put(worker)
+
+    def _wait_for_worker(self):
+        # A job waiting while the pool lost its workers starts them again instead of waiting forever
+        while True:
+            self._restore_workers()
+            try:
+                return self.idle_workers.get(timeout=GEOMETRY_WORKER_WAIT_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def build_model(self, file_name, sliders_value=None, output_file=OUTPUT_MESH_FILE, progress=None,
+                    mesh_quality=MESH_QUALITY_DEFAULT):
+        """
+        Build the model in the first idle worker, meshed at the mesh_quality level of MESH_QUALITY_LEVELS.
+        progress is called with the name of every build stage as the worker reaches it.
+        Raise ProgramValidationError without running a program that cannot run.
+        """
+        get_meshing_settings(mesh_quality)  # unknown levels fail here, not in the worker
+        self.start()
+        with span("geometry job", file_name=file_name, mesh_quality=mesh_quality) as current:
+            if self.validate:
+                # A program that cannot run is rejected before it waits for a worker
+                with span("validate program"):
+                    validate_program_file(file_name)
+            job = {'file_name': file_name, 'sliders_value': sliders_value, 'output_file': output_file,
+                   'mesh_quality': mesh_quality, 'trace_context': get_trace_context()}
+            with span("wait for worker"):
+                worker = self._wait_for_worker()
+            current.set(worker_pid=worker.process.pid)
+            try:
+                result = worker.run(job, self.job_timeout, progress)
+            except GeometryWorkerError:
+                # A crashed or stuck worker is replaced, a failing program keeps its worker
+                if not worker.is_alive() or not worker.ping():
+                    worker = self._replace_worker(worker)
+                raise
+            finally:
+                if worker is not None and (worker.jobs_done >= self.max_jobs_per_worker or not worker.is_alive()):
+                    worker = self._replace_worker(worker)
+                # Only a running worker goes back, a stopped one would fail the next job
+                if worker is not None:
+                    self.idle_workers.put(worker)
+            current.set(cached=result.get('cached'))
+        if 'meshing_seconds' in result:
+            self.meshing_stats.record(mesh_quality, result['triangles'], result['meshing_seconds'])
+            print(f"Meshed {file_name} at {mesh_quality} quality: {result['triangles']} triangles "
+                  f"in {result['meshing_seconds']:.3f} seconds")
+        return result
+
+    def health_check(self):
+        # Only idle workers are pinged, busy workers are reported as busy
+        with self.lock:
+            workers = list(self.workers)
+        idle = []
+        while True:
+            try:
+                idle.append(self.idle_workers.get_nowait())
+            except queue.Empty:
+                break
+        health = []
+        try:
+            for worker in workers:
+                pid = worker.process.pid if worker.process else None
+                cache_stats = None
+                if worker in idle:
+                    status = "ok" if worker.is_alive() and worker.ping() else "unresponsive"
+                    if status == "ok" and self.use_cache:
+                        cache_stats = worker.cache_stats()
+                else:
+                    status = "busy"
+                health.append({'pid': pid, 'status': status, 'jobs_done': worker.jobs_done,
+                               'cache': cache_stats})
+        finally:
+            for worker in idle:
+                self.idle_workers.put(worker)
+        return {'started': self.started, 'size': self.size, 'workers': health,
+                'meshing': self.meshing_stats.to_dict(), 'validation': validation_cache.stats()}
+
+    def shutdown(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            self.idle_workers = queue.Queue()
+            self.started = False
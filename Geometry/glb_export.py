@@ -0,0 +1,198 @@
+"""
+Binary glTF (GLB) export of the model parts for the browser viewer.
+Every part becomes a named node with its own indexed mesh.
+
+Optional encodings, both are glTF extensions that three.js GLTFLoader supports:
+    quantize_positions - positions stored as unsigned shorts with the node scale/translation
+                         restoring the dimensions (KHR_mesh_quantization)
+    compress_indices   - indices encoded with the meshoptimizer index codec (EXT_meshopt_compression),
+                         needs the meshoptimizer package, and MeshoptDecoder in the viewer
+"""
+import json
+import os
+import struct
+import numpy as np
+
+try:
+    import meshoptimizer
+except ImportError:
+    meshoptimizer = None
+
+GLB_MAGIC = 0x46546C67
+GLB_VERSION = 2
+JSON_CHUNK_TYPE = 0x4E4F534A
+BIN_CHUNK_TYPE = 0x004E4942
+
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+QUANTIZATION_STEPS = 65535
+
+
+def _pad(data, alignment=4, fill=b'\x00'):
+    return data + fill * (-len(data) % alignment)
+
+
+class GlbBuilder():
+    def __init__(self):
+        self.binary = bytearray()
+        self.buffer_views = []
+        self.accessors = []
+        self.extensions_used = set()
+        self.extensions_required = set()
+        self.fallback_length = 0
+
+    def add_buffer_view(self, data, target=None, byte_stride=None):
+        offset = len(self.binary)
+        self.binary += _pad(data)
+        buffer_view = {'buffer': 0, 'byteOffset': offset, 'byteLength': len(data)}
+        if target is not None:
+            buffer_view['target'] = target
+        if byte_stride is not None:
+            buffer_view['byteStride'] = byte_stride
+        self.buffer_views.append(buffer_view)
+        return len(self.buffer_views) - 1
+
+    def add_compressed_index_view(self, indices, index_size):
+        # The decoded data lives in a fallback buffer without content, the loader fills it.
+        # The codec compresses best when the triangles are ordered for the vertex cache first.
+        indices = indices.astype(np.uint32)
+        optimized_indices = np.zeros_like(indices)
+        meshoptimizer.optimize_vertex_cache(optimized_indices, indices)
+        encoded = meshoptimizer.encode_index_buffer(optimized_indices)
+        byte_length = len(indices) * index_size
+        offset = len(self.binary)
+        self.binary += _pad(encoded)
+        self.buffer_views.append({
+            'buffer': 1,
+            'byteOffset': self.fallback_length,
+            'byteLength': byte_length,
+            'target': ELEMENT_ARRAY_BUFFER,
+            'extensions': {'EXT_meshopt_compression': {
+                'buffer': 0,
+                'byteOffset': offset,
+                'byteLength': len(encoded),
+                'byteStride': index_size,
+                'mode': 'TRIANGLES',
+                'count': len(indices)
+            }}
+        })
+        self.extensions_used.add('EXT_meshopt_compression')
+        self.extensions_required.add('EXT_meshopt_compression')
+        self.fallback_length += byte_length + (-byte_length % 4)
+        return len(self.buffer_views) - 1
+
+    def add_accessor(self, buffer_view, component_type, count, accessor_type, minimum=None, maximum=None):
+        accessor = {'bufferView': buffer_view, 'componentType': component_type, 'count': count,
+                    'type': accessor_type}
+        if minimum is not None:
+            accessor['min'] = minimum
+            accessor['max'] = maximum
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_positions(self, vertices, quantize):
+        # Returns the accessor and the node transform that restores the positions
+        if not quantize:
+            positions = vertices.astype(np.float32)
+            buffer_view = self.add_buffer_view(positions.tobytes(), ARRAY_BUFFER)
+            accessor = self.add_accessor(buffer_view, FLOAT, len(positions), 'VEC3',
+                                         positions.min(axis=0).tolist(), positions.max(axis=0).tolist())
+            return accessor, {}
+
+        minimum = vertices.min(axis=0)
+        extent = vertices.max(axis=0) - minimum
+        extent[extent == 0] = 1
+        quantized = np.rint((vertices - minimum) / extent * QUANTIZATION_STEPS).astype(np.uint16)
+        # Vertex attributes must be 4 bytes aligned: 3 shorts padded to 8 bytes per vertex
+        padded = np.zeros((len(quantized), 4), dtype=np.uint16)
+        padded[:, :3] = quantized
+        buffer_view = self.add_buffer_view(padded.tobytes(), ARRAY_BUFFER, byte_stride=8)
+        accessor = self.add_accessor(buffer_view, UNSIGNED_SHORT, len(quantized), 'VEC3',
+                                     quantized.min(axis=0).tolist(), quantized.max(axis=0).tolist())
+        self.extensions_used.add('KHR_mesh_quantization')
+        self.extensions_required.add('KHR_mesh_quantization')
+        transform = {'translation': minimum.tolist(), 'scale': (extent / QUANTIZATION_STEPS).tolist()}
+        return accessor, transform
+
+    def add_indices(self, faces, vertex_count, compress):
+        indices = faces.reshape(-1)
+        if vertex_count <= 0xFFFF:
+            component_type, index_size, dtype = UNSIGNED_SHORT, 2, np.uint16
+        else:
+            component_type, index_size, dtype = UNSIGNED_INT, 4, np.uint32
+        if compress and len(indices):
+            buffer_view = self.add_compressed_index_view(indices, index_size)
+        else:
+            buffer_view = self.add_buffer_view(indices.astype(dtype).tobytes(), ELEMENT_ARRAY_BUFFER)
+        return self.add_accessor(buffer_view, component_type, len(indices), 'SCALAR')
+
+    def to_bytes(self, gltf):
+        gltf['bufferViews'] = self.buffer_views
+        gltf['accessors'] = self.accessors
+        gltf['buffers'] = [{'byteLength': len(self.binary)}]
+        if self.fallback_length:
+            gltf['buffers'].append({'byteLength': self.fallback_length,
+                                    'extensions': {'EXT_meshopt_compression': {'fallback': True}}})
+        if self.extensions_used:
+            gltf['extensionsUsed'] = sorted(self.extensions_used)
+            gltf['extensionsRequired'] = sorted(self.extensions_required)
+
+        json_chunk = _pad(json.dumps(gltf, separators=(',', ':')).encode(), fill=b' ')
+        binary_chunk = _pad(bytes(self.binary))
+        length = 12 + 8 + len(json_chunk) + 8 + len(binary_chunk)
+        return b''.join([
+            struct.pack('<III', GLB_MAGIC, GLB_VERSION, length),
+            struct.pack('<II', len(json_chunk), JSON_CHUNK_TYPE), json_chunk,
+            struct.pack('<II', len(binary_chunk), BIN_CHUNK_TYPE), binary_chunk
+        ])
+
+
+def export_glb(part_names, part_meshes, output_file, quantize_positions=False, compress_indices=False):
+    """
+    Write the parts to a GLB file.
+
+    Parameters:
+        part_names (list of str): the name of every part, used for the nodes and meshes
+        part_meshes (list of (numpy.ndarray, numpy.ndarray)): vertices (n, 3) and triangle faces (m, 3) of every part
+        output_file (str): path of the GLB file
+        quantize_positions (bool): store positions as unsigned shorts (KHR_mesh_quantization)
+        compress_indices (bool): encode indices with meshoptimizer (EXT_meshopt_compression)
+
+    Return:
+        int: size of the written file in bytes
+    """
+    if compress_indices and meshoptimizer is None:
+        print("Warning: meshoptimizer is not installed, GLB indices are written uncompressed")
+        compress_indices = False
+
+    builder = GlbBuilder()
+    nodes = []
+    meshes = []
+    for name, (vertices, faces) in zip(part_names, part_meshes):
+        if len(vertices) == 0 or len(faces) == 0:
+            continue
+        position_accessor, transform = builder.add_positions(vertices, quantize_positions)
+        indices_accessor = builder.add_indices(faces, len(vertices), compress_indices)
+        meshes.append({'name': name, 'primitives': [{
+            'attributes': {'POSITION': position_accessor},
+            'indices': indices_accessor,
+            'mode': TRIANGLES
+        }]})
+        nodes.append({'name': name, 'mesh': len(meshes) - 1, **transform})
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'From Text to 3D'},
+        'scene': 0,
+        'scenes': [{'nodes': list(range(len(nodes)))}],
+        'nodes': nodes,
+        'meshes': meshes
+    }
+    data = builder.to_bytes(gltf)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, 'wb') as f:
+        f.write(data)
+    return len(data)
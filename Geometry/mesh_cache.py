@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from Consts.geometry_consts import *
+from Geometry.program_selector import get_program_path
+from Geometry.mesh_quality import get_meshing_settings
+from Utils.tracing import span
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PARAMS_FILE = "params.json"
+MESH_FILE = "mesh"
+COMPRESSED_MESH_FILE = "mesh.zst"
+
+
+def normalize_sliders_value(sliders_value):
+    # "30", "30.0" and 30 are the same slider position
+    if not isinstance(sliders_value, dict):
+        return {}
+    normalized = {}
+    for name, value in sliders_value.items():
+        try:
+            normalized[name] = float(value)
+        except (TypeError, ValueError):
+            normalized[name] = str(value)
+    return normalized
+
+
+def hash_program(file_name):
+    with open(get_program_path(file_name), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class MeshCache():
+    """
+    Disk cache of exported meshes and the sliders dict 'b' of the program that built them.
+    Entries are keyed by (program file hash, normalized sliders value, meshing settings) and
+    evicted least recently used first when the cache grows over max_size_bytes.
+    Several worker processes can share the same cache directory.
+    """
+    def __init__(self, cache_dir=MESH_CACHE_DIR, max_size_bytes=MESH_CACHE_MAX_SIZE_BYTES,
+                 compress=MESH_CACHE_COMPRESSION):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.compress = compress and zstandard is not None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, file_name, sliders_value=None, meshing_settings=None):
+        key = {
+            'program': hash_program(file_name),
+            'sliders_value': normalize_sliders_value(sliders_value),
+            'meshing_settings': meshing_settings or {}
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key, output_file):
+        """Copy the cached mesh to output_file and return the cached params, or None on a miss."""
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_dir, PARAMS_FILE), 'r') as f:
+                params = json.load(f)
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            compressed_path = os.path.join(entry_dir, COMPRESSED_MESH_FILE)
+            if os.path.exists(compressed_path):
+                if zstandard is None:
+                    raise FileNotFoundError(compressed_path)
+                with open(compressed_path, 'rb') as source, open(output_file, 'wb') as destination:
+                    zstandard.ZstdDecompressor().copy_stream(source, destination)
+            else:
+                shutil.copyfile(os.path.join(entry_dir, MESH_FILE), output_file)
+            # Touch the entry so it is the most recently used
+            os.utime(entry_dir)
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            # Missing, half evicted or half written entry
+            self.misses += 1
+            return None
+        self.hits += 1
+        return params
+
+    def put(self, key, params, mesh_file):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write into a temporary directory and rename it, other workers never see partial entries
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        with open(os.path.join(temp_dir, PARAMS_FILE), 'w') as f:
+            json.dump(params, f)
+        if self.compress:
+            with open(mesh_file, 'rb') as source, open(os.path.join(temp_dir, COMPRESSED_MESH_FILE), 'wb') as destination:
+                zstandard.ZstdCompressor().copy_stream(source, destination)
+        else:
+            shutil.copyfile(mesh_file, os.path.join(temp_dir, MESH_FILE))
+        try:
+            os.replace(temp_dir, os.path.join(self.cache_dir, key))
+        except OSError:
+            # Another worker stored the same entry first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, file)) for file in os.listdir(entry_dir))
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+    def stats(self):
+        entries = self.entries()
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'compressed': self.compress
+        }
+
+
+def get_output_settings(output_file, meshing_settings=None):
+    # Everything that changes the exported file besides the program and the sliders
+    settings = dict(meshing_settings or {}, format=os.path.splitext(output_file)[1])
+    if settings['format'] == ".glb":
+        settings.update(quantize_positions=GLB_QUANTIZE_POSITIONS, compress_indices=GLB_COMPRESS_INDICES)
+    return settings
+
+
+def build_model_with_cache(runtime, cache, file_name, sliders_value=None, output_file=OUTPUT_MESH_FILE,
+                           progress=None, mesh_quality=MESH_QUALITY_DEFAULT):
+    # A hit skips running the program, meshing and exporting
+    key = cache.make_key(file_name, sliders_value, get_output_settings(output_file, get_meshing_settings(mesh_quality)))
+    with span("mesh cache lookup") as current:
+        params = cache.get(key, output_file)
+        current.set(hit=params is not None)
+    if params is not None:
+        if progress:
+            progress("loaded from cache")
+        return {'params': params, 'num_of_params': len(params), 'mesh_path': output_file,
+                'mesh_quality': mesh_quality, 'cached': True}
+
+    start_time = time.perf_counter()
+    result = runtime.build_model(file_name, sliders_value, output_file, progress, mesh_quality)
+    cache.put(key, result['params'], output_file)
+    result['cached'] = False
+    result['build_seconds'] = time.perf_counter() - start_time
+    return result
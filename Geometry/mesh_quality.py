@@ -0,0 +1,33 @@
+import threading
+from Consts.geometry_consts import *
+
+
+def get_meshing_settings(mesh_quality=MESH_QUALITY_DEFAULT):
+    """Return the meshing settings of a quality level, raise ValueError for an unknown level."""
+    if mesh_quality not in MESH_QUALITY_LEVELS:
+        raise ValueError(f"Unknown mesh quality '{mesh_quality}', expected one of {sorted(MESH_QUALITY_LEVELS)}")
+    return dict(MESH_QUALITY_LEVELS[mesh_quality], level=mesh_quality)
+
+
+class MeshingStats():
+    """Triangle count and meshing time of the builds of every quality level, to tune the levels."""
+    def __init__(self):
+        self.levels = {}
+        self.lock = threading.Lock()
+
+    def record(self, mesh_quality, triangles, meshing_seconds):
+        with self.lock:
+            level = self.levels.setdefault(mesh_quality, {'builds': 0, 'triangles': 0, 'meshing_seconds': 0,
+                                                          'max_meshing_seconds': 0})
+            level['builds'] += 1
+            level['triangles'] += triangles
+            level['meshing_seconds'] += meshing_seconds
+            level['max_meshing_seconds'] = max(level['max_meshing_seconds'], meshing_seconds)
+
+    def to_dict(self):
+        with self.lock:
+            return {mesh_quality: {'builds': level['builds'],
+                                   'average_triangles': level['triangles'] / level['builds'],
+                                   'average_meshing_seconds': level['meshing_seconds'] / level['builds'],
+                                   'max_meshing_seconds': level['max_meshing_seconds']}
+                    for mesh_quality, level in self.levels.items()}
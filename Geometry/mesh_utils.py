@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def to_numpy(values, dtype):
+    # A .NET array of RhinoCommon is copied in one native call into the numpy buffer,
+    # iterating it would convert every element across the interop boundary
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        try:
+            # pythonnet, loaded by Rhino.Inside after this module is imported
+            from System import Array, IntPtr
+            from System.Runtime.InteropServices import Marshal
+        except ImportError:
+            Array = None
+        if Array is not None and isinstance(values, Array):
+            array = np.empty(len(values), dtype=dtype)
+            if len(array):
+                Marshal.Copy(values, 0, IntPtr(array.ctypes.data), len(array))
+            return array
+    return np.asarray(values, dtype=dtype)
+
+
+def quad_faces_to_triangles(faces):
+    """
+    Split a (n, 4) array of mesh faces into triangles.
+    Like RhinoCommon, a triangle is stored with its third index repeated (C == D),
+    a quad (A, B, C, D) is split into (A, B, C) and (C, D, A).
+    """
+    is_quad = faces[:, 2] != faces[:, 3]
+    return np.concatenate([faces[:, :3], faces[is_quad][:, [2, 3, 0]]])
+
+
+def mesh_to_arrays(mesh):
+    """
+    Extract vertices (n, 3) and triangle faces (m, 3) from a Rhino.Geometry.Mesh
+    with two bulk copies instead of walking every vertex and face in python.
+    """
+    vertices = to_numpy(mesh.Vertices.ToFloatArray(), np.float32).astype(np.float64).reshape(-1, 3)
+    faces = to_numpy(mesh.Faces.ToIntArray(False), np.int32).reshape(-1, 4)
+    return vertices, quad_faces_to_triangles(faces)
+
+
+def merge_part_meshes(part_meshes):
+    # Concatenate the parts into one mesh, shifting the faces of every part by the vertices before it
+    vertices = [part_vertices for part_vertices, _ in part_meshes]
+    offsets = np.cumsum([0] + [len(part_vertices) for part_vertices in vertices[:-1]])
+    faces = [part_faces + offset for (_, part_faces), offset in zip(part_meshes, offsets)]
+    if not vertices:
+        return np.zeros((0, 3), dtype=np.float64), np.zeros((0, 3), dtype=np.int32)
+    return np.concatenate(vertices), np.concatenate(faces)
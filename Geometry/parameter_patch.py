@@ -0,0 +1,134 @@
+"""
+Change the default values of the parameters of a program without touching the rest of it.
+
+The defaults are the assignments of the except block of the sliders, e.g. body_height = 100 in
+
+    try:
+        sliders_value = locals()['sliders_value']
+        body_height = float(sliders_value['body_height'])
+    except:
+        body_height = 100
+
+Only the source of the changed values is replaced, every other character of the program stays the same.
+A new value must be inside the [min, max] range of its slider in the dict 'b'.
+"""
+import ast
+from Geometry.program_analysis import find_top_level_assignment
+
+
+class ParameterPatchError(Exception):
+    pass
+
+
+class ParameterRangeError(ParameterPatchError):
+    pass
+
+
+def get_number(node):
+    # The number of a literal like 10, 2.5 or -3, None for anything else
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def find_default_assignments(tree):
+    # name -> assignment of the except blocks of the top level try statements, the last one wins
+    defaults = {}
+    for statement in tree.body:
+        if not isinstance(statement, ast.Try):
+            continue
+        for handler in statement.handlers:
+            for child in handler.body:
+                if isinstance(child, ast.Assign) and len(child.targets) == 1 and isinstance(child.targets[0], ast.Name) \
+                        and get_number(child.value) is not None:
+                    defaults[child.targets[0].id] = child
+    return defaults
+
+
+def get_slider_ranges(tree):
+    # name -> (min, max) of the sliders dict b = {"name": [min, max, value], ...}
+    assignment = find_top_level_assignment(tree, 'b')
+    if assignment is None or not isinstance(assignment.value, ast.Dict):
+        return {}
+    ranges = {}
+    for key, value in zip(assignment.value.keys, assignment.value.values):
+        if isinstance(key, ast.Constant) and isinstance(value, (ast.List, ast.Tuple)) and len(value.elts) >= 2:
+            minimum, maximum = get_number(value.elts[0]), get_number(value.elts[1])
+            if minimum is not None and maximum is not None:
+                ranges[key.value] = (minimum, maximum)
+    return ranges
+
+
+def split_bom(code):
+    # (BOM, code without it) of a program saved on Windows, ast rejects the BOM, the patched program keeps it
+    body = code.lstrip("\ufeff\u00ef\u00bb\u00bf")
+    return code[:len(code) - len(body)], body
+
+
+def get_program_parameters(code):
+    """
+    Return the parameters with a default value, e.g. {'body_height': {'value': 100, 'min': 10, 'max': 300}}.
+    min and max are None for parameters without a slider.
+    """
+    _, code = split_bom(code)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as error:
+        raise ParameterPatchError(f"The program is not valid python: {error}")
+    ranges = get_slider_ranges(tree)
+    parameters = {}
+    for name, assignment in find_default_assignments(tree).items():
+        minimum, maximum = ranges.get(name, (None, None))
+        parameters[name] = {'value': get_number(assignment.value), 'min': minimum, 'max': maximum}
+    return parameters
+
+
+def format_number(value, old_value):
+    # 300.0 replacing 100 is written 300
+    if isinstance(value, float) and value.is_integer() and isinstance(old_value, int):
+        return str(int(value))
+    return repr(value)
+
+
+def get_offset(lines, line_offsets, line, column):
+    # ast columns count utf-8 bytes, the source is cut by characters
+    return line_offsets[line - 1] + len(lines[line - 1].encode()[:column].decode())
+
+
+def apply_parameter_patch(code, changes):
+    """
+    Return the program with the default values of changes, {name: new value}.
+    Raise ParameterPatchError for an unknown parameter or a value that is not a number,
+    and ParameterRangeError for a value outside the range of its slider.
+    """
+    bom, code = split_bom(code)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as error:
+        raise ParameterPatchError(f"The program is not valid python: {error}")
+    defaults = find_default_assignments(tree)
+    ranges = get_slider_ranges(tree)
+    replacements = []
+    for name, value in changes.items():
+        if name not in defaults:
+            raise ParameterPatchError(f"The program has no parameter {name}, its parameters are {', '.join(defaults)}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ParameterPatchError(f"The new value of {name} is not a number: {value!r}")
+        if name in ranges and not ranges[name][0] <= value <= ranges[name][1]:
+            raise ParameterRangeError(f"{name} must be between {ranges[name][0]} and {ranges[name][1]}, not {value}")
+        node = defaults[name].value
+        replacements.append((node, format_number(value, get_number(node))))
+
+    # Replaced from the end of the program, the positions of the earlier values do not move
+    lines = code.splitlines(keepends=True)
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    replacements.sort(key=lambda replacement: (replacement[0].lineno, replacement[0].col_offset), reverse=True)
+    for node, text in replacements:
+        start = get_offset(lines, line_offsets, node.lineno, node.col_offset)
+        end = get_offset(lines, line_offsets, node.end_lineno, node.end_col_offset)
+        code = code[:start] + text + code[end:]
+    return bom + code
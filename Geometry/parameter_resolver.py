@@ -0,0 +1,232 @@
+"""
+Resolve simple parameter change prompts without the parameter manipulator agent.
+
+    "Change jar height to 30 cm"            -> {'body_height': 300}
+    "increase the lid ring height by 20%"   -> {'lid_ring_height': 12}
+    "6 holes and a diameter of 12 cm"       -> {'holes_amount': 6, 'body_radius': 60}
+    "make the glass 2 times shorter"        -> {'body_height': 150}
+
+Every change of the prompt (split by "and" and commas) needs exactly one number, or a word like double,
+and words that match the words of one parameter name, exactly, by a synonym or misspelled.
+A number with a unit is converted to millimeters, "3 times" multiplies and a width is the diameter of a
+round part. When a change is not understood confidently, or its value is outside the range of the slider,
+the prompt is not resolved and the agent changes the program. A change naming a part or a measure the
+program has no parameter of ("the handle height" of a glass), or a number followed by a unit the resolver
+does not read, is not understood.
+"""
+import os
+import re
+import threading
+from difflib import SequenceMatcher
+from Consts.geometry_consts import FULL_PROGRAMS_DIR
+from Consts.parameter_resolver_consts import *
+from Geometry.parameter_patch import get_program_parameters, ParameterPatchError
+
+TOKEN_PATTERN = re.compile(r'\d+(?:\.\d+)?|[a-z]+|%|"|=')
+CLAUSE_SEPARATOR = re.compile(r",|;|\band\b")
+FACTOR_WORDS = {"double": 2, "twice": 2, "triple": 3, "half": 0.5, "halve": 0.5}
+COUNT_SUFFIXES = ("amount", "count", "number")
+
+
+def is_number(token):
+    return token[0].isdigit()
+
+
+def singular(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+corpus_part_words = None
+corpus_part_words_lock = threading.Lock()
+
+
+def get_part_words(programs_dir=FULL_PROGRAMS_DIR):
+    # PARAMETER_RESOLVER_PART_WORDS and the words before the measure of the parameters of Full_Programs,
+    # lid and ring of lid_ring_height, without the measures and the object names, read once per process
+    global corpus_part_words
+    with corpus_part_words_lock:
+        if corpus_part_words is None:
+            part_words = set()
+            # thickness of rim_thickness_vertical is a measure, glass of glass_1 the object
+            other_words = set(PARAMETER_RESOLVER_SYNONYMS.values()) | set(PARAMETER_RESOLVER_FILLER_WORDS)
+            for file_name in sorted(os.listdir(programs_dir)) if os.path.isdir(programs_dir) else []:
+                if not file_name.endswith(".py"):
+                    continue
+                # bowl_2.py -> bowl
+                other_words.update(word for word in os.path.splitext(file_name)[0].split("_") if not word.isdigit())
+                with open(os.path.join(programs_dir, file_name), encoding='utf-8-sig') as f:
+                    try:
+                        parameters = get_program_parameters(f.read())
+                    except ParameterPatchError:
+                        continue
+                for name in parameters:
+                    part_words.update(name.split("_")[:-1])
+                    other_words.add(name.split("_")[-1])
+            corpus_part_words = (part_words - other_words) | PARAMETER_RESOLVER_PART_WORDS
+    return corpus_part_words
+
+
+class ParameterResolver():
+    def __init__(self, parameters):
+        # parameters: {name: {'value', 'min', 'max'}} of Geometry/parameter_patch.get_program_parameters
+        self.parameters = parameters
+        self.name_words = {name: name.split("_") for name in parameters}
+        self.vocabulary = {word for words in self.name_words.values() for word in words}
+        self.part_words = get_part_words()
+
+    def match_word(self, word):
+        # The parameter name word of a prompt word, None for a word of no parameter
+        for candidate in (PARAMETER_RESOLVER_SYNONYMS.get(word), word, singular(word), word + "s"):
+            if candidate in self.vocabulary:
+                return candidate
+        # Short words are too close to too many words, "to" -> "top"
+        if len(word) < PARAMETER_RESOLVER_FUZZY_MIN_LENGTH:
+            return None
+        best_word, best_similarity = None, PARAMETER_RESOLVER_FUZZY_MIN_SIMILARITY
+        for known_word in self.vocabulary:
+            similarity = SequenceMatcher(None, word, known_word).ratio()
+            if similarity >= best_similarity:
+                best_word, best_similarity = known_word, similarity
+        return best_word
+
+    def choose_parameter(self, matched_words, counted=False):
+        # The parameter with most of the matched words, then a count for counted things ("6 holes"),
+        # then of the default part when the change names no part, then with the shortest name
+        names_part = bool(matched_words & self.part_words)
+        scored = []
+        for name, words in self.name_words.items():
+            score = len(matched_words & set(words))
+            if score:
+                scored.append((-score, counted and words[-1] not in COUNT_SUFFIXES,
+                               not names_part and PARAMETER_RESOLVER_DEFAULT_PART not in words, len(words), name))
+        if not scored:
+            return None
+        scored.sort()
+        if len(scored) > 1 and scored[0][:4] == scored[1][:4]:
+            return None
+        return scored[0][4]
+
+    def resolve_change(self, clause):
+        # (name, new value) of one change, None when it is not understood
+        tokens = TOKEN_PATTERN.findall(clause.lower())
+        numbers = [i for i, token in enumerate(tokens) if is_number(token)]
+        factors = [FACTOR_WORDS[token] for token in tokens if token in FACTOR_WORDS]
+        if len(numbers) + len(factors) != 1:
+            return None
+
+        used = set(numbers)
+        number = unit = None
+        percent = False
+        factor = factors[0] if factors else None
+        absolute = not numbers
+        if numbers:
+            i = numbers[0]
+            number = float(tokens[i])
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if following in ("%", "percent"):
+                percent = True
+                used.add(i + 1)
+            elif following in ("times", "x"):
+                # "3 times taller" multiplies
+                factor = number
+                used.add(i + 1)
+            # "in" is a unit only at the end of the change, "3 in"
+            elif following in PARAMETER_RESOLVER_UNITS and (following != "in" or i + 2 == len(tokens)):
+                unit = following
+                used.add(i + 1)
+            elif following in PARAMETER_RESOLVER_UNITS or following in PARAMETER_RESOLVER_UNSUPPORTED_UNITS:
+                # "3 in tall" or "2 feet", a unit the change is not read with
+                return None
+        increase = any(token in PARAMETER_RESOLVER_INCREASE_WORDS for token in tokens)
+        decrease = any(token in PARAMETER_RESOLVER_DECREASE_WORDS for token in tokens)
+        if numbers and factor is None:
+            # "to 30 cm" sets the value, "by 2 cm" and "2 cm taller" change it
+            previous = tokens[numbers[0] - 1] if numbers[0] > 0 else None
+            absolute = previous in ("to", "=", "of") or (previous != "by" and not increase and not decrease)
+        if factor is not None and numbers and decrease and not increase:
+            # "3 times smaller"
+            factor = 1 / factor
+        if not absolute and factor is None and increase == decrease:
+            # "by 2 cm" without saying more or less
+            return None
+
+        matched_words = set()
+        unknown_words = 0
+        diameter = False
+        for i, token in enumerate(tokens):
+            if i in used or is_number(token) or token in FACTOR_WORDS or token in ("%", "=", '"'):
+                continue
+            # Filler and direction words are never parameter words, "taller" is also a synonym of height
+            if token in PARAMETER_RESOLVER_FILLER_WORDS or ((token in PARAMETER_RESOLVER_INCREASE_WORDS or
+                                                             token in PARAMETER_RESOLVER_DECREASE_WORDS)
+                                                            and token not in PARAMETER_RESOLVER_SYNONYMS):
+                continue
+            word = self.match_word(token)
+            if word is None and token in PARAMETER_RESOLVER_WIDTH_WORDS:
+                # The width of a round part is its diameter, "30 cm wide" -> a radius of 15 cm
+                word = self.match_word("diameter")
+                if word is None:
+                    return None
+                diameter = True
+            if word is not None:
+                matched_words.add(word)
+                diameter = diameter or token in PARAMETER_RESOLVER_DIAMETER_WORDS
+            elif token in PARAMETER_RESOLVER_SYNONYMS or token in self.part_words or singular(token) in self.part_words:
+                # A measure or a part the program has no parameter of, "thicker" or "the handle height" of a glass
+                return None
+            else:
+                unknown_words += 1
+        # A plain number right before a plural word counts things, "6 holes"
+        counted = bool(numbers) and unit is None and not percent and factor is None and numbers[0] + 1 < len(tokens) \
+            and singular(tokens[numbers[0] + 1]) != tokens[numbers[0] + 1]
+        name = self.choose_parameter(matched_words, counted)
+        if name is None:
+            return None
+        # Words of other parameters, "lid height" when the chosen parameter is body_height
+        unknown_words += len(matched_words - set(self.name_words[name]))
+        if unknown_words > PARAMETER_RESOLVER_MAX_UNKNOWN_WORDS:
+            return None
+
+        words = self.name_words[name]
+        is_count = words[-1] in COUNT_SUFFIXES
+        if unit and (is_count or "relative" in words):
+            return None
+        current = self.parameters[name]['value']
+        if factor is not None:
+            value = current * factor
+        elif percent:
+            value = current * number / 100 if absolute else current * (1 + (number if increase else -number) / 100)
+        else:
+            amount = number * PARAMETER_RESOLVER_UNITS.get(unit, 1)
+            if diameter and words[-1] == "radius":
+                amount /= 2
+            value = amount if absolute else current + (amount if increase else -amount)
+        if is_count:
+            value = round(value)
+        value = round(value, 3)
+        # A guess outside the range of the slider is left to the agent
+        minimum, maximum = self.parameters[name]['min'], self.parameters[name]['max']
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            return None
+        return name, int(value) if float(value).is_integer() else value
+
+    def resolve(self, prompt):
+        changes = {}
+        for clause in CLAUSE_SEPARATOR.split(prompt):
+            if not clause.strip():
+                continue
+            change = self.resolve_change(clause)
+            if change is None or change[0] in changes:
+                return None
+            changes[change[0]] = change[1]
+        return changes or None
+
+
+def resolve_parameter_changes(prompt, parameters):
+    """
+    Return {parameter name: new value} of a prompt like "Change jar height to 30 cm",
+    or None when the prompt is not understood confidently.
+    """
+    if not parameters:
+        return None
+    return ParameterResolver(parameters).resolve(prompt)
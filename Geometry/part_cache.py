@@ -0,0 +1,148 @@
+"""
+Incremental rebuild of the parts of a program.
+
+Get_part_dependencies finds the sliders every part call of a program depends on,
+the part calls are rewritten to go through PartCache, which returns the Brep and the mesh
+of the part when the program and the values of these sliders did not change.
+Moving the holes sliders of toothpick_dispenser_1.py rebuilds and re-meshes only the lid.
+"""
+import ast
+import hashlib
+from collections import OrderedDict
+from Consts.geometry_consts import *
+from Geometry.program_analysis import get_part_dependencies
+
+BUILD_PART_FUNCTION = "__build_part__"
+TRACE_FUNCTION = "__trace_function__"
+
+
+class PartCache():
+    """
+    In memory LRU cache of the parts built in this process, keyed by
+    (program hash, part name, values of the sliders the part depends on).
+    Every entry holds the Brep of the part and its mesh of every quality level it was meshed at.
+    """
+    def __init__(self, max_entries=PART_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, brep):
+        self.entries[key] = {'brep': brep, 'meshes': {}}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_mesh(self, key, mesh_quality):
+        entry = self.entries.get(key)
+        return entry['meshes'].get(mesh_quality) if entry else None
+
+    def set_mesh(self, key, mesh_quality, mesh):
+        if key in self.entries:
+            self.entries[key]['meshes'][mesh_quality] = mesh
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0,
+            'entries': len(self.entries)
+        }
+
+
+class CompiledProgram():
+    def __init__(self, program_hash, code_object, part_dependencies):
+        self.program_hash = program_hash
+        self.code_object = code_object
+        self.part_dependencies = part_dependencies or {}
+
+
+def route_part_calls(tree, part_dependencies):
+    # x = create_x(...) -> x = __build_part__('x', lambda: create_x(...))
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], ast.Name) and statement.targets[0].id in part_dependencies:
+            create_part = ast.Lambda(args=ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[],
+                                                        defaults=[]),
+                                     body=statement.value)
+            statement.value = ast.Call(func=ast.Name(BUILD_PART_FUNCTION, ast.Load()),
+                                       args=[ast.Constant(statement.targets[0].id), create_part], keywords=[])
+    return ast.fix_missing_locations(tree)
+
+
+def trace_create_functions(tree):
+    # def create_x(...) -> @__trace_function__ def create_x(...), a tracing span for every call of a part function
+    for statement in tree.body:
+        if isinstance(statement, ast.FunctionDef) and statement.name.startswith("create_"):
+            statement.decorator_list.insert(0, ast.Name(TRACE_FUNCTION, ast.Load()))
+    return ast.fix_missing_locations(tree)
+
+
+compiled_programs = OrderedDict()
+
+
+def compile_program(code, file_name="<program>"):
+    """
+    Compile the program with its part calls going through the part cache, when its parts can be cached,
+    and its part functions decorated with __trace_function__. The namespace of the run provides both.
+    The analysis and the compilation run once per program source.
+    """
+    program_hash = hashlib.sha256(code.encode()).hexdigest()
+    program = compiled_programs.get(program_hash)
+    if program is None:
+        part_dependencies = get_part_dependencies(code)
+        tree = trace_create_functions(ast.parse(code, file_name))
+        if part_dependencies:
+            tree = route_part_calls(tree, part_dependencies)
+        code_object = compile(tree, file_name, 'exec')
+        program = CompiledProgram(program_hash, code_object, part_dependencies)
+        compiled_programs[program_hash] = program
+        if len(compiled_programs) > PART_CACHE_MAX_ENTRIES:
+            compiled_programs.popitem(last=False)
+    return program
+
+
+class PartBuilder():
+    """
+    The function the rewritten part calls go through during one run of a program.
+    It keeps the cache key of every part it built or reused, to find their meshes after the run.
+    """
+    def __init__(self, cache, program, namespace):
+        self.cache = cache
+        self.program = program
+        self.namespace = namespace
+        self.keys = {}  # part name -> cache key
+        self.reused_parts = []
+        self.built_parts = []
+
+    def __call__(self, part_name, create_part):
+        try:
+            slider_values = tuple(self.namespace.get(name) for name in self.program.part_dependencies[part_name])
+            key = (self.program.program_hash, part_name, slider_values)
+            hash(key)
+        except TypeError:
+            self.built_parts.append(part_name)
+            return create_part()
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.keys[part_name] = key
+            self.reused_parts.append(part_name)
+            return entry['brep']
+        brep = create_part()
+        self.built_parts.append(part_name)
+        # The create functions return None when they failed, failures are not cached
+        if brep is not None:
+            self.cache.put(key, brep)
+            self.keys[part_name] = key
+        return brep
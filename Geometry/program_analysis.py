@@ -0,0 +1,151 @@
+import ast
+
+
+def find_top_level_assignment(tree, name):
+    # The last top level assignment wins, like when the program runs
+    assignment = None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == name
+                                                for target in node.targets):
+            assignment = node
+    return assignment
+
+
+def get_part_names(code):
+    """
+    Return the names of the parts the program places in the array 'a',
+    e.g. ['plate_base', 'plate_body'] for a = [plate_base, plate_body].
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    assignment = find_top_level_assignment(tree, 'a')
+    if assignment is None or not isinstance(assignment.value, (ast.List, ast.Tuple)):
+        return []
+    return [ast.unparse(element) for element in assignment.value.elts]
+
+
+def get_slider_names(tree):
+    # The keys of the sliders dict b = {"name": [min, max, value], ...}
+    assignment = find_top_level_assignment(tree, 'b')
+    if assignment is None or not isinstance(assignment.value, ast.Dict):
+        return set()
+    return {key.value for key in assignment.value.keys if isinstance(key, ast.Constant)}
+
+
+def get_loaded_names(node):
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load)}
+
+
+def get_stored_names(node):
+    # Names a statement assigns, and names it may change in place (x.attribute = ..., x[i] = ...)
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+            names.add(child.id)
+        elif isinstance(child, (ast.Attribute, ast.Subscript)) and isinstance(child.ctx, ast.Store):
+            names |= get_loaded_names(child.value)
+    return names
+
+
+def get_function_globals(function):
+    # Names a function reads that are not its arguments or its own variables
+    arguments = {argument.arg for argument in ast.walk(function.args) if isinstance(argument, ast.arg)}
+    local_names = set()
+    for statement in function.body:
+        local_names |= get_stored_names(statement)
+    return get_loaded_names(function) - arguments - local_names - {function.name}
+
+
+class DependencyTracker():
+    """Follow the top level statements of a program and the sliders every variable is computed from."""
+    def __init__(self, slider_names):
+        self.slider_names = slider_names
+        self.dependencies = {}  # variable -> set of slider names
+        self.functions = {}  # function name -> global names it reads
+
+    def name_dependencies(self, name, visited):
+        if name in self.functions:
+            # A function depends on the globals it reads when it is called
+            if name in visited:
+                return set()
+            visited.add(name)
+            return set().union(*(self.name_dependencies(global_name, visited)
+                                 for global_name in self.functions[name]))
+        return self.dependencies.get(name, set())
+
+    def expression_dependencies(self, node):
+        visited = set()
+        return set().union(*(self.name_dependencies(name, visited) for name in get_loaded_names(node)))
+
+    def add_statement(self, statement):
+        # Return False for statements the analysis does not follow
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            return True
+        if isinstance(statement, ast.FunctionDef):
+            self.functions[statement.name] = get_function_globals(statement)
+            return True
+        if isinstance(statement, ast.Try):
+            # The sliders block: try reading the sliders, except set the defaults
+            return all(self.add_statement(child) for child in
+                       statement.body + statement.orelse + statement.finalbody +
+                       [child for handler in statement.handlers for child in handler.body])
+        if isinstance(statement, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Expr)):
+            dependencies = self.expression_dependencies(statement)
+            replaced = set()
+            if isinstance(statement, (ast.Assign, ast.AnnAssign)):
+                targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+                replaced = {target.id for target in targets if isinstance(target, ast.Name)}
+            changed = get_stored_names(statement)
+            if isinstance(statement, ast.Expr):
+                # A call like x.Transform(y) may change every variable it is given
+                changed = get_loaded_names(statement) - set(self.functions)
+            for name in changed:
+                if name in self.slider_names:
+                    self.dependencies[name] = {name}
+                elif name in replaced:
+                    self.dependencies[name] = set(dependencies)
+                else:
+                    self.dependencies[name] = self.dependencies.get(name, set()) | dependencies
+            return True
+        return False
+
+
+def get_part_dependencies(code):
+    """
+    Return the sliders every part of the program depends on, e.g. for toothpick_dispenser_1.py
+    {'toothpick_dispenser_lid': ['body_height', 'body_radius', 'holes_amount', ...], ...}.
+
+    Only parts assigned once by a call to a function of the program, x = create_x(...),
+    and not used by other statements besides the array 'a' are returned.
+    Return None when the program has no sliders or has top level statements the analysis does not follow.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    slider_names = get_slider_names(tree)
+    parts_assignment = find_top_level_assignment(tree, 'a')
+    if not slider_names or parts_assignment is None:
+        return None
+
+    part_names = {ast.unparse(element) for element in getattr(parts_assignment.value, 'elts', [])}
+    tracker = DependencyTracker(slider_names)
+    part_calls = {}
+    uses = {}
+    for statement in tree.body:
+        if not tracker.add_statement(statement):
+            return None
+        if statement is parts_assignment or isinstance(statement, ast.FunctionDef):
+            continue
+        for name in get_stored_names(statement) | get_loaded_names(statement):
+            uses[name] = uses.get(name, 0) + 1
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], ast.Name) and isinstance(statement.value, ast.Call) \
+                and isinstance(statement.value.func, ast.Name) and statement.value.func.id in tracker.functions:
+            part_calls[statement.targets[0].id] = tracker.expression_dependencies(statement.value)
+
+    # A part used anywhere else may be changed after it is built, it is always rebuilt
+    return {name: sorted(dependencies) for name, dependencies in part_calls.items()
+            if uses[name] == 1 and name in part_names}
@@ -0,0 +1,235 @@
+"""
+Route a user prompt to a stored program of Full_Programs.
+
+Every program is indexed by the words of its file name and of its descriptions in
+Finetuning/Objects_map.py. A prompt is scored by the share of its words a program covers, weighted by
+how rare every word is, and by BM25 between programs covering the same words. Words no program has weigh
+little, and a program matches only when the prompt names it, "a round table" is not a round flower pot.
+Misspelled words are matched to known words through a trigram index.
+A lookup only reads the postings of the prompt words, the ROUTER_MAX_POSTINGS best of each,
+so it does not grow with the number of stored programs.
+Programs the program validator rejects are not indexed, a prompt never routes to a program that cannot run.
+"""
+import math
+import os
+import re
+import sys
+import threading
+from difflib import SequenceMatcher
+from Consts.geometry_consts import *
+from Consts.router_consts import *
+from Finetuning.Objects_map import *
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+class RouteMatch():
+    def __init__(self, file_name, score, confidence, matched_words):
+        self.file_name = file_name
+        self.score = score
+        self.confidence = confidence
+        self.matched_words = matched_words
+
+    def __repr__(self):
+        return f"RouteMatch({self.file_name}, score={self.score:.3f}, confidence={self.confidence:.2f})"
+
+
+def normalize_word(word):
+    # Naive singular form, enough for object names: plates -> plate, glasses -> glass
+    if len(word) > 4 and word.endswith("sses"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [normalize_word(word) for word in WORD_PATTERN.findall(text.lower()) if word not in ROUTER_STOP_WORDS]
+
+
+def get_trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProgramRouter():
+    def __init__(self, max_postings=ROUTER_MAX_POSTINGS):
+        self.max_postings = max_postings
+        self.postings = {}  # word -> {file_name: term frequency}
+        self.document_frequency = {}  # word -> number of programs with the word
+        self.document_lengths = {}  # file_name -> number of words
+        self.name_words = {}  # file_name -> words of the name of the object, a match needs one of them
+        self.trigrams = {}  # trigram -> set of words
+        # The capped lists of the lookups, built after the last add_program
+        self.top_postings = None  # word -> [(file_name, term frequency)], the best BM25 matches first
+        self.top_trigrams = None  # trigram -> [word], the most frequent words first
+
+    def add_program(self, file_name, texts, name=None):
+        # name: the object of the program, e.g. "baking mold", the first text when it is not given
+        self.top_postings = self.top_trigrams = None
+        self.name_words[file_name] = set(tokenize(name if name is not None else texts[0]))
+        words = [word for text in texts for word in tokenize(text)]
+        self.document_lengths[file_name] = len(words)
+        for word in words:
+            programs = self.postings.setdefault(word, {})
+            if file_name not in programs:
+                self.document_frequency[word] = self.document_frequency.get(word, 0) + 1
+                for trigram in get_trigrams(word):
+                    self.trigrams.setdefault(trigram, set()).add(word)
+            programs[file_name] = programs.get(file_name, 0) + 1
+
+    def term_score(self, frequency, file_name, average_length):
+        # The BM25 score of a word in a program without the idf of the word
+        length_norm = 1 - ROUTER_BM25_B + ROUTER_BM25_B * self.document_lengths[file_name] / average_length
+        return frequency * (ROUTER_BM25_K1 + 1) / (frequency + ROUTER_BM25_K1 * length_norm)
+
+    def get_top_lists(self):
+        # Postings sorted by weight and capped at max_postings, a lookup reads the best matches, the same every time
+        if self.top_postings is None:
+            average_length = sum(self.document_lengths.values()) / max(1, len(self.document_lengths))
+            # top_postings last, another thread reads both once it is set
+            self.top_trigrams = {trigram: sorted(words, key=lambda word: (-self.document_frequency[word], word))
+                                 [:self.max_postings] for trigram, words in self.trigrams.items()}
+            self.top_postings = {word: sorted(programs.items(), key=lambda posting: (
+                -self.term_score(posting[1], posting[0], average_length), posting[0]))[:self.max_postings]
+                                 for word, programs in self.postings.items()}
+        return self.top_postings, self.top_trigrams
+
+    def idf(self, word):
+        programs_count = len(self.document_lengths)
+        frequency = self.document_frequency.get(word, 0)
+        return math.log(1 + (programs_count - frequency + 0.5) / (frequency + 0.5))
+
+    def find_similar_word(self, word):
+        # Known word sharing the most trigrams with a misspelled one, e.g. "bottel" -> "bottle"
+        word_trigrams = get_trigrams(word)
+        shared = {}
+        _, top_trigrams = self.get_top_lists()
+        for trigram in word_trigrams:
+            for candidate in top_trigrams.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # Trigrams find the candidates, the edit similarity picks between them (bottel: bottle over bottom)
+        best_word, best_similarity = None, 0
+        for candidate, count in sorted(shared.items()):
+            if count / (len(word_trigrams) + len(get_trigrams(candidate)) - count) < ROUTER_FUZZY_MIN_SIMILARITY:
+                continue
+            similarity = SequenceMatcher(None, word, candidate).ratio()
+            if similarity > best_similarity:
+                best_word, best_similarity = candidate, similarity
+        return best_word, best_similarity
+
+    def resolve_words(self, prompt):
+        # (indexed word, weight of the match) for every prompt word, weight 0 for unknown words
+        resolved = []
+        for word in tokenize(prompt):
+            if word in self.postings:
+                resolved.append((word, word, 1.0))
+            elif word in ROUTER_SYNONYMS:
+                # the synonyms without a program do not count, "cup" routes to a glass while no mug is indexed
+                synonyms = [synonym for synonym in ROUTER_SYNONYMS[word] if synonym in self.postings]
+                resolved += [(word, synonym, 1.0) for synonym in synonyms] or [(word, None, 0)]
+            else:
+                similar_word, similarity = self.find_similar_word(word)
+                resolved.append((word, similar_word, similarity))
+        return resolved
+
+    def rank(self, prompt, limit=5):
+        resolved = self.resolve_words(prompt)
+        if not self.document_lengths or not resolved:
+            return []
+        average_length = sum(self.document_lengths.values()) / len(self.document_lengths)
+        # An unknown word weighs a share of the rarest known word, "a large deep bowl" is still a bowl
+        unknown_idf = ROUTER_UNKNOWN_WORD_WEIGHT * self.idf(None)
+        top_postings, _ = self.get_top_lists()
+
+        scores = {}
+        matched_words = {}
+        for _, indexed_word, weight in resolved:
+            if not weight:
+                continue
+            idf = self.idf(indexed_word)
+            for file_name, frequency in top_postings[indexed_word]:
+                score = idf * self.term_score(frequency, file_name, average_length)
+                scores[file_name] = scores.get(file_name, 0) + weight * score
+                matched_words.setdefault(file_name, {})[indexed_word] = weight * idf
+
+        prompt_weight = {}
+        for prompt_word, indexed_word, weight in resolved:
+            word_idf = self.idf(indexed_word) if weight else unknown_idf
+            prompt_weight[prompt_word] = max(prompt_weight.get(prompt_word, 0), word_idf)
+        total_weight = sum(prompt_weight.values())
+
+        # A program matches only prompts naming its object, a description word alone is not enough
+        matches = [RouteMatch(file_name, score, min(1, sum(matched_words[file_name].values()) / total_weight),
+                              sorted(matched_words[file_name]))
+                   for file_name, score in scores.items() if self.name_words[file_name] & matched_words[file_name].keys()]
+        # The program covering most of the prompt first, BM25 decides between programs covering the same words
+        matches.sort(key=lambda match: (-round(match.confidence, 6), -match.score, match.file_name))
+        return matches[:limit]
+
+    def route(self, prompt, threshold=ROUTER_CONFIDENCE_THRESHOLD):
+        """Return the best RouteMatch for the prompt, or None when no program matches confidently."""
+        ranked = self.rank(prompt, limit=1)
+        if not ranked or ranked[0].confidence < threshold:
+            return None
+        return ranked[0]
+
+
+def build_program_router(programs_dir=FULL_PROGRAMS_DIR):
+    descriptions = {}
+    for objects in (OBJECTS_TO_TRAIN_DISSASSEMBLER, OBJECTS_TO_TRAIN_CODE_WRITER, OBJECTS_TO_TRAIN_FULL_PROGRAM):
+        for object_ in objects:
+            descriptions.setdefault(f"{object_.file_name}.py", set()).add(object_.description)
+
+    # Imported here, the validator imports the program selector, which imports this module
+    from Geometry.program_validator import find_program_problems
+    router = ProgramRouter()
+    for file_name in sorted(os.listdir(programs_dir)):
+        if not file_name.endswith(".py"):
+            continue
+        # Programs that cannot run are not routed to, the BOM of the examples written on Windows is not a problem
+        with open(os.path.join(programs_dir, file_name), 'r', encoding='utf-8-sig') as f:
+            problems = find_program_problems(f.read(), file_name)
+        if problems:
+            print(f"Program router skips {file_name}: {problems[0]['message']}")
+            continue
+        # bowl_2.py -> "bowl"
+        name = re.sub(r"_\d+$", "", os.path.splitext(file_name)[0]).replace("_", " ")
+        router.add_program(file_name, [name, *sorted(descriptions.get(file_name, ()))], name)
+    for word, synonyms in sorted(ROUTER_SYNONYMS.items()):
+        if not any(synonym in router.postings for synonym in synonyms):
+            print(f"Program router has no program for the synonyms of '{word}': {synonyms}")
+    return router
+
+
+program_router = None
+program_router_lock = threading.Lock()
+
+
+def get_program_router():
+    # Built once per process, on the first prompt or at startup
+    global program_router
+    with program_router_lock:
+        if program_router is None:
+            program_router = build_program_router()
+            print(f"Program router indexed {len(program_router.document_lengths)} programs")
+    return program_router
+
+
+def check_program_router(router, checks=ROUTER_CHECKS):
+    """Return the ROUTER_CHECKS prompts routed to another program than the expected one."""
+    failures = []
+    for prompt, expected in checks.items():
+        match = router.route(prompt)
+        file_name = match.file_name if match else None
+        if file_name != expected:
+            failures.append((prompt, expected, router.rank(prompt, limit=1)))
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_program_router(get_program_router())
+    for prompt, expected, ranked in failures:
+        print(f"'{prompt}' should route to {expected}, ranked: {ranked}")
+    print(f"{len(ROUTER_CHECKS) - len(failures)}/{len(ROUTER_CHECKS)} router checks passed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,41 @@
+import os
+from Consts.geometry_consts import *
+from Consts.router_consts import *
+from Geometry.program_router import get_program_router
+
+
+def get_program_path(file_name):
+    # A plain file name is a stored program, a path is a program generated by the agents
+    if os.path.dirname(file_name):
+        return file_name
+    return os.path.join(FULL_PROGRAMS_DIR, file_name)
+
+
+def select_program_file(prompt):
+    match = get_program_router().route(prompt)
+    if match is None:
+        print(f"No stored program matches prompt '{prompt}'")
+        return None
+    print(f"Prompt '{prompt}' routed to {match}")
+    return match.file_name
+
+
+def select_or_generate_program_file(prompt, progress=None):
+    # Prompts without a stored program are generated by the agents, when ROUTER_AGENT_FALLBACK is on
+    file_name = select_program_file(prompt)
+    if file_name is None and ROUTER_AGENT_FALLBACK:
+        # imported here, the agents need the openai package and an api key
+        from run_agents import run_all_agents, full_programs_dir, no_progress
+        files_name = run_all_agents(prompt, progress or no_progress)
+        file_name = os.path.join(full_programs_dir, f"{files_name}.py")
+    return file_name
+
+
+def save_selected_program_file(file_name):
+    with open(PROGRAM_FILE_NAME_FILE, "w") as f:
+        f.write(file_name)
+
+
+def load_selected_program_file():
+    with open(PROGRAM_FILE_NAME_FILE, "r") as f:
+        return f.read()
@@ -0,0 +1,182 @@
+"""
+Static checks of a program before it is sent to a geometry worker.
+
+A program that cannot run is rejected in milliseconds instead of failing in a worker after the Rhino
+startup: it must parse, produce the parts array 'a' and the sliders dict 'b', every slider of a literal
+b must be [min, max, value] with numbers for min and max, and every name it reads must be defined by the
+program, its imports or the builtins (the undefined names check of pyflakes, by the symbol tables of
+the compiler).
+
+The problems of a program are kept by the hash of its source, a program is analysed once per process.
+"""
+import ast
+import builtins
+import hashlib
+import os
+import symtable
+import threading
+from collections import OrderedDict
+from Consts.geometry_consts import *
+from Geometry.program_analysis import find_top_level_assignment
+from Geometry.parameter_patch import get_number
+from Geometry.program_selector import get_program_path
+from Utils.file_utils import get_file_content
+
+BUILTIN_NAMES = set(dir(builtins))
+
+
+class ProgramValidationError(Exception):
+    def __init__(self, file_name, problems):
+        self.file_name = file_name
+        self.problems = problems
+        details = "; ".join(f"line {problem['line']}: {problem['message']}" if problem['line']
+                            else problem['message'] for problem in problems)
+        super().__init__(f"Program {file_name} is not valid: {details}")
+
+    def to_dict(self):
+        return {'file_name': self.file_name, 'problems': self.problems}
+
+
+def make_problem(check, message, line=None):
+    return {'check': check, 'message': message, 'line': line}
+
+
+def find_first_load(tree, name):
+    # The line where a name is first read, for the message of an undefined name
+    lines = [node.lineno for node in ast.walk(tree)
+             if isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load)]
+    return min(lines) if lines else None
+
+
+def get_global_bindings(table):
+    # Names the functions of the program bind with a global statement
+    names = set()
+    for child in table.get_children():
+        names |= {symbol.get_name() for symbol in child.get_symbols()
+                  if symbol.is_declared_global() and symbol.is_assigned()}
+        names |= get_global_bindings(child)
+    return names
+
+
+def get_bound_names(table):
+    # Names the module binds anywhere at the top level, in a try block or a loop too
+    names = {symbol.get_name() for symbol in table.get_symbols()
+             if symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()}
+    return names | get_global_bindings(table)
+
+
+def find_undefined_names(table, defined, undefined):
+    # Module names read but never bound, and globals read by the functions that the module does not bind
+    for symbol in table.get_symbols():
+        name = symbol.get_name()
+        if not symbol.is_referenced() or name in defined:
+            continue
+        if table.get_type() == 'module':
+            if not (symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()):
+                undefined.add(name)
+        elif symbol.is_global():
+            undefined.add(name)
+    for child in table.get_children():
+        find_undefined_names(child, defined, undefined)
+    return undefined
+
+
+def check_sliders(tree):
+    # The sliders of a literal dict b = {"name": [min, max, value], ...}
+    problems = []
+    assignment = find_top_level_assignment(tree, 'b')
+    if assignment is None or not isinstance(assignment.value, ast.Dict):
+        return problems
+    for key, value in zip(assignment.value.keys, assignment.value.values):
+        if not isinstance(key, ast.Constant) or not isinstance(key.value, str):
+            problems.append(make_problem("sliders", "a key of b is not a slider name", value.lineno))
+            continue
+        if not isinstance(value, (ast.List, ast.Tuple)) or len(value.elts) != 3:
+            problems.append(make_problem("sliders", f"slider {key.value} of b is not [min, max, value]", value.lineno))
+            continue
+        minimum, maximum = get_number(value.elts[0]), get_number(value.elts[1])
+        if minimum is None or maximum is None:
+            problems.append(make_problem("sliders", f"min and max of slider {key.value} are not numbers",
+                                         value.lineno))
+        elif minimum > maximum:
+            problems.append(make_problem("sliders", f"min {minimum} of slider {key.value} is above max {maximum}",
+                                         value.lineno))
+    return problems
+
+
+def find_program_problems(code, file_name="<program>"):
+    """
+    Return the problems of the program, [] for a program that can run,
+    e.g. [{'check': 'undefined_name', 'message': "name 'body_heigth' is not defined", 'line': 12}].
+    """
+    try:
+        tree = ast.parse(code, file_name)
+        table = symtable.symtable(code, file_name, 'exec')
+    except SyntaxError as error:
+        return [make_problem("syntax", f"{error.msg}", error.lineno)]
+    except ValueError as error:
+        # Source with null bytes
+        return [make_problem("syntax", str(error))]
+
+    problems = []
+    bound_names = get_bound_names(table)
+    for name, description in (('a', "the parts array"), ('b', "the sliders dict")):
+        if name not in bound_names:
+            problems.append(make_problem("missing_global", f"the program does not set {name}, {description}"))
+    problems += check_sliders(tree)
+
+    # A star import may define any name
+    has_star_import = any(isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names)
+                          for node in ast.walk(tree))
+    if not has_star_import:
+        for name in sorted(find_undefined_names(table, bound_names | BUILTIN_NAMES, set())):
+            problems.append(make_problem("undefined_name", f"name '{name}' is not defined",
+                                         find_first_load(tree, name)))
+    return problems
+
+
+class ValidationCache():
+    """LRU cache of the problems of the programs validated in this process, keyed by the hash of their source."""
+    def __init__(self, max_entries=PROGRAM_VALIDATION_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # get_problems runs in the Flask request threads
+        self.lock = threading.Lock()
+
+    def get_problems(self, code, file_name="<program>"):
+        key = hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+        with self.lock:
+            problems = self.entries.get(key)
+            if problems is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return problems
+            self.misses += 1
+        # analysed outside the lock, two threads may analyse the same new program
+        problems = find_program_problems(code, file_name)
+        with self.lock:
+            self.entries[key] = problems
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return problems
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+
+validation_cache = ValidationCache()
+
+
+def validate_program(code, file_name="<program>"):
+    """Raise ProgramValidationError with the problems of a program that cannot run."""
+    problems = validation_cache.get_problems(code, file_name)
+    if problems:
+        raise ProgramValidationError(file_name, problems)
+
+
+def validate_program_file(file_name):
+    """validate_program of a program of Full_Programs, read like the geometry runtimes read it."""
+    validate_program(get_file_content(*os.path.split(get_program_path(file_name))) or "", file_name)
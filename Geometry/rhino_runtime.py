@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+from io import StringIO
+from Consts.geometry_consts import *
+from Geometry.program_selector import get_program_path
+from Utils.file_utils import get_file_content
+from Geometry.mesh_utils import mesh_to_arrays, merge_part_meshes
+from Geometry.glb_export import export_glb
+from Geometry.program_analysis import get_part_names
+from Geometry.mesh_quality import get_meshing_settings
+from Geometry.part_cache import PartCache, PartBuilder, compile_program, BUILD_PART_FUNCTION, TRACE_FUNCTION
+from Utils.tracing import span, trace_function
+
+rg = None
+trimesh = None
+# Parts built in this worker, reused while their sliders do not change
+part_cache = PartCache() if PART_CACHE_ENABLED else None
+
+
+def load():
+    """
+    Load Rhino and the meshing libraries once for the whole process.
+    The generated programs call rhinoinside.load() themselves, so after the first load
+    it is replaced by a no-op to keep the warm runtime.
+    """
+    global rg, trimesh
+    if rg is not None:
+        return
+    import rhinoinside
+    rhinoinside.load()
+    rhinoinside.load = lambda *args, **kwargs: None
+    # System and Rhino can only be loaded after rhinoinside is initialized
+    import Rhino.Geometry as rhino_geometry  # noqa
+    import trimesh as trimesh_module
+    rg = rhino_geometry
+    trimesh = trimesh_module
+
+
+def _exec_program(code_object, namespace):
+    old_stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        exec(code_object, namespace)
+    finally:
+        sys.stdout = old_stdout
+    geometry = namespace['a']  # array of breps
+    params = namespace['b']
+    return geometry, params
+
+
+def _make_namespace(sliders_value):
+    # The program reads the sliders by locals()['sliders_value'], without it the defaults are used
+    namespace = {"__name__": "__main__", TRACE_FUNCTION: trace_function}
+    if isinstance(sliders_value, dict):
+        namespace["sliders_value"] = sliders_value
+    return namespace
+
+
+def run_program(code, sliders_value=None):
+    return _exec_program(code, _make_namespace(sliders_value))
+
+
+def run_program_incremental(code, sliders_value=None, file_name="<program>"):
+    """
+    Run the program with its part calls going through the part cache of the worker.
+    Return the geometry, the params and the PartBuilder that knows which parts were reused,
+    the builder is None when the parts of the program cannot be cached.
+    """
+    program = compile_program(code, file_name)
+    namespace = _make_namespace(sliders_value)
+    part_builder = None
+    if part_cache is not None and program.part_dependencies:
+        part_builder = PartBuilder(part_cache, program, namespace)
+        namespace[BUILD_PART_FUNCTION] = part_builder
+    geometry, params = _exec_program(program.code_object, namespace)
+    return geometry, params, part_builder
+
+
+def make_meshing_parameters(mesh_quality=MESH_QUALITY_DEFAULT):
+    # A copy of the preset of the level with the properties of the level set on it
+    settings = get_meshing_settings(mesh_quality)
+    meshing_parameters = getattr(rg.MeshingParameters, settings['preset'])
+    for name, value in settings.items():
+        if name not in ('preset', 'level'):
+            setattr(meshing_parameters, name, value)
+    return meshing_parameters
+
+
+def brep_to_mesh(brep, meshing_parameters=None):
+    part_mesh = rg.Mesh()
+    brep_meshes = rg.Mesh.CreateFromBrep(brep, meshing_parameters) if meshing_parameters else rg.Mesh.CreateFromBrep(brep)
+    for brep_mesh in brep_meshes:
+        part_mesh.Append(brep_mesh)
+    return mesh_to_arrays(part_mesh)
+
+
+def breps_to_part_meshes(geometry, part_names=None, part_builder=None, mesh_quality=MESH_QUALITY_DEFAULT):
+    # Convert each Brep in the geometry list to a mesh of vertices and triangle faces,
+    # parts the builder took from the part cache keep their cached mesh of the level
+    meshing_parameters = make_meshing_parameters(mesh_quality)
+    part_meshes = []
+    for i, brep in enumerate(geometry):
+        key = part_builder.keys.get(part_names[i]) if part_builder and part_names else None
+        with span("mesh part", part_name=part_names[i] if part_names else i) as current:
+            part_mesh = part_cache.get_mesh(key, mesh_quality) if key else None
+            current.set(cached=part_mesh is not None)
+            if part_mesh is None:
+                part_mesh = brep_to_mesh(brep, meshing_parameters)
+                if key:
+                    part_cache.set_mesh(key, mesh_quality, part_mesh)
+            current.set(triangles=len(part_mesh[1]))
+        part_meshes.append(part_mesh)
+    return part_meshes
+
+
+def export_model(part_names, part_meshes, output_file):
+    # The format is chosen by the extension: .glb keeps a named mesh per part, .obj combines the parts
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    # Remove the file if it already exists
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    if output_file.endswith(".glb"):
+        export_glb(part_names, part_meshes, output_file, GLB_QUANTIZE_POSITIONS, GLB_COMPRESS_INDICES)
+    else:
+        vertices, faces = merge_part_meshes(part_meshes)
+        trimesh.Trimesh(vertices=vertices, faces=faces).export(output_file)
+
+
+def get_model_part_names(code, geometry):
+    part_names = get_part_names(code)
+    if len(part_names) != len(geometry):
+        part_names = [f"part_{i+1}" for i in range(len(geometry))]
+    return part_names
+
+
+def build_model(file_name, sliders_value=None, output_file=OUTPUT_MESH_FILE, progress=None,
+                mesh_quality=MESH_QUALITY_DEFAULT):
+    progress = progress or (lambda stage: None)
+    load()
+    program_path = get_program_path(file_name)
+    code = get_file_content(*os.path.split(program_path))
+    with span("build model", file_name=file_name, mesh_quality=mesh_quality) as current:
+        progress("running program")
+        with span("run program") as program_span:
+            geometry, params, part_builder = run_program_incremental(code, sliders_value, program_path)
+            program_span.set(parts=len(geometry))
+        part_names = get_model_part_names(code, geometry)
+        progress("meshing")
+        start_time = time.perf_counter()
+        with span("meshing", mesh_quality=mesh_quality) as meshing_span:
+            part_meshes = breps_to_part_meshes(geometry, part_names, part_builder, mesh_quality)
+            triangles = sum(len(faces) for _, faces in part_meshes)
+            meshing_span.set(triangles=triangles)
+        meshing_seconds = time.perf_counter() - start_time
+        progress("exporting")
+        with span("export", format=os.path.splitext(output_file)[1]) as export_span:
+            export_model(part_names, part_meshes, output_file)
+            export_span.set(bytes=os.path.getsize(output_file))
+        result = {
+            'params': params,
+            'num_of_params': len(params),
+            'mesh_path': output_file,
+            'mesh_quality': mesh_quality,
+            'triangles': triangles,
+            'meshing_seconds': meshing_seconds,
+            'reused_parts': part_builder.reused_parts if part_builder else [],
+            'built_parts': part_builder.built_parts if part_builder else part_names
+        }
+        current.set(triangles=triangles, reused_parts=len(result['reused_parts']),
+                    built_parts=len(result['built_parts']))
+    return result
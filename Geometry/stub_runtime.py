@@ -0,0 +1,86 @@
+"""
+Geometry runtime without Rhino, used to run and test the server and the worker pool
+on machines where rhinoinside is not available.
+It reads the sliders dict 'b' from the program source and exports a unit cube.
+"""
+import ast
+import os
+import numpy as np
+from Consts.geometry_consts import *
+from Geometry.program_selector import get_program_path
+from Utils.file_utils import get_file_content
+from Geometry.glb_export import export_glb
+from Utils.tracing import span
+
+CUBE_OBJ = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+f 1 3 2
+f 1 4 3
+f 5 6 7
+f 5 7 8
+f 1 2 6
+f 1 6 5
+f 2 3 7
+f 2 7 6
+f 3 4 8
+f 3 8 7
+f 4 1 5
+f 4 5 8
+"""
+
+
+def read_cube_mesh():
+    lines = [line.split() for line in CUBE_OBJ.splitlines()]
+    vertices = np.array([line[1:] for line in lines if line[0] == 'v'], dtype=np.float64)
+    faces = np.array([line[1:] for line in lines if line[0] == 'f'], dtype=np.int32) - 1
+    return vertices, faces
+
+
+def load():
+    pass
+
+
+def read_program_params(code, sliders_value=None):
+    sliders_value = sliders_value if isinstance(sliders_value, dict) else {}
+    params = {}
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'b' for target in node.targets) \
+                and isinstance(node.value, ast.Dict):
+            for key, value in zip(node.value.keys, node.value.values):
+                param_min = ast.literal_eval(value.elts[0])
+                param_max = ast.literal_eval(value.elts[1])
+                params[key.value] = [param_min, param_max, int(sliders_value.get(key.value, param_min))]
+    return params
+
+
+def build_model(file_name, sliders_value=None, output_file=OUTPUT_MESH_FILE, progress=None,
+                mesh_quality=MESH_QUALITY_DEFAULT):
+    progress = progress or (lambda stage: None)
+    code = get_file_content(*os.path.split(get_program_path(file_name)))
+    with span("build model", file_name=file_name, mesh_quality=mesh_quality):
+        progress("running program")
+        with span("run program"):
+            params = read_program_params(code, sliders_value)
+        progress("exporting")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with span("export", format=os.path.splitext(output_file)[1]) as current:
+            if output_file.endswith(".glb"):
+                export_glb(['cube'], [read_cube_mesh()], output_file, GLB_QUANTIZE_POSITIONS, GLB_COMPRESS_INDICES)
+            else:
+                with open(output_file, 'w') as f:
+                    f.write(CUBE_OBJ)
+            current.set(bytes=os.path.getsize(output_file))
+    return {
+        'params': params,
+        'num_of_params': len(params),
+        'mesh_path': output_file,
+        'mesh_quality': mesh_quality,
+        'triangles': len(read_cube_mesh()[1]),
+        'meshing_seconds': 0
+    }
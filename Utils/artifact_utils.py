@@ -0,0 +1,85 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from Consts.geometry_consts import *
+
+ARTIFACT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+last_collection_time = 0
+collection_lock = threading.Lock()
+
+
+def new_artifact_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_artifact_id(artifact_id):
+    # The id becomes part of a path, so only ids made by new_artifact_id() are accepted
+    return isinstance(artifact_id, str) and ARTIFACT_ID_PATTERN.fullmatch(artifact_id) is not None
+
+
+def get_artifact_dir(artifact_id):
+    if not is_valid_artifact_id(artifact_id):
+        raise ValueError(f"Invalid artifact id: {artifact_id}")
+    return os.path.join(ARTIFACTS_DIR, artifact_id)
+
+
+def get_artifact_file(artifact_id, file_name=ARTIFACT_MODEL_FILE_NAME):
+    return os.path.join(get_artifact_dir(artifact_id), file_name)
+
+
+def get_dir_size(dir_path):
+    size = 0
+    for root, _, files in os.walk(dir_path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def collect_artifacts(max_age_seconds=ARTIFACT_MAX_AGE_SECONDS, max_size_bytes=ARTIFACTS_MAX_SIZE_BYTES):
+    """
+    Delete artifacts older than max_age_seconds, then the oldest ones until all the artifacts
+    together take at most max_size_bytes.
+
+    Return:
+        int: number of deleted artifacts
+    """
+    if not os.path.isdir(ARTIFACTS_DIR):
+        return 0
+    now = time.time()
+    artifacts = []
+    for artifact_id in os.listdir(ARTIFACTS_DIR):
+        artifact_dir = os.path.join(ARTIFACTS_DIR, artifact_id)
+        try:
+            artifacts.append((os.path.getmtime(artifact_dir), get_dir_size(artifact_dir), artifact_dir))
+        except FileNotFoundError:
+            continue
+
+    deleted = 0
+    total_size = sum(size for _, size, _ in artifacts)
+    for modified_time, size, artifact_dir in sorted(artifacts):
+        if now - modified_time <= max_age_seconds and total_size <= max_size_bytes:
+            break
+        shutil.rmtree(artifact_dir, ignore_errors=True)
+        total_size -= size
+        deleted += 1
+    return deleted
+
+
+def collect_artifacts_if_due(interval_seconds=ARTIFACTS_GC_INTERVAL_SECONDS):
+    # Called after every build, collects at most once per interval
+    global last_collection_time
+    with collection_lock:
+        if time.time() - last_collection_time < interval_seconds:
+            return 0
+        last_collection_time = time.time()
+    deleted = collect_artifacts()
+    if deleted:
+        print(f"Deleted {deleted} old artifacts from {ARTIFACTS_DIR}")
+    return deleted
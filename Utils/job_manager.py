@@ -0,0 +1,150 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from Consts.jobs_consts import *
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFullError(Exception):
+    def __init__(self, queue_depth):
+        super().__init__(f"Too many jobs, {queue_depth} jobs are waiting")
+        self.queue_depth = queue_depth
+
+
+class Job():
+    """
+    A model generation running in the background.
+    The job function reports its stages with progress(), which also stops the job
+    when it was cancelled, and listeners read them with events().
+    """
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.finished_time = None
+        self.future = None
+        self.event_list = []
+        self.condition = threading.Condition()
+        self.cancelled = threading.Event()
+
+    def add_event(self, stage, **details):
+        # Never raises, safe to call from callbacks that must not be interrupted
+        with self.condition:
+            self.event_list.append({'stage': stage, 'time': time.time(), **details})
+            self.condition.notify_all()
+
+    def progress(self, stage, **details):
+        self.add_event(stage, **details)
+        self.raise_if_cancelled()
+
+    def raise_if_cancelled(self):
+        if self.cancelled.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def cancel(self):
+        if self.status in FINISHED_STATUSES:
+            return False
+        self.cancelled.set()
+        # A job that did not start yet is cancelled right away
+        if self.future is not None and self.future.cancel():
+            self.finish(CANCELLED)
+        return True
+
+    def finish(self, status, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished_time = time.time()
+        with self.condition:
+            self.status = status
+            self.event_list.append({'stage': status, 'time': self.finished_time, 'result': result, 'error': error})
+            self.condition.notify_all()
+
+    def events(self, timeout=JOBS_EVENTS_KEEPALIVE_SECONDS):
+        """
+        Yield the events of the job from the first one until the job finished.
+        None is yielded when no event arrived for timeout seconds.
+        """
+        index = 0
+        while True:
+            with self.condition:
+                if index >= len(self.event_list) and self.status not in FINISHED_STATUSES:
+                    self.condition.wait(timeout)
+                new_events = self.event_list[index:]
+                finished = self.status in FINISHED_STATUSES
+            index += len(new_events)
+            if not new_events and not finished:
+                yield None
+            for event in new_events:
+                yield event
+            if finished and index >= len(self.event_list):
+                return
+
+    def to_dict(self):
+        return {'job_id': self.id, 'status': self.status, 'result': self.result, 'error': self.error,
+                'events': len(self.event_list)}
+
+
+class JobManager():
+    """
+    Run jobs in a bounded thread pool. At most max_concurrency jobs run together and at most
+    max_queue wait for a free slot, more submits are rejected with QueueFullError.
+    """
+    def __init__(self, max_concurrency=JOBS_MAX_CONCURRENCY, max_queue=JOBS_MAX_QUEUE,
+                 result_ttl_seconds=JOBS_RESULT_TTL_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.result_ttl_seconds = result_ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="job")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def queue_depth(self):
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def submit(self, function, *args, **kwargs):
+        """Run function(job, *args, **kwargs) in the background and return the job."""
+        with self.lock:
+            self._forget_old_jobs()
+            queue_depth = self.queue_depth()
+            if queue_depth >= self.max_queue:
+                raise QueueFullError(queue_depth)
+            job = Job()
+            job.add_event(QUEUED, queue_depth=queue_depth)
+            self.jobs[job.id] = job
+            job.future = self.executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        if job.cancelled.is_set():
+            job.finish(CANCELLED)
+            return
+        job.status = RUNNING
+        job.add_event(RUNNING)
+        try:
+            result = function(job, *args, **kwargs)
+            job.raise_if_cancelled()
+            job.finish(DONE, result=result)
+        except JobCancelled:
+            job.finish(CANCELLED)
+        except Exception as error:
+            print(f"Job {job.id} failed:\n{traceback.format_exc()}")
+            job.finish(FAILED, error=str(error))
+
+    def _forget_old_jobs(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished_time and now - job.finished_time > self.result_ttl_seconds]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        return job is not None and job.cancel()
@@ -1,10 +1,10 @@
 import os
 from Utils.file_utils import *
-json_dir = "Finetuning\Json_Files"
-examples_for_training_dir = "Finetuning\Example_For_Training"
-description_files_dir = f"{examples_for_training_dir}\Part_Descriptions"
-code_files_dir = f"{examples_for_training_dir}\Code_Examples"
-full_program_files_dir = f"{examples_for_training_dir}\Full_Programs"
+json_dir = os.path.join("Finetuning", "Json_Files")
+examples_for_training_dir = os.path.join("Finetuning", "Example_For_Training")
+description_files_dir = os.path.join(examples_for_training_dir, "Part_Descriptions")
+code_files_dir = os.path.join(examples_for_training_dir, "Code_Examples")
+full_program_files_dir = os.path.join(examples_for_training_dir, "Full_Programs")
 
 def create_string_with_all_parts_code(object_name,part_codes):
         # Create string with all parts
@@ -13,9 +13,15 @@ def create_string_with_all_parts_code(object_name,part_codes):
         all_codes = f"{all_codes}\n\npart {i+1}\n{part_code}"
     return all_codes
 
+def get_part_code_files(objects_functions_dir):
+    # The part files in name order, like the listing of Windows, without __pycache__
+    names = [name for name in os.listdir(objects_functions_dir)
+             if name.endswith(".py") and os.path.isfile(os.path.join(objects_functions_dir, name))]
+    return sorted(names, key=str.lower)
+
 def create_string_with_all_parts_code_from_dir(object_name, object_part_dir):
-    objects_functions_dir = f"{code_files_dir}\{object_part_dir}"
-    list_files = os.listdir(objects_functions_dir)
+    objects_functions_dir = os.path.join(code_files_dir, object_part_dir)
+    list_files = get_part_code_files(objects_functions_dir)
     all_codes = f"Object: {object_name}"
     for i, filename in enumerate(list_files):
         content = get_file_content(objects_functions_dir,filename)
@@ -8,4 +8,14 @@ def get_text_before_colon(input_string):
         return input_string[:colon_index].strip()
     else:
         # Return the whole string if ":" is not found
-        return input_string.strip()
\ No newline at end of file
+        return input_string.strip()
+
+def split_text_stream(chunks, separator):
+    # Like "".join(chunks).split(separator), yielding every piece as soon as it is complete
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        while separator in buffer:
+            piece, buffer = buffer.split(separator, 1)
+            yield piece
+    yield buffer
@@ -0,0 +1,58 @@
+"""
+Token counting of chat messages, like Finetuning/validate_finetuning_file.py.
+Uses tiktoken when it and its encoding files are available, otherwise about 4 characters per token.
+"""
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TOKEN_ENCODING = "cl100k_base"
+CHARACTERS_PER_TOKEN = 4
+ESTIMATED_TOKENS = "estimated"  # the tokenizer of the counts of a machine without the encoding
+
+encoding = None
+encoding_loaded = False
+encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    # Loaded once, tiktoken downloads the encoding on its first use and may fail offline
+    global encoding, encoding_loaded
+    with encoding_lock:
+        if not encoding_loaded:
+            encoding_loaded = True
+            if tiktoken is not None:
+                try:
+                    encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as error:
+                    print(f"Warning: tiktoken encoding {TOKEN_ENCODING} is not available, tokens are estimated: {error}")
+    return encoding
+
+
+def get_tokenizer_name():
+    # Stored next to cached counts, counts of another tokenizer are counted again
+    return TOKEN_ENCODING if get_encoding() is not None else ESTIMATED_TOKENS
+
+
+def count_text_tokens(text):
+    token_encoding = get_encoding()
+    if token_encoding is None:
+        return (len(text) + CHARACTERS_PER_TOKEN - 1) // CHARACTERS_PER_TOKEN
+    return len(token_encoding.encode(text))
+
+
+# not exact!
+# simplified from https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+def num_tokens_from_messages(messages, tokens_per_message=3, tokens_per_name=1):
+    num_tokens = 0
+    for message in messages:
+        num_tokens += tokens_per_message
+        for key, value in message.items():
+            num_tokens += count_text_tokens(value)
+            if key == "name":
+                num_tokens += tokens_per_name
+    num_tokens += 3
+    return num_tokens
@@ -0,0 +1,255 @@
+"""
+Tracing spans of the pipeline stages and the geometry steps.
+
+    with span("assembler", model=ASSEMBLER_MODEL) as current:
+        ...
+        current.set(completion_tokens=usage.completion_tokens)
+
+A span is a child of the span open in the same thread or task when it starts (contextvars, the code
+writer threads run in a copy of the context of the caller), get_trace_context and continue_trace carry
+the parent to another process. Finished spans are appended to a rolling JSONL log, TRACE_LOG_FILE, and
+kept in memory for export_chrome_trace, the trace event JSON of chrome://tracing and Perfetto.
+Without TRACING_ENABLED span() returns one shared span that does nothing.
+
+    python -m Utils.tracing trace.json                  - the spans of the log as a Chrome trace
+    python -m Utils.tracing trace.json --trace <id>     - only the spans of one trace
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from Consts.tracing_consts import *
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class NullSpan():
+    # The span of disabled tracing, shared by all the span() calls
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, error_traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def start(self, make_current=True):
+        return self
+
+    def end(self, error=None):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class TraceParent():
+    # A span of another process, the parent of the spans of continue_trace
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span():
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = None
+        self.start_counter = None
+        self.duration = None
+        self.token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def start(self, make_current=True):
+        # A span of a generator is not made current, the spans its caller opens between the yields are not its children
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        if make_current:
+            self.token = current_span.set(self)
+        return self
+
+    def end(self, error=None):
+        self.duration = time.perf_counter() - self.start_counter
+        if self.token is not None:
+            current_span.reset(self.token)
+        if error is not None:
+            self.attributes['error'] = f"{type(error).__name__}: {error}"
+        tracer.record(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, error_type, error, error_traceback):
+        self.end(error)
+        return False
+
+    def to_dict(self):
+        thread = threading.current_thread()
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start_time,
+            'duration': self.duration,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'thread': thread.name,
+            'attributes': self.attributes
+        }
+
+
+class Tracer():
+    """Keep the finished spans of the process in memory and append them to the rolling log."""
+    def __init__(self, enabled=TRACING_ENABLED, log_file=TRACE_LOG_FILE, max_log_bytes=TRACE_LOG_MAX_BYTES,
+                 log_backups=TRACE_LOG_BACKUPS, max_spans=TRACE_MAX_SPANS_IN_MEMORY):
+        self.enabled = enabled
+        self.log_file = log_file
+        self.max_log_bytes = max_log_bytes
+        self.log_backups = log_backups
+        self.spans = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        record = span.to_dict()
+        with self.lock:
+            self.spans.append(record)
+            if self.log_file:
+                try:
+                    self.write_log(record)
+                except OSError as error:
+                    print(f"Warning: span {span.name} was not written to {self.log_file}: {error}")
+
+    def write_log(self, record):
+        os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_log_bytes:
+            self.rotate_log()
+        # Every line is written at once, the geometry workers append to the same log
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def rotate_log(self):
+        # spans.jsonl -> spans.jsonl.1 -> spans.jsonl.2 ..., the oldest is dropped
+        for i in range(self.log_backups - 1, 0, -1):
+            if os.path.exists(f"{self.log_file}.{i}"):
+                os.replace(f"{self.log_file}.{i}", f"{self.log_file}.{i + 1}")
+        os.replace(self.log_file, f"{self.log_file}.1")
+
+
+tracer = Tracer()
+
+
+def span(name, **attributes):
+    """Return a span to open with `with`, a child of the span open in this thread or task."""
+    if not tracer.enabled:
+        return NULL_SPAN
+    return Span(name, attributes, current_span.get())
+
+
+def trace_function(function):
+    """Decorator opening a span named after the function for every call, nothing when tracing is disabled."""
+    if not tracer.enabled:
+        return function
+
+    @functools.wraps(function)
+    def traced(*args, **kwargs):
+        with span(function.__name__):
+            return function(*args, **kwargs)
+    return traced
+
+
+def get_trace_context():
+    # What another process needs to continue the trace of the current span, None without one
+    parent = current_span.get()
+    if not tracer.enabled or parent is None:
+        return None
+    return {'trace_id': parent.trace_id, 'span_id': parent.span_id}
+
+
+@contextmanager
+def continue_trace(trace_context):
+    """The spans of the block are children of the span of get_trace_context() of another process."""
+    if not trace_context:
+        yield
+        return
+    token = current_span.set(TraceParent(trace_context['trace_id'], trace_context['span_id']))
+    try:
+        yield
+    finally:
+        current_span.reset(token)
+
+
+def read_log(log_file=TRACE_LOG_FILE, backups=TRACE_LOG_BACKUPS):
+    # The spans of the rotated logs first, oldest first
+    records = []
+    for path in [f"{log_file}.{i}" for i in range(backups, 0, -1)] + [log_file]:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line a worker was writing when its process was killed
+                    continue
+    return records
+
+
+def to_chrome_events(records):
+    # Complete events ("X") in microseconds, and the names of the threads ("M")
+    events = []
+    threads = {}
+    for record in records:
+        threads[(record['pid'], record['tid'])] = record.get('thread')
+        events.append({
+            'name': record['name'],
+            'cat': record['name'].split()[0],
+            'ph': "X",
+            'ts': record['start'] * 1e6,
+            'dur': record['duration'] * 1e6,
+            'pid': record['pid'],
+            'tid': record['tid'],
+            'args': dict(record['attributes'], trace_id=record['trace_id'], span_id=record['span_id'],
+                         parent_id=record['parent_id'])
+        })
+    for (pid, tid), thread_name in threads.items():
+        events.append({'name': "thread_name", 'ph': "M", 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+    return events
+
+
+def export_chrome_trace(output_file, records=None, trace_id=None):
+    """
+    Write the spans as Chrome trace event JSON, the spans of this process when records is None.
+    With trace_id only the spans of that trace. Return the number of spans written.
+    """
+    if records is None:
+        with tracer.lock:
+            records = list(tracer.spans)
+    if trace_id:
+        records = [record for record in records if record['trace_id'] == trace_id]
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump({'traceEvents': to_chrome_events(records), 'displayTimeUnit': "ms"}, f)
+    return len(records)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the spans of the trace log as Chrome trace event JSON")
+    parser.add_argument("output", help="Chrome trace JSON file, open it in chrome://tracing or ui.perfetto.dev")
+    parser.add_argument("--log", default=TRACE_LOG_FILE, help="the JSONL span log")
+    parser.add_argument("--trace", default=None, help="export only the spans of this trace id")
+    args = parser.parse_args()
+    count = export_chrome_trace(args.output, read_log(args.log), args.trace)
+    print(f"{count} spans written to {args.output}")
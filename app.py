@@ -1,10 +1,93 @@
-from flask import Flask, render_template, request, session
-import subprocess
+import os
 import json
+from flask import Flask, render_template, request, session, jsonify, url_for, send_file, abort, Response
+from Consts.geometry_consts import *
+from Consts.jobs_consts import *
+from Geometry.geometry_worker_pool import GeometryWorkerError
+from Geometry.fork_server import create_geometry_executor
+from Geometry.program_validator import ProgramValidationError
+from Geometry.program_selector import select_or_generate_program_file
+from Geometry.program_router import get_program_router
+from Utils.artifact_utils import *
+from Utils.job_manager import JobManager, QueueFullError
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
 
+# Warm geometry workers, started at boot so requests do not pay for loading Rhino,
+# or the zygote of the fork server with GEOMETRY_EXECUTOR=fork_server
+geometry_pool = create_geometry_executor()
+# Background model generation, see /jobs
+job_manager = JobManager()
+
+
+def build_artifact(file_name, sliders_value=None, progress=None, mesh_quality=MESH_QUALITY_DEFAULT):
+    # every build gets its own artifact, so concurrent users never overwrite each other's model
+    artifact_id = new_artifact_id()
+    result_data = geometry_pool.build_model(file_name, sliders_value, get_artifact_file(artifact_id), progress,
+                                            mesh_quality)
+    result_data['artifact_id'] = artifact_id
+    collect_artifacts_if_due()
+    return result_data
+
+
+def save_model_in_session(file_name, result_data):
+    session['artifact_id'] = result_data['artifact_id']
+    session['program_file'] = file_name
+    session['params'] = result_data['params']
+    session['num_of_params'] = result_data['num_of_params']
+
+
+def get_requested_mesh_quality(default=MESH_QUALITY_DEFAULT):
+    # the quality level of the request, e.g. /modified_model?quality=fine
+    mesh_quality = request.values.get('quality') or (request.get_json(silent=True) or {}).get('quality')
+    if mesh_quality not in MESH_QUALITY_LEVELS:
+        if mesh_quality:
+            print(f"Unknown mesh quality '{mesh_quality}' is ignored")
+        return default
+    return mesh_quality
+
+
+def generate_model_job(job, user_input, mesh_quality=MESH_QUALITY_DEFAULT):
+    job.progress("selecting program")
+    file_name = select_or_generate_program_file(user_input, job.progress)
+    if file_name is None:
+        raise ValueError(f"No program found for prompt '{user_input}'")
+    job.progress("building model", program_file=file_name)
+    # the geometry worker reports its own stages (running program, meshing, exporting)
+    result_data = build_artifact(file_name, None, job.add_event, mesh_quality)
+    return {'program_file': file_name, 'artifact_id': result_data['artifact_id'],
+            'params': result_data['params'], 'num_of_params': result_data['num_of_params']}
+
+
+def refine_model_job(job, file_name, sliders_values, mesh_quality=MESH_QUALITY_DEFAULT):
+    # the finer mesh that replaces a coarse preview in the viewer
+    job.progress("refining", mesh_quality=mesh_quality)
+    result_data = build_artifact(file_name, sliders_values, job.add_event, mesh_quality)
+    return {'artifact_id': result_data['artifact_id'], 'mesh_quality': mesh_quality}
+
+
+def start_refine_job(file_name, sliders_values):
+    try:
+        job = job_manager.submit(refine_model_job, file_name, sliders_values)
+    except QueueFullError as error:
+        print(f"Model is not refined: {error}")
+        return None
+    session['refine_job_id'] = job.id
+    return url_for('job_events', job_id=job.id)
+
+
+def get_model_url():
+    # a finished refinement replaces the preview, e.g. for the G-code of the model
+    refine_job = job_manager.get(session.get('refine_job_id'))
+    if refine_job is not None and refine_job.status == DONE:
+        session['artifact_id'] = refine_job.result['artifact_id']
+        session.pop('refine_job_id')
+    artifact_id = session.get('artifact_id')
+    if not is_valid_artifact_id(artifact_id):
+        return None
+    return url_for('artifact_model', artifact_id=artifact_id)
+
 
 @app.route('/')
 def index():
@@ -16,19 +99,82 @@ def generate_model():
     # ********* TO DO: Get user input from the form ***********
     user_input = request.form['user_input']
 
-    # run create_obj_file.py and present the object
-    result = subprocess.run(["python", "create_obj_file.py", json.dumps(user_input)], capture_output=True, text=True)
-    if result.returncode == 0:
-        output = result.stdout  # captured output from the subprocess
-        result_data = json.loads(output)
-        params = result_data['params']
-        num_of_params = result_data['num_of_params']
-        session['params'] = params
-        session['num_of_params'] = num_of_params
-    else:
-        error = result.stderr 
+    # build the object in a geometry worker and present it
+    file_name = select_or_generate_program_file(user_input)
+    if file_name is None:
+        print(f"Error: no program found for prompt '{user_input}'")
+        return render_template('show_obj.html', model_url=None, error=f"No object matches '{user_input}'.")
+    try:
+        save_model_in_session(file_name, build_artifact(file_name, mesh_quality=get_requested_mesh_quality()))
+    except (GeometryWorkerError, ProgramValidationError) as error:
         print(error)
-    return render_template('show_obj.html')
+        return render_template('show_obj.html', model_url=None, error="The model could not be built.")
+    return render_template('show_obj.html', model_url=get_model_url())
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    user_input = request.form.get('user_input') or (request.get_json(silent=True) or {}).get('user_input')
+    if not user_input:
+        return jsonify({'error': "user_input is missing"}), 400
+    try:
+        job = job_manager.submit(generate_model_job, user_input, get_requested_mesh_quality())
+    except QueueFullError as error:
+        response = jsonify({'error': str(error), 'queue_depth': error.queue_depth})
+        response.headers['Retry-After'] = 5
+        return response, 429
+    return jsonify({'job_id': job.id,
+                    'events_url': url_for('job_events', job_id=job.id),
+                    'show_url': url_for('show_job', job_id=job.id)}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if job_manager.get(job_id) is None:
+        abort(404)
+    return jsonify({'cancelled': job_manager.cancel(job_id)})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Server-Sent Events with the stages of the job, the stream ends when the job finished
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+
+    def stream():
+        finished = False
+        try:
+            for event in job.events():
+                if event is None:
+                    # writing to a disconnected client fails and closes the stream
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
+            finished = True
+        finally:
+            if not finished:
+                print(f"Client of job {job.id} disconnected, cancelling the job")
+                job.cancel()
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/show', methods=['GET'])
+def show_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    if job.status == DONE:
+        save_model_in_session(job.result['program_file'], job.result)
+    else:
+        print(f"Job {job.id} is {job.status}: {job.error}")
+        return render_template('show_obj.html', model_url=None, error=f"The model job is {job.status}.")
+    return render_template('show_obj.html', model_url=get_model_url())
 
 @app.route('/modify_model', methods=['POST'])
 def modify_model():
@@ -50,9 +196,24 @@ def modified_model():
         sliders_values[param] = request.form.get(f"{param}_value")
     session['sliders_values'] = sliders_values
     print(sliders_values)
-    subprocess.run(["python", "create_obj_file.py", json.dumps(sliders_values)], capture_output=True, text=True)
+    # progressive: a coarse preview right away, the default quality replaces it when ready
+    mesh_quality = get_requested_mesh_quality(None)
+    progressive = mesh_quality is None and MESH_PROGRESSIVE
+    refine_events_url = None
+    try:
+        result_data = build_artifact(session.get('program_file'), sliders_values,
+                                     mesh_quality=MESH_QUALITY_PREVIEW if progressive else mesh_quality or MESH_QUALITY_DEFAULT)
+        session['artifact_id'] = result_data['artifact_id']
+        # a new model makes the refinement of the previous one useless
+        job_manager.cancel(session.pop('refine_job_id', None))
+        if progressive:
+            refine_events_url = start_refine_job(session.get('program_file'), sliders_values)
+    except (GeometryWorkerError, ProgramValidationError) as error:
+        print(error)
+        # the previous model stays on screen with the error
+        return render_template('show_obj.html', model_url=get_model_url(), error="The modified model could not be built.")
 
-    return render_template('show_obj.html')
+    return render_template('show_obj.html', model_url=get_model_url(), refine_events_url=refine_events_url)
 
 @app.route('/generate_gcode', methods=['POST'])
 def generate_gcode():
@@ -69,5 +230,19 @@ def present_obj():
 def usage():
     return render_template('usage.html')
 
+@app.route('/models/<artifact_id>', methods=['GET'])
+def artifact_model(artifact_id):
+    if not is_valid_artifact_id(artifact_id) or not os.path.exists(get_artifact_file(artifact_id)):
+        abort(404)
+    # an artifact never changes, new builds get new ids
+    return send_file(os.path.abspath(get_artifact_file(artifact_id)), mimetype='model/gltf-binary', max_age=3600)
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify(geometry_pool.health_check())
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    get_program_router()
+    geometry_pool.start()
+    # the reloader would start a second server process with its own pool
+    app.run(debug=True, use_reloader=False)
@@ -1,104 +1,53 @@
-import rhinoinside
-rhinoinside.load()
-# System and Rhino can only be loaded after rhinoinside is initialized
-# import System  # noqa
-import Rhino
-import Rhino.Geometry as rg  # noqa
-
-import traceback
-from Utils.file_utils import get_file_content
+import os
 import sys
-from io import StringIO
-import trimesh
-import numpy as np
 import json
-import os
-
-
-try:
-    sliders_value = sys.argv[1]
-except:
-    sliders_value = None
-
-if sliders_value:      
-    if not isinstance(json.loads(sliders_value), dict):
-        prompt = json.loads(sliders_value)
-        options = ['box', 'bowl', 'ellipse baking mold', 'plate', 'cup', 'glass',
-                'bottle', 'baking mold', 'flower pot', 'hook', 'toothpick dispenser']
-        for option in options:
-            if option in prompt:
-                if option == 'bowl':
-                    file_name = 'bowl_2.py'
-                    break
-                else:
-                    name = "_".join(option.split())
-                    file_name = f'{name}_1.py'
-                    break
-        with open("file_name.txt", "w") as f:
-            f.write(file_name)
-    
-with open("file_name.txt", "r") as f:
-    file_name = f.read()
-    
-# file_name = run_all_agents() when the finetuning will be ready and steady this
-# will be the function that will be called to run the agents and get the file name
-    
-generated_code = get_file_content("./Full_Programs/", file_name)
-code = generated_code
-
-ex_locals = {"sliders_value": json.loads(sliders_value)} if isinstance(json.loads(sliders_value), dict) else {}
-
-old_stdout = sys.stdout
-redirected_output = sys.stdout = StringIO()
-exec(code, None, ex_locals)
-sys.stdout = old_stdout
-
-geometry = ex_locals['a'] # array of breps
-params = ex_locals['b']
-num_of_params = len(ex_locals['b'])
-result = {
-            'params': params,
-            'num_of_params': num_of_params
-        }
-print(json.dumps(result))
-
-
-# Convert each Brep in the geometry list to mesh and combine them
-combined_mesh = rg.Mesh()
-for brep in geometry:
-    brep_meshes = rg.Mesh.CreateFromBrep(brep)
-    for brep_mesh in brep_meshes:
-        combined_mesh.Append(brep_mesh)
-
-# Convert the combined mesh into a format that can be used with trimesh
-vertices = np.array([[v.X, v.Y, v.Z] for v in combined_mesh.Vertices], dtype=np.float64)
-faces = []
-
-for f in combined_mesh.Faces:
-    if f.IsTriangle:
-        faces.append([f.A, f.B, f.C])
-    elif f.IsQuad:
-        # Convert quad to two triangles
-        faces.append([f.A, f.B, f.C])
-        faces.append([f.C, f.D, f.A])
-
-# Now that all faces are guaranteed to be triangles, we can safely create a NumPy array
-faces_np = np.array(faces, dtype=np.int32)
-
-# Create a trimesh object from the combined mesh
-tmesh = trimesh.Trimesh(vertices=vertices, faces=faces_np)
-
-# Specify the output file path
-output_file = "static/models/output_combined_mesh.obj"
-# Remove the file if it already exists
-if os.path.exists(output_file):
-    os.remove(output_file)
-
-# Export the combined mesh to an OBJ file
-tmesh.export(output_file)
-
-# Print the path to the exported file or any other relevant information
-# print(f"Exported combined mesh to {output_file}")
+from Consts.geometry_consts import *
+from Geometry.program_selector import *
+from Geometry.rhino_runtime import build_model
+from Geometry.fork_server import create_geometry_executor
+from Consts.tracing_consts import *
+from Utils.tracing import tracer, export_chrome_trace
+
+# The server builds models in the warm workers of Geometry/geometry_worker_pool.py,
+# this script builds a single model from the command line:
+#   python create_obj_file.py '"a plate"'                   - select a program by prompt
+#   python create_obj_file.py '{"body_height": "30"}'       - rebuild the last program with sliders values
+# With GEOMETRY_EXECUTOR=fork_server the build runs in a forked job with the limits of Consts/geometry_consts.py
+# With TRACING=1 the spans of the build are also written to Traces/create_obj_file.json (chrome://tracing)
+
+
+def build(file_name, sliders_value):
+    if GEOMETRY_EXECUTOR != "fork_server":
+        return build_model(file_name, sliders_value, OUTPUT_MESH_FILE)
+    executor = create_geometry_executor()
+    try:
+        return executor.build_model(file_name, sliders_value, OUTPUT_MESH_FILE)
+    finally:
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        sliders_value = json.loads(sys.argv[1])
+    except:
+        sliders_value = None
+
+    if sliders_value is not None and not isinstance(sliders_value, dict):
+        file_name = select_program_file(sliders_value)
+        if file_name is None:
+            print(f"Error: no program found for prompt '{sliders_value}'", file=sys.stderr)
+            sys.exit(1)
+        save_selected_program_file(file_name)
+        sliders_value = None
+    else:
+        file_name = load_selected_program_file()
+
+    result = build(file_name, sliders_value)
+    print(json.dumps({'params': result['params'], 'num_of_params': result['num_of_params']}))
+    if tracer.enabled:
+        trace_file = os.path.join(TRACE_DIR, "create_obj_file.json")
+        export_chrome_trace(trace_file)
+        print(f"Trace written to {trace_file}", file=sys.stderr)
 
 #how to present the brep in we ui: 
-#maybe: https://developer.rhino3d.com/api/rhinocommon/rhino.runtime.commonobject/tojson
\ No newline at end of file
+#maybe: https://developer.rhino3d.com/api/rhinocommon/rhino.runtime.commonobject/tojson
@@ -1,12 +1,21 @@
 from datetime import datetime
+import contextvars
 import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from Agents.agent_code_writer import *
 from Agents.agent_disassembler import *
 from Agents.agent_assembler import *
 from Agents.agent_parameter_manipulator import *
+from Agents.local_assembler import assemble_program, AssemblyError
+from Geometry.parameter_patch import *
+from Geometry.parameter_resolver import resolve_parameter_changes
+from Consts.parameter_resolver_consts import PARAMETER_RESOLVER_ENABLED
 from Utils.string_utils import *
 from Utils.file_utils import *
 from Utils.model_utils import *
+from Utils.tracing import span
 
 main_dir = "Files_Generated_By_Agents"
 full_programs_dir = f"{main_dir}/Full_Programs_Generated"
@@ -14,33 +23,66 @@ disassembler_dir = f"{main_dir}/Disassembler_Generated"
 parts_functions_dir = f"{main_dir}/Parts_Functions_Generated"
 time_format = "%m/%d/%Y, %H:%M:%S"
 
-def run_all_agents(object_name):
+def no_progress(stage, **details):
+    pass
+
+
+def get_parts_functions_dir(files_name):
+    return os.path.join(parts_functions_dir, files_name)
+
+
+def get_generated_files(files_name):
+    # The files the agents write for an object
+    return {
+        'disassembler': os.path.join(disassembler_dir, files_name),
+        'parts_functions': get_parts_functions_dir(files_name),
+        'full_program': os.path.join(full_programs_dir, f"{files_name}.py")
+    }
+
+
+def run_all_agents(object_name, progress=no_progress):
+    # progress is called with the current stage, e.g. the progress of a job in Utils/job_manager.py
     print(f"Recived object to generate: {object_name}")
     formatted_time = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
     formatted_object_name = object_name.replace(" ","_")
     files_name = f"{formatted_object_name}_{formatted_time}"
+    with span("generate object", object_name=object_name, files_name=files_name):
+        run_pipeline(object_name, files_name, progress)
+    return files_name
+
+def run_pipeline(object_name, files_name, progress=no_progress):
     start_time = datetime.now()
     print(f"Start time: {start_time.strftime(time_format)}")
     
-    object_description = run_disassembler_agent_for_prompt(object_name, files_name)
-
-    part_codes = run_code_writer_agent_for_object(object_name,object_description,files_name)
+    progress("disassembling")
+    if DISASSEMBLER_STREAM:
+        # code writing of the first parts overlaps with disassembling the next ones
+        object_description, part_codes = run_disassembler_and_code_writer_agents(object_name, files_name, progress)
+    else:
+        object_description = run_disassembler_agent_for_prompt(object_name, files_name)
+        part_codes = run_code_writer_agent_for_object(object_name,object_description,files_name,progress)
 
     # Create string with all parts
     all_codes = create_string_with_all_parts_code(object_name, part_codes)
 
-    run_full_program_agent(all_codes,files_name)
+    progress("assembling")
+    run_full_program_agent(all_codes,files_name,part_codes)
     
     # Finish - time calculation
     end_time = datetime.now()
     print(f"End time: {end_time.strftime(time_format)}")
     duration = end_time-start_time
     print(f"Total runing time: {duration} in ms: {int(duration.total_seconds() * 1000)}")
-    return files_name
 
 def run_disassembler_agent_for_prompt(object_name, files_name):
     print("------------------------------------- 1st AGENT -----------------------------------------")
-    object_description = run_disassembler_agent(object_name)
+    with span("disassembler") as current:
+        object_description = run_disassembler_agent(object_name)
+        current.set(parts=len(object_description.split('\n\n')))
+    save_disassembler_result(object_description, files_name)
+    return object_description
+
+def save_disassembler_result(object_description, files_name):
     print(f"Disassembler agent finish runing result:\n{object_description}")
     print("------------------------------------------------------------------------------")
 
@@ -50,37 +92,122 @@ def run_disassembler_agent_for_prompt(object_name, files_name):
     with open(disassembler_file_path, 'w') as disassembler_file:
         disassembler_file.write(object_description)
     print(f"File created at: {disassembler_file_path}")
-    return object_description
 
-def run_code_writer_agent_for_object(object_name,object_description,files_name):
-    print("------------------------------------- 2nd AGENT -----------------------------------------")
-    object_parts = object_description.split('\n\n')
-    part_codes = []
-    for i, part in  enumerate(object_parts):
-        part_full_description = object_name + '\n\n' + part
-        part_name = get_text_before_colon(part)
-        print(f"Code writer agent start runing for part {i+1} - {part_name} - prompt:\n{part_full_description}")
+def run_disassembler_and_code_writer_agents(object_name, files_name, progress=no_progress):
+    # The disassembler answer is streamed and every part is sent to the code writer
+    # as soon as its description block is complete
+    print("------------------------------------- 1st AGENT (streamed) ------------------------------")
+    chunks = []
+
+    def stream_object_parts():
+        yield from split_text_stream(collect(stream_disassembler_agent(object_name), chunks), '\n\n')
+        save_disassembler_result("".join(chunks), files_name)
+
+    with span("disassembler and code writer"):
+        part_codes = write_parts_codes(object_name, stream_object_parts(), files_name, progress)
+    return "".join(chunks), part_codes
+
+def collect(chunks, collected):
+    for chunk in chunks:
+        collected.append(chunk)
+        yield chunk
+
+class PartCodeError(Exception):
+    def __init__(self, failed_parts):
+        super().__init__("Code writer agent failed for parts: " +
+                         ", ".join(f"{part_name} ({error})" for part_name, error in failed_parts))
+        self.failed_parts = failed_parts
+
+
+def write_part_code(object_name, part, files_name):
+    part_full_description = object_name + '\n\n' + part
+    part_name = get_text_before_colon(part)
+    print(f"Code writer agent start runing for part {part_name} - prompt:\n{part_full_description}")
+    part_start_time = time.perf_counter()
+    with span("code writer part", part_name=part_name) as current:
         part_code = run_code_writer_agent(part_full_description)
-        print(f"Code writer agent finish runing for part {i+1} - {part_name} - result:\n{part_code}")
-        print("------------------------------------------------------------------------------")
-
-        #Save part code as file
-        object_dir=f"{parts_functions_dir}\{files_name}"
-        os.makedirs(object_dir, exist_ok=True)
-        part_function_file_path = os.path.join(object_dir, f"{part_name}.py")
-        with open(part_function_file_path, 'w') as part_function_file:
-            part_function_file.write(part_code)
-        print(f"File created at: {part_function_file_path}")
-
-        # Append part to array of parts
-        part_codes.append(part_code)
+        current.set(code_lines=len(part_code.splitlines()))
+    part_seconds = time.perf_counter() - part_start_time
+    print(f"Code writer agent finish runing for part {part_name} in {part_seconds:.2f} seconds - result:\n{part_code}")
+    print("------------------------------------------------------------------------------")
+
+    #Save part code as file
+    object_dir=get_parts_functions_dir(files_name)
+    os.makedirs(object_dir, exist_ok=True)
+    part_function_file_path = os.path.join(object_dir, f"{part_name}.py")
+    with open(part_function_file_path, 'w') as part_function_file:
+        part_function_file.write(part_code)
+    print(f"File created at: {part_function_file_path}")
+    return part_code, part_seconds
+
+def run_code_writer_agent_for_object(object_name,object_description,files_name,progress=no_progress,
+                                     max_concurrency=CODE_WRITER_MAX_CONCURRENCY):
+    print("------------------------------------- 2nd AGENT -----------------------------------------")
+    return write_parts_codes(object_name, object_description.split('\n\n'), files_name, progress, max_concurrency)
+
+def write_parts_codes(object_name, object_parts, files_name, progress=no_progress,
+                      max_concurrency=CODE_WRITER_MAX_CONCURRENCY):
+    # The parts are independent, up to max_concurrency of them are written together.
+    # object_parts can be a generator, every part is sent to the code writer when it arrives.
+    # A failing part does not stop the others, PartCodeError lists the failed parts when all are done.
+    part_names = []
+    futures = {}
+    failed_parts = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="code_writer") as executor:
+        try:
+            for i, part in enumerate(object_parts):
+                part_names.append(get_text_before_colon(part))
+                # The thread keeps the llm_priority of the caller
+                futures[executor.submit(contextvars.copy_context().run,
+                                        write_part_code, object_name, part, files_name)] = i
+                if i == 0:
+                    print(f"First part sent to the code writer after {time.perf_counter() - start_time:.2f} seconds")
+                progress("writing part", part=i+1, part_name=part_names[i])
+
+            part_codes = [None] * len(part_names)
+            part_seconds = [None] * len(part_names)
+            for written, future in enumerate(as_completed(futures)):
+                i = futures[future]
+                try:
+                    part_codes[i], part_seconds[i] = future.result()
+                except Exception as error:
+                    print(f"Code writer agent failed for part {i+1} - {part_names[i]}:\n{traceback.format_exc()}")
+                    failed_parts.append((part_names[i], str(error)))
+                progress("part written", part=written+1, parts=len(part_names), part_name=part_names[i],
+                         seconds=part_seconds[i])
+        except BaseException:
+            # A cancelled job does not wait for the parts that did not start
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    total_seconds = time.perf_counter() - start_time
+    for i, part_name in enumerate(part_names):
+        status = f"{part_seconds[i]:.2f} seconds" if part_seconds[i] is not None else "failed"
+        print(f"Part {i+1} - {part_name}: {status}")
+    sequential_seconds = sum(seconds for seconds in part_seconds if seconds is not None)
+    print(f"Code writer agent wrote {len(part_names)} parts in {total_seconds:.2f} seconds "
+          f"({sequential_seconds:.2f} seconds one after the other)")
+    if failed_parts:
+        raise PartCodeError(failed_parts)
     return part_codes
 
-def run_full_program_agent(all_codes, files_name):
+def run_full_program_agent(all_codes, files_name, part_codes=None):
+    # With the part codes the parts are merged locally, the assembler agent only gets parts that cannot be merged
     print("------------------------------------- 3rd AGENT -----------------------------------------")
     print(f"Assembler agent start runing prompt:\n{all_codes}")
     print("------------------------------------------------------------------------------")
-    full_program = run_assembler_agent(all_codes)
+    with span("assembler", parts_code_lines=len(all_codes.splitlines())) as current:
+        full_program = None
+        if ASSEMBLER_LOCAL and part_codes:
+            try:
+                full_program = assemble_program(part_codes)
+            except AssemblyError as error:
+                print(f"Local assembler cannot merge the parts, running the assembler agent: {error}")
+        current.set(local=full_program is not None)
+        if full_program is None:
+            full_program = run_assembler_agent(all_codes)
+        current.set(program_lines=len(full_program.splitlines()))
     print(f"Assembler agent finish runing result:\n{full_program}")
     print("------------------------------------------------------------------------------")
     print("Start creating python file with full program")
@@ -109,8 +236,15 @@ def run_agent_parameter_manipulator(prompt, file_name):
     start_time = datetime.now()
     print(f"Start time: {start_time.strftime(time_format)}")
     full_program = get_file_content(full_programs_dir,file_name)
-    full_prompt = f"{prompt}\n\nprogram to change:\n{full_program}"
-    new_program = run_parameter_manipulator_agent(full_prompt)
+    with span("parameter manipulator", file_name=file_name) as current:
+        new_program = resolve_parameter_prompt(prompt, full_program) if PARAMETER_RESOLVER_ENABLED else None
+        current.set(resolved=new_program is not None)
+        if new_program is None and PARAMETER_MANIPULATOR_PATCH_MODE:
+            new_program = run_parameter_patch(prompt, full_program)
+            current.set(patch=new_program is not None)
+        if new_program is None:
+            full_prompt = f"{prompt}\n\nprogram to change:\n{full_program}"
+            new_program = run_parameter_manipulator_agent(full_prompt)
     print(f"Parameter manipulator agent finish runing result:\n{new_program}")
     print("------------------------------------------------------------------------------")
     print("Start creating python file with new program")
@@ -131,6 +265,43 @@ def run_agent_parameter_manipulator(prompt, file_name):
     print(f"Total runing time: {duration} in ms: {int(duration.total_seconds() * 1000)}")
     return new_program
 
+def resolve_parameter_prompt(prompt, full_program):
+    # Simple prompts like "Change jar height to 30 cm" are resolved without the agent.
+    # None when the prompt is not understood confidently or a value is outside the range of its slider,
+    # and the agent changes the program.
+    try:
+        changes = resolve_parameter_changes(prompt, get_program_parameters(full_program))
+        if changes is None:
+            return None
+        print(f"Parameter changes resolved without the agent: {changes}")
+        return apply_parameter_patch(full_program, changes)
+    except ParameterPatchError as error:
+        print(f"Parameter changes were not resolved: {error}")
+        return None
+
+
+def run_parameter_patch(prompt, full_program):
+    # The agent answers with the new values only and the rest of the program stays the same.
+    # None when the program or the answer cannot be patched, and the agent rewrites the whole program.
+    # A value outside the range of its slider raises ParameterRangeError.
+    try:
+        parameters = get_program_parameters(full_program)
+        if not parameters:
+            raise ParameterPatchError("The program has no default parameter values")
+        changes = run_parameter_patch_agent(prompt, parameters)
+        print(f"Parameter patch agent changes: {changes}")
+        return apply_parameter_patch(full_program, changes)
+    except ParameterRangeError:
+        raise
+    except (ParameterPatchError, ValueError) as error:
+        if not PARAMETER_PATCH_FULL_PROGRAM_FALLBACK:
+            raise
+        print(f"Parameter patch failed, the whole program is rewritten: {error}")
+        return None
+
+if __name__ == '__main__':
+    run_all_agents("plate")
+
 # run_agent_parameter_manipulator("Cahnge jar height to 30 cm","A_jar_2024_02_25_12_55_34.py")
 # get_object_from_dissasembler_and_run_code_writer_agent("flower_pot_1", "A round flower pot that expands upwards with protruding edges")
 # build_all_code_and_run_full_program_agent("flower_pot_1", "A round flower pot that expands upwards with protruding edges")
@@ -141,7 +312,6 @@ def run_agent_parameter_manipulator(prompt, file_name):
 # run_all_agents("Toothbrush holder cup")
 # run_all_agents("Dispenser for napkins in the shape of triangles that hug the napkins")
 # run_all_agents("Toothpick dispenser - a round box with a lid")
-run_all_agents("plate")
 
 # run_disassembler_agent_for_prompt("A kettle with 2 handles at both sides and without a lid", "kettle_without_lid_with_2_handkes_temp15_topp01_turbo1106_23examples")
 
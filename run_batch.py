@@ -0,0 +1,155 @@
+"""
+Generate the objects of a file of prompts, one prompt per line, with the agents pipeline of run_agents.py.
+
+    python run_batch.py prompts.txt                      - generate 4 objects at the same time
+    python run_batch.py prompts.txt --concurrency 8 --quiet
+
+Every object is recorded in a manifest, prompts.txt.manifest.json: its status, the files the agents wrote,
+the seconds of the pipeline stages, the tokens and the problems of the full program.
+The manifest is written after every object, running the same command again after an interruption
+generates only the objects that are not done. Prompts added to the file later are appended to it.
+The agent requests of the batch run at PRIORITY_BATCH, after the requests of the web app.
+"""
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from Consts.batch_consts import *
+from Consts.llm_consts import PRIORITY_BATCH
+from Agents.llm_client import count_llm_usage
+from Agents.llm_scheduler import llm_priority
+from Geometry.program_validator import find_program_problems
+import run_agents
+
+
+def read_prompts(prompts_file):
+    # One prompt per line, empty lines and lines starting with # are skipped, repeated prompts run once
+    prompts = []
+    with open(prompts_file, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            prompt = line.strip()
+            if prompt and not prompt.startswith("#") and prompt not in prompts:
+                prompts.append(prompt)
+    return prompts
+
+
+class Manifest():
+    """The items of a batch, saved to a JSON file after every change."""
+    def __init__(self, manifest_file, prompts_file):
+        self.manifest_file = manifest_file
+        self.lock = threading.Lock()
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {'prompts_file': prompts_file, 'created': datetime.now().isoformat(timespec='seconds'),
+                         'items': []}
+
+    def add_prompts(self, prompts):
+        known = {item['prompt'] for item in self.data['items']}
+        for prompt in prompts:
+            if prompt not in known:
+                self.data['items'].append({'prompt': prompt, 'status': PENDING, 'attempts': 0})
+        self.save()
+
+    def items_to_run(self):
+        # Items of an interrupted run are still running in the manifest, they run again
+        return [item for item in self.data['items'] if item['status'] != DONE]
+
+    def update(self, item, **fields):
+        with self.lock:
+            item.update(fields)
+            self.save()
+
+    def save(self):
+        # Written to a temporary file first, an interruption never leaves half a manifest
+        self.data['updated'] = datetime.now().isoformat(timespec='seconds')
+        temp_file = f"{self.manifest_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(temp_file, self.manifest_file)
+
+    def counts(self):
+        counts = {}
+        for item in self.data['items']:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        return counts
+
+
+def generate_item(manifest, item):
+    stage_seconds = {}
+    start_time = time.perf_counter()
+
+    def progress(stage, **details):
+        stage_seconds.setdefault(stage, round(time.perf_counter() - start_time, 3))
+
+    manifest.update(item, status=RUNNING, attempts=item['attempts'] + 1, started=datetime.now().isoformat(timespec='seconds'))
+    with llm_priority(PRIORITY_BATCH), count_llm_usage() as usage:
+        try:
+            files_name = run_agents.run_all_agents(item['prompt'], progress)
+            files = run_agents.get_generated_files(files_name)
+            with open(files['full_program'], 'r', encoding='utf-8') as f:
+                problems = find_program_problems(f.read(), files['full_program'])
+        except Exception as error:
+            print(f"Batch item '{item['prompt']}' failed:\n{traceback.format_exc()}")
+            manifest.update(item, status=FAILED, error=f"{type(error).__name__}: {error}",
+                            seconds=round(time.perf_counter() - start_time, 3), stages=stage_seconds,
+                            tokens=usage.to_dict())
+            return False
+
+    manifest.update(item, status=DONE, error=None, files_name=files_name, files=files,
+                    seconds=round(time.perf_counter() - start_time, 3), stages=stage_seconds,
+                    tokens=usage.to_dict(), problems=problems)
+    return True
+
+
+def run_batch(prompts_file, manifest_file=None, concurrency=BATCH_CONCURRENCY, quiet=False):
+    manifest_file = manifest_file or prompts_file + BATCH_MANIFEST_SUFFIX
+    manifest = Manifest(manifest_file, prompts_file)
+    manifest.add_prompts(read_prompts(prompts_file))
+    items = manifest.items_to_run()
+    done_before = len(manifest.data['items']) - len(items)
+    log = sys.stderr if quiet else sys.stdout
+    print(f"Batch of {len(manifest.data['items'])} prompts, {done_before} done before, {len(items)} to generate, "
+          f"manifest {manifest_file}", file=log)
+
+    start_time = time.perf_counter()
+    # The agents print a lot, with quiet only the progress of the batch is printed
+    output = open(os.devnull, 'w') if quiet else contextlib.nullcontext(sys.stdout)
+    with output as agents_output, contextlib.redirect_stdout(agents_output):
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as executor:
+            futures = {executor.submit(contextvars.copy_context().run, generate_item, manifest, item): item
+                       for item in items}
+            try:
+                for finished, future in enumerate(as_completed(futures)):
+                    item = futures[future]
+                    status = "done" if future.result() else f"failed - {item['error']}"
+                    print(f"{finished + 1}/{len(items)} {item['prompt']}: {status} in {item['seconds']:.1f} seconds",
+                          file=log)
+            except KeyboardInterrupt:
+                # The objects being generated finish, the others stay pending in the manifest
+                print("Batch interrupted, waiting for the running objects, run the batch again to resume", file=log)
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    counts = manifest.counts()
+    print(f"Batch finished in {time.perf_counter() - start_time:.1f} seconds: {counts}", file=log)
+    return manifest.data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the objects of a file of prompts, resumable")
+    parser.add_argument("prompts", help="text file with one object prompt per line")
+    parser.add_argument("--manifest", default=None, help=f"manifest file, the prompts file + {BATCH_MANIFEST_SUFFIX}")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="objects generated at the same time")
+    parser.add_argument("--quiet", action="store_true", help="print only the progress of the batch")
+    args = parser.parse_args()
+    data = run_batch(args.prompts, args.manifest, args.concurrency, args.quiet)
+    sys.exit(0 if all(item['status'] == DONE for item in data['items']) else 1)